@@ -0,0 +1,438 @@
+"""
+Audit integrity - tamper-evident activity logs through signed Merkle commitments.
+
+Inserts are unchanged; nothing is hashed on the request path. A background sealer picks up
+new activity_logs rows every AUDIT_SEAL_SECONDS and commits them in batches of up to
+AUDIT_BATCH_SIZE rows. For each batch it builds a Merkle tree over the rows' canonical
+encodings, then chains the root to the previous batch:
+    commitment = SHA-256("QAUDIT1" | first id | last id | leaf count | root | previous commitment)
+The commitment is signed with an Ed25519 key (AUDIT_SIGNING_KEY, created on first use). The
+batch is stored in audit_batches, and the signed root is forwarded to QRadar as an
+AUDIT_COMMITMENT event, so a copy exists outside the database.
+
+Editing a sealed row changes its leaf hash. Deleting or inserting rows in a sealed range changes
+the leaf count. Rewriting a whole batch breaks the chain or needs the signing key. Only rows
+whose id was already seen on the previous pass are sealed, so a transaction that commits late
+with a lower id is not skipped.
+
+Each batch stores its tree levels and sorted log ids. An inclusion proof
+(GET /admin/audit/proof/<log_id>) is a binary search for the leaf plus log2(batch) sibling
+hashes read from the stored tree, so checking a record does not read its batch. Ranges are verified in
+parallel with:
+    python -m app.audit --verify [--from-id N] [--to-id M] [--workers 8]
+    python -m app.audit --seal          # seal pending rows now
+    python -m app.audit --proof 1234
+    python -m app.audit --public-key    # PEM to hand to auditors
+"""
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import struct
+import threading
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Optional
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.exc import IntegrityError
+
+from .db import SessionLocal, DATABASE_URL
+from .models import ActivityLog, AuditBatch
+from .qradar_logger import qradar_logger
+
+load_dotenv()
+
+AUDIT_SEAL_SECONDS = float(os.getenv("AUDIT_SEAL_SECONDS", "60"))  # 0 disables the background sealer
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "4096"))
+AUDIT_SIGNING_KEY = os.getenv("AUDIT_SIGNING_KEY", "audit_signing.pem")
+COMMITMENT_DOMAIN = b"QAUDIT1"
+GENESIS = b"\x00" * 32
+
+_LOG = ActivityLog.__table__
+_COLUMNS = (_LOG.c.id, _LOG.c.user_id, _LOG.c.timestamp, _LOG.c.action, _LOG.c.ip_address,
+            _LOG.c.user_agent, _LOG.c.status, _LOG.c.details)
+
+
+# ==================== MERKLE TREES ====================
+
+def leaf_hash(row) -> bytes:
+    """Hash of one activity_logs row (id, user_id, timestamp, action, ip, user agent, status, details)"""
+    values = [v.isoformat() if isinstance(v, datetime) else v for v in row]
+    encoded = json.dumps(values, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(b"\x00" + encoded).digest()
+
+
+def _node(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(b"\x01" + left + right).digest()
+
+
+def build_tree(leaves: list) -> list:
+    """Every level of the tree, leaves first; an odd last node is carried up unchanged"""
+    levels = [leaves]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parents = [_node(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parents.append(level[-1])
+        levels.append(parents)
+    return levels
+
+
+def pack_tree(levels: list) -> bytes:
+    return b"".join(b"".join(level) for level in levels)
+
+
+def _level_sizes(count: int) -> list:
+    sizes = [count]
+    while sizes[-1] > 1:
+        sizes.append((sizes[-1] + 1) // 2)
+    return sizes
+
+
+def proof_path(nodes: bytes, count: int, index: int) -> list:
+    """Sibling hashes from leaf index to the root, read straight from a packed tree"""
+    siblings, offset = [], 0
+    for size in _level_sizes(count)[:-1]:
+        sibling = index ^ 1
+        if sibling < size:
+            start = (offset + sibling) * 32
+            siblings.append(nodes[start:start + 32])
+        offset += size
+        index //= 2
+    return siblings
+
+
+def root_from_path(leaf: bytes, count: int, index: int, siblings: list) -> bytes:
+    """Recompute the root from a leaf and its proof path"""
+    node, path = leaf, iter(siblings)
+    for size in _level_sizes(count)[:-1]:
+        if index ^ 1 < size:
+            sibling = next(path)
+            node = _node(sibling, node) if index % 2 else _node(node, sibling)
+        index //= 2
+    return node
+
+
+def commitment_hash(first_id: int, last_id: int, count: int, root: bytes, previous: bytes) -> bytes:
+    return hashlib.sha256(COMMITMENT_DOMAIN + struct.pack("<QQQ", first_id, last_id, count) + root + previous).digest()
+
+
+# ==================== SIGNING KEY ====================
+
+def load_signing_key(path: str = AUDIT_SIGNING_KEY) -> ed25519.Ed25519PrivateKey:
+    """Load the Ed25519 key, creating it atomically on first use (safe with several workers)"""
+    if not os.path.exists(path):
+        key = ed25519.Ed25519PrivateKey.generate()
+        tmp = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                      serialization.NoEncryption()))
+        try:
+            os.link(tmp, path)  # fails if another worker created it first
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp)
+    with open(path, "rb") as f:
+        return serialization.load_pem_private_key(f.read(), password=None)
+
+
+def key_id(public_key) -> str:
+    raw = public_key.public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+    return hashlib.sha256(raw).hexdigest()[:16]
+
+
+# ==================== SEALING ====================
+
+class AuditSealer:
+    """Background sealer committing new activity logs into signed Merkle batches"""
+
+    def __init__(self, session_factory=SessionLocal, key_path: str = AUDIT_SIGNING_KEY,
+                 batch_size: int = AUDIT_BATCH_SIZE, interval: float = AUDIT_SEAL_SECONDS, forward=None):
+        self.session_factory = session_factory
+        self.key_path = key_path
+        self.batch_size = batch_size
+        self.interval = interval
+        self.forward = forward  # callable(event_type, details) receiving each commitment
+        self._key = None
+        self._horizon = None  # highest id seen on the previous pass
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.batches_sealed = 0
+        self.rows_sealed = 0
+        self.last_error = None
+
+    @property
+    def key(self) -> ed25519.Ed25519PrivateKey:
+        if self._key is None:
+            self._key = load_signing_key(self.key_path)
+        return self._key
+
+    def start(self):
+        if self.interval > 0:
+            threading.Thread(target=self._seal_loop, name="audit-sealer", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _seal_loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.seal()
+            except Exception as e:
+                self.last_error = str(e)
+
+    def seal(self, settle: bool = True) -> list:
+        """Seal pending rows; with settle, only ids already seen on the previous pass"""
+        sealed = []
+        with self._lock:
+            db = self.session_factory()
+            try:
+                newest = db.execute(select(_LOG.c.id).order_by(_LOG.c.id.desc()).limit(1)).scalar()
+                horizon = (self._horizon if settle else newest) or 0
+                self._horizon = newest
+                while True:
+                    batch = self._seal_batch(db, horizon)
+                    if batch is None:
+                        break
+                    sealed.append(batch)
+            finally:
+                db.close()
+        for batch in sealed:
+            self.batches_sealed += 1
+            self.rows_sealed += batch.leaf_count
+            if self.forward:
+                self.forward("AUDIT_COMMITMENT", commitment_event(batch))
+        return sealed
+
+    def _seal_batch(self, db, horizon: int) -> Optional[AuditBatch]:
+        previous = db.execute(select(AuditBatch).order_by(AuditBatch.last_log_id.desc()).limit(1)).scalar()
+        after = previous.last_log_id if previous else 0
+        rows = db.execute(
+            select(*_COLUMNS).where(_LOG.c.id > after, _LOG.c.id <= horizon).order_by(_LOG.c.id).limit(self.batch_size)
+        ).all()
+        if not rows:
+            return None
+        levels = build_tree([leaf_hash(row) for row in rows])
+        root = levels[-1][0]
+        previous_commitment = bytes.fromhex(previous.commitment) if previous else GENESIS
+        commitment = commitment_hash(rows[0].id, rows[-1].id, len(rows), root, previous_commitment)
+        batch = AuditBatch(
+            first_log_id=rows[0].id,
+            last_log_id=rows[-1].id,
+            leaf_count=len(rows),
+            root=root.hex(),
+            commitment=commitment.hex(),
+            signature=self.key.sign(commitment).hex(),
+            key_id=key_id(self.key.public_key()),
+            nodes=pack_tree(levels),
+            log_ids=array("Q", (row.id for row in rows)).tobytes(),
+        )
+        db.add(batch)
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()  # another worker sealed this range first
+            return None
+        db.refresh(batch)
+        db.expunge(batch)
+        return batch
+
+    def stats(self) -> dict:
+        return {
+            "batches_sealed": self.batches_sealed,
+            "rows_sealed": self.rows_sealed,
+            "horizon": self._horizon,
+            "last_error": self.last_error,
+        }
+
+
+def commitment_event(batch: AuditBatch) -> dict:
+    return {
+        "event_type": "AUDIT_COMMITMENT",
+        "batch_id": batch.id,
+        "first_log_id": batch.first_log_id,
+        "last_log_id": batch.last_log_id,
+        "leaf_count": batch.leaf_count,
+        "root": batch.root,
+        "commitment": batch.commitment,
+        "signature": batch.signature,
+        "key_id": batch.key_id,
+        "timestamp": datetime.utcnow().isoformat(),
+    }
+
+
+# ==================== PROOFS AND VERIFICATION ====================
+
+def _signature_ok(batch: AuditBatch, public_key) -> bool:
+    try:
+        public_key.verify(bytes.fromhex(batch.signature), bytes.fromhex(batch.commitment))
+        return True
+    except (InvalidSignature, ValueError):
+        return False
+
+
+def inclusion_proof(db, log_id: int, public_key=None) -> Optional[dict]:
+    """Proof that the current row log_id is in its sealed batch; None if no batch covers it"""
+    batch = db.execute(
+        select(AuditBatch).where(AuditBatch.first_log_id <= log_id, AuditBatch.last_log_id >= log_id)
+    ).scalar()
+    if batch is None:
+        return None
+    ids = array("Q")
+    ids.frombytes(batch.log_ids)
+    index = bisect.bisect_left(ids, log_id)
+    if index >= len(ids) or ids[index] != log_id:
+        return {"log_id": log_id, "batch_id": batch.id, "sealed": False, "valid": False,
+                "detail": "id falls inside a sealed range but was not in it: the row was inserted afterwards"}
+    row = db.execute(select(*_COLUMNS).where(_LOG.c.id == log_id)).first()
+    leaf = leaf_hash(row) if row is not None else None
+    siblings = proof_path(batch.nodes, batch.leaf_count, index)
+    valid = (leaf is not None
+             and root_from_path(leaf, batch.leaf_count, index, siblings).hex() == batch.root
+             and _signature_ok(batch, public_key or load_signing_key().public_key()))
+    return {
+        "log_id": log_id,
+        "batch_id": batch.id,
+        "sealed": True,
+        "leaf_index": index,
+        "leaf_count": batch.leaf_count,
+        "leaf_hash": leaf.hex() if leaf else None,
+        "sealed_leaf_hash": batch.nodes[index * 32:(index + 1) * 32].hex(),
+        "siblings": [s.hex() for s in siblings],
+        "root": batch.root,
+        "commitment": batch.commitment,
+        "signature": batch.signature,
+        "key_id": batch.key_id,
+        "valid": valid,
+        "detail": None if valid else ("row deleted" if row is None else "row differs from the sealed record"),
+    }
+
+
+_verify_engine = None
+
+
+def _init_verifier(url: str):
+    global _verify_engine
+    _verify_engine = create_engine(url)
+
+
+def _verify_batch(batch: dict) -> dict:
+    """Recompute one batch's tree from the current rows (runs in a worker process)"""
+    with _verify_engine.connect() as conn:
+        rows = conn.execute(
+            select(*_COLUMNS).where(_LOG.c.id >= batch["first_log_id"], _LOG.c.id <= batch["last_log_id"])
+            .order_by(_LOG.c.id)
+        ).all()
+    sealed_ids = array("Q")
+    sealed_ids.frombytes(batch["log_ids"])
+    current = {row.id: leaf_hash(row) for row in rows}
+    problems = []
+    for i, log_id in enumerate(sealed_ids):
+        leaf = current.pop(log_id, None)
+        if leaf is None:
+            problems.append({"log_id": log_id, "problem": "deleted"})
+        elif leaf != batch["nodes"][i * 32:(i + 1) * 32]:
+            problems.append({"log_id": log_id, "problem": "modified"})
+    problems.extend({"log_id": log_id, "problem": "inserted"} for log_id in sorted(current))
+    # The stored leaves are only trusted once they rebuild the signed root
+    sealed_leaves = [batch["nodes"][i:i + 32] for i in range(0, batch["leaf_count"] * 32, 32)]
+    if build_tree(sealed_leaves)[-1][0].hex() != batch["root"]:
+        problems.append({"problem": "stored tree does not match the signed root"})
+    return {"batch_id": batch["id"], "rows": len(rows), "ok": not problems, "problems": problems}
+
+
+def verify_range(db, first_id: int = None, last_id: int = None, workers: int = None, url: str = DATABASE_URL,
+                 public_key=None) -> dict:
+    """Verify every batch overlapping [first_id, last_id]: signatures and chain here, trees in parallel"""
+    public_key = public_key or load_signing_key().public_key()
+    query = select(AuditBatch).order_by(AuditBatch.first_log_id)
+    if first_id is not None:
+        query = query.where(AuditBatch.last_log_id >= first_id)
+    if last_id is not None:
+        query = query.where(AuditBatch.first_log_id <= last_id)
+    batches = db.execute(query).scalars().all()
+
+    failures = []
+    previous = None
+    if batches:
+        previous = db.execute(
+            select(AuditBatch).where(AuditBatch.last_log_id < batches[0].first_log_id)
+            .order_by(AuditBatch.last_log_id.desc()).limit(1)
+        ).scalar()
+    for batch in batches:
+        previous_commitment = bytes.fromhex(previous.commitment) if previous else GENESIS
+        expected = commitment_hash(batch.first_log_id, batch.last_log_id, batch.leaf_count,
+                                   bytes.fromhex(batch.root), previous_commitment)
+        if expected.hex() != batch.commitment:
+            failures.append({"batch_id": batch.id, "problems": [{"problem": "chain broken or batch rewritten"}]})
+        elif not _signature_ok(batch, public_key):
+            failures.append({"batch_id": batch.id, "problems": [{"problem": "bad signature"}]})
+        previous = batch
+
+    jobs = [{"id": b.id, "first_log_id": b.first_log_id, "last_log_id": b.last_log_id, "leaf_count": b.leaf_count,
+             "root": b.root, "nodes": b.nodes, "log_ids": b.log_ids} for b in batches]
+    rows = 0
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1,
+                             initializer=_init_verifier, initargs=(str(url),)) as executor:
+        for result in executor.map(_verify_batch, jobs, chunksize=4):
+            rows += result["rows"]
+            if not result["ok"]:
+                failures.append({"batch_id": result["batch_id"], "problems": result["problems"]})
+
+    unsealed = db.execute(
+        select(func.count()).select_from(_LOG).where(_LOG.c.id > (batches[-1].last_log_id if batches else 0))
+    ).scalar() if last_id is None else None
+    return {"batches": len(batches), "rows": rows, "failures": failures, "unsealed_rows": unsealed}
+
+
+# Global instance
+audit_sealer = AuditSealer(forward=qradar_logger.send_event)
+
+
+if __name__ == "__main__":
+    import time
+
+    parser = argparse.ArgumentParser(description="Seal and verify the tamper-evident activity log")
+    parser.add_argument("--seal", action="store_true", help="seal all pending rows now")
+    parser.add_argument("--verify", action="store_true", help="verify sealed batches")
+    parser.add_argument("--from-id", type=int)
+    parser.add_argument("--to-id", type=int)
+    parser.add_argument("--workers", type=int, help="verification processes (default: CPU count)")
+    parser.add_argument("--proof", type=int, metavar="LOG_ID", help="print the inclusion proof of one row")
+    parser.add_argument("--public-key", action="store_true", help="print the public key that checks signatures")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.seal:
+            batches = audit_sealer.seal(settle=False)
+            print(f"✓ Sealed {sum(b.leaf_count for b in batches)} rows in {len(batches)} batch(es)")
+        elif args.verify:
+            start = time.perf_counter()
+            result = verify_range(db, args.from_id, args.to_id, args.workers)
+            elapsed = time.perf_counter() - start
+            mark = "✓" if not result["failures"] else "✗"
+            print(f"{mark} {result['batches']} batches, {result['rows']} rows verified in {elapsed:.2f}s")
+            for failure in result["failures"]:
+                for problem in failure["problems"][:20]:
+                    print(f"  batch {failure['batch_id']}: {problem.get('log_id', '-')} {problem['problem']}")
+            if result["unsealed_rows"]:
+                print(f"  {result['unsealed_rows']} newer rows are not sealed yet")
+        elif args.proof is not None:
+            print(json.dumps(inclusion_proof(db, args.proof), indent=2))
+        elif args.public_key:
+            print(load_signing_key().public_key().public_bytes(
+                serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo).decode())
+        else:
+            parser.print_help()
+    finally:
+        db.close()
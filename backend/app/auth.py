@@ -12,17 +12,20 @@ import os
 from dotenv import load_dotenv
 from .models import User
 from .qradar_logger import qradar_logger
+from .baselines import login_baselines
+from .jwt_keys import key_set, JWT_ALGORITHM
+from .lockout import lockout_tracker, LOCKOUT_MAX_ATTEMPTS, LOCKOUT_DURATION_SECONDS
 
 load_dotenv()
 
 # Security configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-change-in-production")
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "dev-jwt-secret-change-in-production")
-ALGORITHM = "HS256"
+ALGORITHM = JWT_ALGORITHM  # HS256 signs with JWT_SECRET_KEY; ES256/EdDSA use the key set in jwt_keys.py
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 1 day
 REFRESH_TOKEN_EXPIRE_DAYS = 7
-MAX_LOGIN_ATTEMPTS = 5
-LOCKOUT_DURATION = timedelta(minutes=15)
+MAX_LOGIN_ATTEMPTS = LOCKOUT_MAX_ATTEMPTS
+LOCKOUT_DURATION = timedelta(seconds=LOCKOUT_DURATION_SECONDS)
 
 # Pydantic models for request/response
 class Token(BaseModel):
@@ -57,6 +60,11 @@ def get_password_hash(password: str) -> str:
     return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
 
 # Token utilities
+def _encode(claims: dict) -> str:
+    if key_set.enabled:
+        return key_set.encode(claims)
+    return jwt.encode(claims, JWT_SECRET_KEY, algorithm=ALGORITHM)
+
 def create_tokens(data: dict, expires_delta: Optional[timedelta] = None) -> tuple:
     """Create access and refresh JWT tokens"""
     to_encode = data.copy()
@@ -64,17 +72,19 @@ def create_tokens(data: dict, expires_delta: Optional[timedelta] = None) -> tupl
     # Access token
     access_expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": access_expire, "type": "access"})
-    access_token = jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=ALGORITHM)
+    access_token = _encode(to_encode)
     
     # Refresh token
     refresh_expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
     to_encode.update({"exp": refresh_expire, "type": "refresh"})
-    refresh_token = jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=ALGORITHM)
+    refresh_token = _encode(to_encode)
     
     return access_token, refresh_token
 
 def decode_token(token: str) -> Optional[dict]:
     """Decode JWT token and return payload or None if invalid"""
+    if key_set.enabled:
+        return key_set.decode(token)
     try:
         payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[ALGORITHM])
         return payload
@@ -91,34 +101,35 @@ def authenticate_user(db: Session, username: str, password: str, ip_address: str
         return False
     
     # Check if account is locked
-    if user.locked_until and user.locked_until > datetime.utcnow():
+    locked_until = lockout_tracker.locked_until(db, username)
+    if locked_until:
         qradar_logger.log_login_attempt(username, ip_address, False, {
             "reason": "account_locked",
-            "locked_until": user.locked_until.isoformat()
+            "locked_until": locked_until.isoformat()
         })
         return False
     
     if not verify_password(password, user.hashed_password):
-        user.login_attempts += 1
-        
-        if user.login_attempts >= MAX_LOGIN_ATTEMPTS:
-            user.locked_until = datetime.utcnow() + LOCKOUT_DURATION
+        # One atomic upsert on login_failures; the users row is not written
+        failure = lockout_tracker.record_failure(db, username)
+        if failure["newly_locked"]:
             qradar_logger.log_suspicious_activity(username, ip_address, "multiple_failed_logins")
         
-        db.commit()
         qradar_logger.log_login_attempt(username, ip_address, False, {
             "reason": "invalid_password",
-            "attempts": user.login_attempts
+            "attempts": failure["attempts"],
+            "anomaly": login_baselines.observe(username, ip_address, False)
         })
         return False
     
     # Successful login
-    user.login_attempts = 0
+    lockout_tracker.reset(db, username)
     user.last_login = datetime.utcnow()
-    user.locked_until = None
     db.commit()
     
-    qradar_logger.log_login_attempt(username, ip_address, True)
+    qradar_logger.log_login_attempt(username, ip_address, True, {
+        "anomaly": login_baselines.observe(username, ip_address, True)
+    })
     return user
 
 def get_current_user(db: Session, token: str) -> Optional[User]:
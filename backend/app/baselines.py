@@ -0,0 +1,297 @@
+"""
+Login baselines - fixed-size per-user behaviour sketches that score each login for anomalies.
+Every user is one 152-byte record:
+    HyperLogLog (64 registers)     distinct source IPs seen for the user
+    recent IPs (8 x 32-bit hash)   the user's last 8 distinct IPs
+    hour histogram (24 x uint16)   successful logins per UTC hour, halved when a bucket saturates
+    login count
+Global count-min sketches track how often each IP and subnet is seen across all users, so a
+shared corporate egress IP is less suspicious than an unknown one.
+
+score() returns 0..1: high when the IP is not among the user's recent IPs (discounted for users
+who roam a lot and for globally common IPs) and when the hour is rare for the user. Users with
+fewer than BASELINE_MIN_LOGINS logins score 0 while the baseline is learning. Only successful
+logins update a baseline, so failed attempts cannot train it. Snapshots are written to
+BASELINE_SNAPSHOT_FILE every BASELINE_SNAPSHOT_SECONDS and loaded at startup.
+
+Inspect a snapshot or measure scoring cost with:
+    python -m app.baselines --user alice
+    python -m app.baselines --bench
+"""
+import argparse
+import hashlib
+import math
+import os
+import struct
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BASELINE_SNAPSHOT_FILE = os.getenv("BASELINE_SNAPSHOT_FILE", "login_baselines.snapshot")
+BASELINE_SNAPSHOT_SECONDS = float(os.getenv("BASELINE_SNAPSHOT_SECONDS", "300"))  # 0 disables snapshots
+BASELINE_MAX_USERS = int(os.getenv("BASELINE_MAX_USERS", "1000000"))  # least recently seen are evicted
+BASELINE_MIN_LOGINS = int(os.getenv("BASELINE_MIN_LOGINS", "5"))
+BASELINE_POPULAR_IP = 50  # logins from one IP across all users at which it counts as common
+
+# Record layout (bytes)
+HLL_P = 6
+HLL_REGISTERS = 1 << HLL_P
+RECENT_IPS = 8
+_RECENT = slice(HLL_REGISTERS, HLL_REGISTERS + RECENT_IPS * 4)
+_HOURS = slice(_RECENT.stop, _RECENT.stop + 24 * 2)
+_COUNT = slice(_HOURS.stop, _HOURS.stop + 8)
+RECORD_SIZE = _COUNT.stop
+_HLL_ALPHA = 0.709  # bias correction for 64 registers
+_INV_POW2 = [2.0 ** -r for r in range(65)]
+
+CMS_WIDTH = 1 << 16
+CMS_DEPTH = 4
+SNAPSHOT_MAGIC = b"QLB1"
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _subnet(ip: str) -> str:
+    """/24 for IPv4, /48 for IPv6 (textual prefix, good enough for a frequency sketch)"""
+    if ":" in ip:
+        return ":".join(ip.split(":")[:3])
+    return ip.rsplit(".", 1)[0]
+
+
+class CountMinSketch:
+    """Fixed-size frequency sketch; estimates never undercount"""
+
+    def __init__(self, width: int = CMS_WIDTH, depth: int = CMS_DEPTH):
+        self.width = width
+        self.depth = depth
+        self.rows = [array("I", bytes(4 * width)) for _ in range(depth)]
+        self.total = 0
+
+    def indexes(self, h: int) -> list:
+        """Cell of each row for hash h; compute once and pass to add()/estimate()"""
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def add(self, indexes, n: int = 1):
+        self.total += n
+        for row, i in zip(self.rows, indexes):
+            if row[i] < 0xFFFFFFFF:
+                row[i] += n
+
+    def estimate(self, indexes) -> int:
+        return min([row[i] for row, i in zip(self.rows, indexes)])
+
+
+class LoginBaselines:
+    """Per-user login sketches with anomaly scoring and periodic snapshots"""
+
+    def __init__(self, snapshot_file: str = BASELINE_SNAPSHOT_FILE,
+                 snapshot_seconds: float = BASELINE_SNAPSHOT_SECONDS, max_users: int = BASELINE_MAX_USERS,
+                 min_logins: int = BASELINE_MIN_LOGINS):
+        self.snapshot_file = snapshot_file
+        self.max_users = max_users
+        self.min_logins = min_logins
+        self.users = OrderedDict()  # username -> bytearray(RECORD_SIZE)
+        self.ips = CountMinSketch()
+        self.subnets = CountMinSketch()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.evictions = 0
+        self.scored = 0
+        self.score_seconds = 0.0
+        self.last_snapshot = None
+        if snapshot_file and os.path.exists(snapshot_file):
+            self.load(snapshot_file)
+        if snapshot_file and snapshot_seconds > 0:
+            threading.Thread(
+                target=self._snapshot_loop, args=(snapshot_seconds,), name="login-baselines", daemon=True
+            ).start()
+
+    # ==================== SCORING ====================
+
+    @staticmethod
+    def _distinct_ips(record) -> float:
+        registers = record[:HLL_REGISTERS]
+        estimate = _HLL_ALPHA * HLL_REGISTERS * HLL_REGISTERS / sum(map(_INV_POW2.__getitem__, registers))
+        zeros = registers.count(0)
+        if estimate <= 2.5 * HLL_REGISTERS and zeros:
+            estimate = HLL_REGISTERS * math.log(HLL_REGISTERS / zeros)  # linear counting for small sets
+        return estimate
+
+    def _score(self, record, ip_hash: int, ip_cells, subnet_cells, hour: int) -> dict:
+        view = memoryview(record)
+        logins = view[_COUNT].cast("I")[0]
+        recent = view[_RECENT].cast("I")
+        hours = view[_HOURS].cast("H")
+        ip_key = (ip_hash & 0xFFFFFFFF) or 1
+        new_ip = ip_key not in recent
+        distinct = self._distinct_ips(record)
+        result = {"score": 0.0, "new_ip": new_ip, "distinct_ips": round(distinct), "logins": logins}
+        if logins < self.min_logins:
+            result["learning"] = True
+            return result
+
+        ip_component = 0.0
+        if new_ip:
+            roaming = min(distinct / logins, 1.0)  # share of logins that came from new IPs so far
+            popular = min(self.ips.estimate(ip_cells) / BASELINE_POPULAR_IP, 1.0)
+            known_subnet = min(self.subnets.estimate(subnet_cells) / BASELINE_POPULAR_IP, 1.0)
+            ip_component = (1.0 - roaming) * (1.0 - 0.5 * popular) * (1.0 - 0.25 * known_subnet)
+
+        peak = max(hours)
+        around = hours[hour] + 0.5 * (hours[hour - 1] + hours[(hour + 1) % 24])
+        hour_component = 1.0 - min(around / peak, 1.0) if peak else 0.0
+        result["unusual_hour"] = hour_component > 0.9
+        result["score"] = round(0.6 * ip_component + 0.4 * hour_component, 3)
+        return result
+
+    def _update(self, record, ip_hash: int, hour: int):
+        view = memoryview(record)
+        counters = view[_COUNT].cast("I")
+        recent = view[_RECENT].cast("I")
+        hours = view[_HOURS].cast("H")
+        index = ip_hash >> (64 - HLL_P)
+        rank = (64 - HLL_P) - (ip_hash & ((1 << (64 - HLL_P)) - 1)).bit_length() + 1
+        if rank > record[index]:
+            record[index] = rank
+        ip_key = (ip_hash & 0xFFFFFFFF) or 1
+        if ip_key not in recent:
+            recent[counters[1] % RECENT_IPS] = ip_key  # ring of the last distinct IPs
+            counters[1] += 1
+        if hours[hour] == 0xFFFF:
+            for h in range(24):
+                hours[h] >>= 1
+        hours[hour] += 1
+        counters[0] += 1
+
+    def observe(self, username: str, ip_address: str, success: bool, when: datetime = None) -> dict:
+        """Score a login for username; successful logins then update the baseline"""
+        start = time.perf_counter()
+        hour = (when or datetime.utcnow()).hour
+        ip = ip_address or "unknown"
+        ip_hash = _hash64(ip)
+        ip_cells = self.ips.indexes(ip_hash)
+        subnet_cells = self.subnets.indexes(_hash64(_subnet(ip)))
+        with self._lock:
+            record = self.users.get(username)
+            if record is None:
+                if not success:
+                    return {"score": 0.0, "learning": True}
+                record = self.users[username] = bytearray(RECORD_SIZE)
+                if len(self.users) > self.max_users:
+                    self.users.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self.users.move_to_end(username)
+            result = self._score(record, ip_hash, ip_cells, subnet_cells, hour)
+            if success:
+                self._update(record, ip_hash, hour)
+                self.ips.add(ip_cells)
+                self.subnets.add(subnet_cells)
+        self.scored += 1
+        self.score_seconds += time.perf_counter() - start
+        return result
+
+    # ==================== SNAPSHOTS ====================
+
+    def save(self, path: str = None):
+        """Write all sketches to path atomically"""
+        path = path or self.snapshot_file
+        tmp = f"{path}.tmp"
+        with self._lock:
+            users = list(self.users.items())
+            sketches = [bytes(row) for cms in (self.ips, self.subnets) for row in cms.rows]
+            totals = (self.ips.total, self.subnets.total)
+        with open(tmp, "wb") as f:
+            f.write(SNAPSHOT_MAGIC + struct.pack("<IIIQQ", RECORD_SIZE, CMS_WIDTH, CMS_DEPTH, *totals))
+            for row in sketches:
+                f.write(row)
+            f.write(struct.pack("<Q", len(users)))
+            for username, record in users:
+                name = username.encode("utf-8")
+                f.write(struct.pack("<H", len(name)) + name + bytes(record))
+        os.replace(tmp, path)
+        self.last_snapshot = time.time()
+
+    def load(self, path: str):
+        with open(path, "rb") as f:
+            header = f.read(4 + struct.calcsize("<IIIQQ"))
+            if header[:4] != SNAPSHOT_MAGIC:
+                return
+            record_size, width, depth, ip_total, subnet_total = struct.unpack("<IIIQQ", header[4:])
+            if (record_size, width, depth) != (RECORD_SIZE, CMS_WIDTH, CMS_DEPTH):
+                return  # layout changed; start a fresh baseline
+            for cms in (self.ips, self.subnets):
+                for i in range(depth):
+                    cms.rows[i] = array("I", f.read(4 * width))
+            self.ips.total, self.subnets.total = ip_total, subnet_total
+            (count,) = struct.unpack("<Q", f.read(8))
+            for _ in range(count):
+                (length,) = struct.unpack("<H", f.read(2))
+                username = f.read(length).decode("utf-8")
+                self.users[username] = bytearray(f.read(RECORD_SIZE))
+
+    def _snapshot_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.save()
+            except OSError:
+                pass
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self.users),
+            "evictions": self.evictions,
+            "scored": self.scored,
+            "avg_score_us": round(self.score_seconds * 1e6 / self.scored, 2) if self.scored else None,
+            "memory_bytes": len(self.users) * RECORD_SIZE + 2 * CMS_DEPTH * CMS_WIDTH * 4,
+            "last_snapshot": self.last_snapshot,
+        }
+
+
+# Global instance
+login_baselines = LoginBaselines()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect login baselines or benchmark scoring")
+    parser.add_argument("--user", help="print the baseline of one user from the snapshot")
+    parser.add_argument("--bench", action="store_true", help="measure observe() cost on synthetic logins")
+    args = parser.parse_args()
+
+    if args.bench:
+        import random
+
+        bench = LoginBaselines(snapshot_file=None)
+        users = [f"user{i}" for i in range(100000)]
+        logins = [(random.choice(users), f"10.{random.randint(0, 3)}.{random.randint(0, 255)}.{random.randint(1, 254)}",
+                   datetime(2024, 1, 1, random.choice((8, 9, 10, 11, 14, 15, 16)))) for _ in range(300000)]
+        start = time.perf_counter()
+        for username, ip, when in logins:
+            bench.observe(username, ip, True, when)
+        elapsed = time.perf_counter() - start
+        stats = bench.stats()
+        print(f"✓ {len(logins)} logins for {stats['users']} users: {elapsed * 1e6 / len(logins):.2f} us per login, "
+              f"{stats['memory_bytes'] / 1e6:.1f} MB of sketches")
+    elif args.user:
+        record = login_baselines.users.get(args.user)
+        if record is None:
+            print(f"No baseline for {args.user}")
+        else:
+            view = memoryview(record)
+            print(f"  logins:       {view[_COUNT].cast('I')[0]}")
+            print(f"  distinct IPs: ~{LoginBaselines._distinct_ips(record):.0f}")
+            print(f"  hours (UTC):  {list(view[_HOURS].cast('H'))}")
+    else:
+        print(login_baselines.stats())
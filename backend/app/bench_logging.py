@@ -0,0 +1,95 @@
+"""
+Benchmark the logging pipeline - compares the old synchronous file+console handlers with the
+queued background writer used by logger_conf and QRadarLogger.
+
+Usage:
+    python -m app.bench_logging [--records 50000] [--threads 4]
+
+Console output goes to os.devnull so terminal speed does not skew the numbers. Reported
+numbers are caller-side: how fast request threads can log, and the p99 cost of one call.
+"""
+import argparse
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from .log_handlers import attach_queued_handlers, CompressingRotatingFileHandler, _queue
+
+FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+def _sync_logger(path, devnull):
+    logger = logging.getLogger("bench.sync")
+    logger.handlers.clear()
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    for handler in (logging.FileHandler(path), logging.StreamHandler(devnull)):
+        handler.setFormatter(logging.Formatter(FORMAT))
+        logger.addHandler(handler)
+    return logger
+
+
+def _queued_logger(path, devnull):
+    logger = logging.getLogger("bench.queued")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    handlers = [CompressingRotatingFileHandler(path), logging.StreamHandler(devnull)]
+    for handler in handlers:
+        handler.setFormatter(logging.Formatter(FORMAT))
+    return attach_queued_handlers(logger, handlers)
+
+
+def _run(logger, records, threads):
+    per_thread = records // threads
+    latencies = []
+
+    def work():
+        local = []
+        for i in range(per_thread):
+            start = time.perf_counter()
+            logger.info("Event sent to QRadar: LOGIN_ATTEMPT user=%s seq=%d", "alice", i)
+            local.append(time.perf_counter() - start)
+        latencies.extend(local)
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "records_per_sec": per_thread * threads / elapsed,
+        "p50_us": latencies[len(latencies) // 2] * 1e6,
+        "p99_us": latencies[int(len(latencies) * 0.99)] * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark synchronous vs queued logging")
+    parser.add_argument("--records", type=int, default=50000)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull:
+        results = {
+            "synchronous": _run(_sync_logger(os.path.join(tmp, "sync.log"), devnull), args.records, args.threads),
+            "queued": _run(_queued_logger(os.path.join(tmp, "queued.log"), devnull), args.records, args.threads),
+        }
+        # Let the writer catch up so the drain time is visible too
+        drain_start = time.perf_counter()
+        while not _queue.empty():
+            time.sleep(0.01)
+        drain = time.perf_counter() - drain_start
+
+    print(f"{args.records} records, {args.threads} threads")
+    for name, r in results.items():
+        print(f"  {name:<12} {r['records_per_sec']:>10.0f} rec/s   p50 {r['p50_us']:7.1f} us   p99 {r['p99_us']:7.1f} us")
+    print(f"  background writer drained the remaining queue in {drain:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Benchmark the syslog transports - compares plain TCP with TLS (RFC 5425) against local listeners.
+
+Usage:
+    python -m app.bench_transport [--events 200000] [--batch 100] [--reconnects 200]
+
+A throwaway CA and a localhost certificate are generated, so the TLS client verifies the
+listener exactly as it would verify a collector. Reported numbers:
+    throughput  events/sec over one long-lived connection, until the listener has read everything
+    reconnect   cost of connect + first send: plain TCP, TLS with a full handshake each time,
+                and TLS resuming the previous session
+"""
+import argparse
+import datetime
+import os
+import socket
+import ssl
+import tempfile
+import threading
+import time
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+from .qradar_transport import SyslogDestination, TLSSyslogDestination, tls_context
+
+MESSAGE = ('<134>Oct 18 12:00:00 web01 WebApp: type="LOGIN_ATTEMPT" details="{"username": "alice", '
+           '"ip_address": "10.0.0.5", "status": "failure", "details": {"reason": "invalid_password"}}"')
+
+
+def write_certificates(directory):
+    """Self-signed CA plus a localhost server certificate; returns (ca, cert, key) paths"""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    ca_key = ec.generate_private_key(ec.SECP256R1())
+    ca_name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "bench CA")])
+    ca = (x509.CertificateBuilder().subject_name(ca_name).issuer_name(ca_name)
+          .public_key(ca_key.public_key()).serial_number(x509.random_serial_number())
+          .not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1))
+          .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+          .sign(ca_key, hashes.SHA256()))
+    key = ec.generate_private_key(ec.SECP256R1())
+    cert = (x509.CertificateBuilder()
+            .subject_name(x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")]))
+            .issuer_name(ca_name).public_key(key.public_key()).serial_number(x509.random_serial_number())
+            .not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1))
+            .add_extension(x509.SubjectAlternativeName([x509.DNSName("localhost")]), critical=False)
+            .sign(ca_key, hashes.SHA256()))
+    paths = [os.path.join(directory, name) for name in ("ca.pem", "server.pem", "server.key")]
+    with open(paths[0], "wb") as f:
+        f.write(ca.public_bytes(serialization.Encoding.PEM))
+    with open(paths[1], "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(paths[2], "wb") as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+    return paths
+
+
+class Listener:
+    """Local syslog sink counting received bytes; wraps connections in TLS when given a context"""
+
+    def __init__(self, context=None):
+        self.context = context
+        self.received = 0
+        self.lock = threading.Lock()
+        self.sock = socket.create_server(("127.0.0.1", 0))
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._read, args=(conn,), daemon=True).start()
+
+    def _read(self, conn):
+        try:
+            if self.context:
+                conn = self.context.wrap_socket(conn, server_side=True)
+            while True:
+                data = conn.recv(262144)
+                if not data:
+                    break
+                with self.lock:
+                    self.received += len(data)
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+    def wait_for(self, total, timeout=60.0):
+        deadline = time.monotonic() + timeout
+        while self.received < total and time.monotonic() < deadline:
+            time.sleep(0.001)
+
+    def close(self):
+        self.sock.close()
+
+
+def _throughput(dest, listener, events, batch):
+    messages = [MESSAGE] * batch
+    start = time.perf_counter()
+    for _ in range(events // batch):
+        dest.send(messages)
+    listener.wait_for(dest.sent_bytes)
+    elapsed = time.perf_counter() - start
+    dest.close()
+    return (events // batch) * batch / elapsed, dest.sent_bytes / elapsed / 1e6
+
+
+def _reconnects(dest, reconnects, resume=True):
+    timings = []
+    for _ in range(reconnects):
+        dest.close()
+        if not resume and hasattr(dest, "tls_session"):
+            dest.tls_session = None
+        start = time.perf_counter()
+        dest.send([MESSAGE])
+        timings.append(time.perf_counter() - start)
+    dest.close()
+    timings.sort()
+    return timings[len(timings) // 2] * 1000, timings[int(len(timings) * 0.99)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark plain TCP vs TLS syslog transport")
+    parser.add_argument("--events", type=int, default=200000)
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--reconnects", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ca_file, cert_file, key_file = write_certificates(tmp)
+        server_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        server_context.load_cert_chain(cert_file, key_file)
+        tcp_listener, tls_listener = Listener(), Listener(server_context)
+
+        def tcp():
+            return SyslogDestination("127.0.0.1", tcp_listener.port, "TCP")
+
+        def tls():
+            return TLSSyslogDestination("localhost", tls_listener.port, tls_context(ca_file=ca_file))
+
+        throughput = {"tcp": _throughput(tcp(), tcp_listener, args.events, args.batch),
+                      "tls": _throughput(tls(), tls_listener, args.events, args.batch)}
+        resumed_dest = tls()
+        reconnect = {
+            "tcp": _reconnects(tcp(), args.reconnects),
+            "tls full handshake": _reconnects(tls(), args.reconnects, resume=False),
+            "tls resumed": _reconnects(resumed_dest, args.reconnects),
+        }
+        tcp_listener.close()
+        tls_listener.close()
+
+    print(f"{args.events} events in batches of {args.batch}")
+    for name, (eps, mbps) in throughput.items():
+        print(f"  {name:<5} {eps:>10.0f} events/s  {mbps:7.1f} MB/s")
+    print(f"reconnect + first send, {args.reconnects} times")
+    for name, (p50, p99) in reconnect.items():
+        print(f"  {name:<20} p50 {p50:7.3f} ms   p99 {p99:7.3f} ms")
+    print(f"  sessions resumed: {resumed_dest.resumed}/{resumed_dest.connects} ({resumed_dest.tls_version})")
+
+
+if __name__ == "__main__":
+    main()
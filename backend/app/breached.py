@@ -0,0 +1,241 @@
+"""
+Breached passwords - offline screening of new passwords against a local breach corpus.
+
+A Bloom filter is built once from a breached-hash dump: SHA-1 hex digests, one per line,
+optionally followed by ':count' (the Have I Been Pwned download format). With --plaintext the
+lines are passwords and are hashed while building. The filter file is memory-mapped read-only,
+so every worker shares one copy from the page cache and startup does not read the file. A
+check is one SHA-1 and k bit probes (a few microseconds), so it runs before bcrypt.
+The SHA-1 digest is already uniform, so its first two 64-bit words drive the double hashing.
+
+False positives (a fresh password wrongly rejected) happen at the rate chosen when building;
+there are no false negatives. Build and inspect with:
+    python -m app.breached --build pwned-passwords-sha1.txt --output breached.bloom --fp-rate 0.001
+    python -m app.breached --build rockyou.txt --plaintext --output breached.bloom
+    python -m app.breached --report breached.bloom
+    python -m app.breached --check 'P@ssw0rd'
+"""
+import argparse
+import hashlib
+import math
+import mmap
+import os
+import struct
+import time
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BREACHED_PASSWORD_FILTER = os.getenv("BREACHED_PASSWORD_FILTER")  # filter file; unset disables screening
+
+MAGIC = b"QBF1"
+HEADER = struct.Struct("<4sQIQd")  # magic, bits, hashes, items, target false-positive rate
+_MASK64 = (1 << 64) - 1
+
+
+def _probes(digest: bytes, bits: int, hashes: int):
+    """Bit positions for a SHA-1 digest (Kirsch-Mitzenmacher double hashing)"""
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:16], "little") | 1
+    return [((h1 + i * h2) & _MASK64) % bits for i in range(hashes)]
+
+
+def filter_size(items: int, fp_rate: float) -> tuple:
+    """(bits, hashes) for a Bloom filter of items at the target false-positive rate"""
+    items = max(items, 1)
+    bits = math.ceil(-items * math.log(fp_rate) / (math.log(2) ** 2))
+    bits = (bits + 7) // 8 * 8
+    hashes = max(1, round(bits / items * math.log(2)))
+    return bits, hashes
+
+
+def expected_fp_rate(bits: int, hashes: int, items: int) -> float:
+    return (1.0 - math.exp(-hashes * items / bits)) ** hashes
+
+
+# ==================== BUILDING ====================
+
+def _digests(path: str, plaintext: bool = False, min_count: int = 1):
+    """SHA-1 digests from a dump; skips blank, malformed and rarer-than-min_count lines"""
+    with open(path, "rb") as f:
+        for line in f:
+            line = line.rstrip(b"\r\n")
+            if not line:
+                continue
+            if plaintext:
+                yield hashlib.sha1(line).digest()
+                continue
+            hex_digest, _, count = line.partition(b":")
+            if min_count > 1 and count and int(count) < min_count:
+                continue
+            try:
+                yield bytes.fromhex(hex_digest.decode("ascii"))
+            except ValueError:
+                continue
+
+
+def _count_lines(path: str) -> int:
+    lines = 0
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(1 << 24)
+            if not chunk:
+                return lines
+            lines += chunk.count(b"\n")
+
+
+def build(source: str, output: str, fp_rate: float = 0.001, expected_items: int = None,
+          plaintext: bool = False, min_count: int = 1) -> dict:
+    """Build a filter file from a dump; sized from expected_items or a counting pass"""
+    expected_items = expected_items or _count_lines(source) + 1
+    bits, hashes = filter_size(expected_items, fp_rate)
+    array_bytes = bits // 8
+    start = time.perf_counter()
+
+    tmp = f"{output}.tmp"
+    with open(tmp, "w+b") as f:
+        f.truncate(HEADER.size + array_bytes)
+        with mmap.mmap(f.fileno(), 0) as mm:
+            filter_bits = memoryview(mm)[HEADER.size:]
+            items = 0
+            for digest in _digests(source, plaintext, min_count):
+                if len(digest) != 20:
+                    continue
+                for bit in _probes(digest, bits, hashes):
+                    filter_bits[bit >> 3] |= 1 << (bit & 7)
+                items += 1
+            filter_bits.release()
+            mm[:HEADER.size] = HEADER.pack(MAGIC, bits, hashes, items, fp_rate)
+            mm.flush()
+    os.replace(tmp, output)
+    return {
+        "items": items,
+        "bits": bits,
+        "hashes": hashes,
+        "size_mb": round((HEADER.size + array_bytes) / 1e6, 1),
+        "seconds": round(time.perf_counter() - start, 1),
+    }
+
+
+# ==================== SCREENING ====================
+
+class BreachedPasswordFilter:
+    """Read-only, memory-mapped Bloom filter of breached password hashes"""
+
+    def __init__(self, path: Optional[str] = BREACHED_PASSWORD_FILTER):
+        self.path = path
+        self._mm = None
+        self.bits = self.hashes = self.items = 0
+        self.target_fp_rate = None
+        self.checks = 0
+        self.hits = 0
+        self.check_seconds = 0.0
+        self.error = None
+        if path:
+            try:
+                self.open(path)
+            except (OSError, ValueError) as e:
+                self.error = str(e)  # screening stays off rather than blocking every signup
+
+    def open(self, path: str):
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, bits, hashes, items, fp_rate = HEADER.unpack_from(mm)
+        if magic != MAGIC or len(mm) < HEADER.size + bits // 8:
+            mm.close()
+            raise ValueError(f"{path} is not a breached password filter")
+        self._mm, self.bits, self.hashes, self.items, self.target_fp_rate = mm, bits, hashes, items, fp_rate
+
+    @property
+    def enabled(self) -> bool:
+        return self._mm is not None
+
+    def contains_digest(self, digest: bytes) -> bool:
+        mm = self._mm
+        offset = HEADER.size
+        for bit in _probes(digest, self.bits, self.hashes):
+            if not mm[offset + (bit >> 3)] >> (bit & 7) & 1:
+                return False
+        return True
+
+    def is_breached(self, password: str) -> bool:
+        """True if password is (probably) in the breach corpus; False when screening is off"""
+        if self._mm is None:
+            return False
+        start = time.perf_counter()
+        found = self.contains_digest(hashlib.sha1(password.encode("utf-8")).digest())
+        self.checks += 1
+        self.hits += found
+        self.check_seconds += time.perf_counter() - start
+        return found
+
+    def report(self, samples: int = 200000) -> dict:
+        """Fill ratio, expected false-positive rate and one measured on random non-members"""
+        ones = 0
+        view = memoryview(self._mm)[HEADER.size:HEADER.size + self.bits // 8]
+        for i in range(0, len(view), 1 << 20):
+            ones += int.from_bytes(view[i:i + (1 << 20)], "little").bit_count()
+        view.release()
+        start = time.perf_counter()
+        false_positives = sum(self.contains_digest(os.urandom(20)) for _ in range(samples))
+        elapsed = time.perf_counter() - start
+        return {
+            "items": self.items,
+            "size_mb": round(len(self._mm) / 1e6, 1),
+            "bits_per_item": round(self.bits / max(self.items, 1), 2),
+            "hashes": self.hashes,
+            "fill_ratio": round(ones / self.bits, 4),
+            "target_fp_rate": self.target_fp_rate,
+            "expected_fp_rate": expected_fp_rate(self.bits, self.hashes, self.items),
+            "measured_fp_rate": false_positives / samples,
+            "samples": samples,
+            "lookup_us": round(elapsed * 1e6 / samples, 2),
+        }
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "items": self.items,
+            "checks": self.checks,
+            "hits": self.hits,
+            "avg_check_us": round(self.check_seconds * 1e6 / self.checks, 2) if self.checks else None,
+            "error": self.error,
+        }
+
+
+# Global instance
+breached_passwords = BreachedPasswordFilter()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and inspect the breached password filter")
+    parser.add_argument("--build", metavar="DUMP", help="SHA-1 hash dump (HASH[:COUNT] per line) to build from")
+    parser.add_argument("--output", default=BREACHED_PASSWORD_FILTER or "breached.bloom")
+    parser.add_argument("--fp-rate", type=float, default=0.001, help="target false-positive rate")
+    parser.add_argument("--expected", type=int, help="number of entries (skips the line counting pass)")
+    parser.add_argument("--plaintext", action="store_true", help="dump lines are passwords, not SHA-1 hashes")
+    parser.add_argument("--min-count", type=int, default=1,
+                        help="skip hashes seen fewer times than this in breaches")
+    parser.add_argument("--report", metavar="FILTER", help="print size and false-positive rates of a filter")
+    parser.add_argument("--samples", type=int, default=200000)
+    parser.add_argument("--check", metavar="PASSWORD", help="check one password against the configured filter")
+    args = parser.parse_args()
+
+    if args.build:
+        result = build(args.build, args.output, args.fp_rate, args.expected, args.plaintext, args.min_count)
+        print(f"✓ Built {args.output}: {result['items']} hashes, {result['size_mb']} MB, "
+              f"k={result['hashes']}, {result['seconds']}s")
+    elif args.report:
+        screen = BreachedPasswordFilter(None)
+        screen.open(args.report)
+        for key, value in screen.report(args.samples).items():
+            print(f"  {key:<18} {value}")
+    elif args.check:
+        if not breached_passwords.enabled:
+            print(f"No filter loaded: {breached_passwords.error or 'set BREACHED_PASSWORD_FILTER'}")
+        else:
+            print("✗ breached" if breached_passwords.is_breached(args.check) else "✓ not found")
+    else:
+        parser.print_help()
@@ -0,0 +1,147 @@
+"""
+Live activity broadcaster - fans committed activity log rows out to server-sent-event subscribers.
+Each subscriber gets a bounded queue; a subscriber that falls behind is disconnected instead of
+slowing the write path, and reconnects with Last-Event-ID to catch up from the replay ring
+(or the database, if it fell further behind than the ring holds).
+"""
+import json
+import os
+import queue
+import threading
+from collections import deque
+from datetime import datetime
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import object_session
+from dotenv import load_dotenv
+
+load_dotenv()
+
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "1000"))
+STREAM_REPLAY_SIZE = int(os.getenv("STREAM_REPLAY_SIZE", "5000"))
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+USERNAME_CACHE_SIZE = 10000
+
+
+class Subscriber:
+    """One stream consumer with a bounded buffer"""
+
+    def __init__(self, maxsize: int):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = False
+
+    def get(self, timeout: float):
+        """Return the next record, or None on timeout; never blocks once dropped"""
+        try:
+            if self.dropped:
+                return self.queue.get_nowait()
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class LogBroadcaster:
+    """In-process fan-out of activity log records to stream subscribers"""
+
+    def __init__(self, queue_size: int = STREAM_QUEUE_SIZE, replay_size: int = STREAM_REPLAY_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._replay = deque(maxlen=replay_size)
+        self._lock = threading.Lock()
+        self.published = 0
+        self.slow_disconnects = 0
+
+    def subscribe(self, last_event_id=None):
+        """Register a subscriber; returns (subscriber, backlog, complete) where complete is
+        False if last_event_id is older than the replay ring and the caller must backfill"""
+        sub = Subscriber(self.queue_size)
+        with self._lock:
+            self._subscribers.add(sub)
+            if last_event_id is None:
+                return sub, [], True
+            backlog = [r for r in self._replay if r["id"] > last_event_id]
+            complete = bool(self._replay) and self._replay[0]["id"] <= last_event_id + 1
+            return sub, backlog, complete
+
+    def unsubscribe(self, sub: Subscriber):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def publish(self, records):
+        """Fan committed records out to every subscriber without blocking"""
+        if not records:
+            return
+        with self._lock:
+            self._replay.extend(records)
+            self.published += len(records)
+            for sub in list(self._subscribers):
+                try:
+                    for record in records:
+                        sub.queue.put_nowait(record)
+                except queue.Full:
+                    # Slow consumer: drop it; it resumes via Last-Event-ID
+                    sub.dropped = True
+                    self._subscribers.discard(sub)
+                    self.slow_disconnects += 1
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+
+def format_sse(record: dict, event_name: str = "log") -> str:
+    """Serialize one record as a server-sent event"""
+    return f"id: {record['id']}\nevent: {event_name}\ndata: {json.dumps(record)}\n\n"
+
+
+def log_record(log_id, user_id, username, timestamp, action, ip_address, status, details) -> dict:
+    """Build the stream payload; same shape as the /admin/logs entries"""
+    return {
+        "id": log_id,
+        "user_id": user_id,
+        "username": username,
+        "timestamp": (timestamp or datetime.utcnow()).isoformat(),
+        "action": action,
+        "ip_address": ip_address,
+        "status": status,
+        "details": details
+    }
+
+
+def register_stream_source(session_factory, log_model, user_model, broadcaster: "LogBroadcaster"):
+    """Publish ORM-inserted activity logs to the broadcaster once their transaction commits"""
+    usernames = {}
+
+    def _username(connection, user_id):
+        if user_id is None:
+            return None
+        if user_id not in usernames:
+            if len(usernames) >= USERNAME_CACHE_SIZE:
+                usernames.clear()
+            usernames[user_id] = connection.execute(
+                select(user_model.username).where(user_model.id == user_id)
+            ).scalar()
+        return usernames[user_id]
+
+    def _after_insert(mapper, connection, target):
+        record = log_record(
+            target.id, target.user_id, _username(connection, target.user_id), target.timestamp,
+            target.action, target.ip_address, target.status, target.details
+        )
+        object_session(target).info.setdefault("stream_pending", []).append(record)
+
+    def _after_commit(session):
+        pending = session.info.pop("stream_pending", None)
+        if pending:
+            broadcaster.publish(pending)
+
+    def _after_rollback(session):
+        session.info.pop("stream_pending", None)
+
+    event.listen(log_model, "after_insert", _after_insert)
+    event.listen(session_factory, "after_commit", _after_commit)
+    event.listen(session_factory, "after_rollback", _after_rollback)
+
+
+# Global instance
+log_broadcaster = LogBroadcaster()
@@ -0,0 +1,430 @@
+"""
+Request capture and replay - samples live API traffic and re-issues it against a test instance.
+
+Capture: with CAPTURE_SAMPLE_RATE > 0, a fraction of requests is recorded to CAPTURE_FILE as
+JSON lines with method, path, route, timing, sizes and the body. The request path only decides
+whether to sample and enqueues a tuple. Redaction, serialization and file writes happen on a
+background writer, and files rotate like the app logs (request_capture.jsonl.1.gz, ...).
+Credentials never reach the file:
+    Authorization / X-API-Key   recorded only as "auth": "bearer" / "api_key"
+    body and query fields       password, tokens, secrets and keys are replaced by "[REDACTED]"
+    other bodies                unparseable JSON, other content types and oversized bodies are
+                                recorded by size only ("body_omitted")
+
+Replay re-issues a capture at its original pacing, N times faster, or as fast as possible.
+With two targets it replays against each in turn and compares per-route latency:
+    python -m app.capture --replay request_capture.jsonl --target http://localhost:8000 --speed 2
+    python -m app.capture --replay request_capture.jsonl* --target http://old:8000 --target http://new:8000 \\
+        --login admin:admin123 --password Test123!
+Captured authenticated requests use a token from --login (or --token) on each target. Redacted
+password fields are filled with --password when given.
+"""
+import argparse
+import atexit
+import glob
+import gzip
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode
+
+import requests
+from dotenv import load_dotenv
+
+from .log_handlers import CompressingRotatingFileHandler
+
+load_dotenv()
+
+CAPTURE_SAMPLE_RATE = float(os.getenv("CAPTURE_SAMPLE_RATE", "0"))  # fraction of requests; 0 disables
+CAPTURE_FILE = os.getenv("CAPTURE_FILE", "request_capture.jsonl")
+CAPTURE_MAX_BYTES = int(os.getenv("CAPTURE_MAX_BYTES", str(50 * 1024 * 1024)))
+CAPTURE_BACKUP_COUNT = int(os.getenv("CAPTURE_BACKUP_COUNT", "10"))
+CAPTURE_MAX_BODY = int(os.getenv("CAPTURE_MAX_BODY", "65536"))  # larger bodies are recorded by size only
+CAPTURE_QUEUE_SIZE = int(os.getenv("CAPTURE_QUEUE_SIZE", "10000"))
+
+REDACTED = "[REDACTED]"
+SENSITIVE_KEY = re.compile(r"pass|token|secret|api[_-]?key|authorization|cookie|credential", re.IGNORECASE)
+KEPT_HEADERS = ("Content-Type", "Accept", "If-None-Match", "If-Modified-Since", "Last-Event-ID")
+WRITE_BATCH = 500
+
+
+def redact(value):
+    """Copy of a decoded JSON value with sensitive fields replaced"""
+    if isinstance(value, dict):
+        return {k: REDACTED if SENSITIVE_KEY.search(k) and v not in (None, "") else redact(v)
+                for k, v in value.items()}
+    if isinstance(value, list):
+        return [redact(v) for v in value]
+    return value
+
+
+def redact_query(query: str) -> str:
+    if not query:
+        return ""
+    return urlencode([(k, REDACTED if SENSITIVE_KEY.search(k) else v)
+                      for k, v in parse_qsl(query, keep_blank_values=True)])
+
+
+# ==================== CAPTURE ====================
+
+class RequestCapture:
+    """Sampled request recorder; record() is called on the request path, everything else is not"""
+
+    def __init__(self, path: str = CAPTURE_FILE, sample_rate: float = CAPTURE_SAMPLE_RATE,
+                 max_bytes: int = CAPTURE_MAX_BYTES, backup_count: int = CAPTURE_BACKUP_COUNT,
+                 queue_size: int = CAPTURE_QUEUE_SIZE):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._writer = None
+        self._lock = threading.Lock()
+        self.captured = 0
+        self.dropped = 0
+        self.written = 0
+        self.write_errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def sample(self) -> bool:
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def record(self, entry: tuple):
+        """Enqueue a raw capture; never blocks, a full queue drops the entry"""
+        if self._writer is None:
+            self._start()
+        try:
+            self._queue.put_nowait(entry)
+            self.captured += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="request-capture", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        handler = CompressingRotatingFileHandler(self.path, max_bytes=self.max_bytes, rotate_seconds=0,
+                                                 backup_count=self.backup_count)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        while True:
+            entries = [self._queue.get()]
+            while len(entries) < WRITE_BATCH:
+                try:
+                    entries.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                lines = "\n".join(json.dumps(self._serialize(*e), separators=(",", ":")) for e in entries)
+                handler.emit(logging.makeLogRecord({"msg": lines}))
+                self.written += len(entries)
+            except Exception:
+                self.write_errors += len(entries)
+
+    @staticmethod
+    def _serialize(ts, method, path, query, route, status, duration, request_bytes, response_bytes,
+                   streamed, auth, headers, content_type, body):
+        entry = {
+            "ts": round(ts, 6),
+            "method": method,
+            "path": path,
+            "query": redact_query(query),
+            "route": route,
+            "status": status,
+            "duration_ms": round(duration * 1000, 3),
+            "request_bytes": request_bytes,
+            "response_bytes": response_bytes,
+            "streamed": streamed,
+            "auth": auth,
+            "headers": headers,
+        }
+        content_type = content_type or ""
+        if body:
+            # Only bodies redaction can parse are kept; anything else is recorded by size only
+            text = body.decode("utf-8", "replace")
+            try:
+                if "ndjson" in content_type:
+                    entry["body_text"] = "\n".join(json.dumps(redact(json.loads(line)))
+                                                   for line in text.splitlines() if line.strip())
+                elif "json" in content_type:
+                    entry["body"] = redact(json.loads(text))
+                elif "x-www-form-urlencoded" in content_type:
+                    entry["body_text"] = redact_query(text)
+                else:
+                    entry["body_omitted"] = True
+            except ValueError:
+                entry["body_omitted"] = True
+        elif request_bytes:
+            entry["body_omitted"] = True
+        return entry
+
+    def close(self, timeout: float = 2.0):
+        """Give the writer a moment to drain the queue (registered with atexit)"""
+        deadline = time.monotonic() + timeout
+        while self._writer is not None and self.written + self.write_errors < self.captured \
+                and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "file": self.path,
+            "captured": self.captured,
+            "written": self.written,
+            "dropped": self.dropped,
+            "write_errors": self.write_errors,
+            "queued": self._queue.qsize(),
+        }
+
+
+def register_capture(app, capture: RequestCapture):
+    """Record sampled requests of a Flask app; a no-op when sampling is off"""
+    if not capture.enabled:
+        return
+    from flask import g, request
+
+    @app.before_request
+    def _capture_start():
+        if capture.sample():
+            g.capture_started = (time.time(), time.perf_counter())
+
+    @app.after_request
+    def _capture_finish(response):
+        started = g.pop("capture_started", None)
+        if started is None:
+            return response
+        duration = time.perf_counter() - started[1]
+        length = request.content_length or 0
+        body = request.get_data(cache=True) if 0 < length <= CAPTURE_MAX_BODY else b""
+        auth = None
+        if request.headers.get("Authorization", "").startswith("Bearer "):
+            auth = "bearer"
+        elif "X-API-Key" in request.headers:
+            auth = "api_key"
+        elif "access_token" in request.args:
+            auth = "query_token"
+        capture.record((
+            started[0], request.method, request.path, request.query_string.decode("latin-1"),
+            request.url_rule.rule if request.url_rule else None, response.status_code, duration,
+            length, None if response.is_streamed else response.calculate_content_length(),
+            response.is_streamed, auth,
+            {h: request.headers[h] for h in KEPT_HEADERS if h in request.headers},
+            request.content_type, body if len(body) == length else b"",
+        ))
+        return response
+
+
+# Global instance
+request_capture = RequestCapture()
+atexit.register(request_capture.close)
+
+
+# ==================== REPLAY ====================
+
+def load_capture(patterns) -> list:
+    """Captured entries from files and globs (plain or gzipped), oldest first"""
+    entries = []
+    paths = sorted({p for pattern in patterns for p in (glob.glob(pattern) or [pattern])})
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entries.append(json.loads(line))
+    entries.sort(key=lambda e: e["ts"])
+    return entries
+
+
+def _fill_passwords(value, password):
+    if isinstance(value, dict):
+        return {k: password if v == REDACTED and "pass" in k.lower() else _fill_passwords(v, password)
+                for k, v in value.items()}
+    if isinstance(value, list):
+        return [_fill_passwords(v, password) for v in value]
+    return value
+
+
+def login(target: str, credentials: str) -> str:
+    """Access token for USER:PASSWORD on a target"""
+    username, _, password = credentials.partition(":")
+    response = requests.post(f"{target}/auth/login", json={"username": username, "password": password}, timeout=30)
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+class Replayer:
+    """Re-issues captured entries against one target, keeping their relative timing"""
+
+    def __init__(self, target: str, speed: float = 1.0, concurrency: int = 32, token: str = None,
+                 api_key: str = None, password: str = None, include_streams: bool = False, timeout: float = 30.0):
+        self.target = target.rstrip("/")
+        self.speed = speed
+        self.concurrency = concurrency
+        self.token = token
+        self.api_key = api_key
+        self.password = password
+        self.include_streams = include_streams
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        return session
+
+    def _request(self, entry, scheduled: float) -> dict:
+        headers = dict(entry.get("headers") or {})
+        query = entry.get("query") or ""
+        if entry.get("auth") == "bearer" and self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        elif entry.get("auth") == "api_key" and self.api_key:
+            headers["X-API-Key"] = self.api_key
+        elif entry.get("auth") == "query_token" and self.token:
+            query = urlencode([(k, self.token if k == "access_token" else v)
+                               for k, v in parse_qsl(query, keep_blank_values=True)])
+        data = None
+        if "body" in entry:
+            body = _fill_passwords(entry["body"], self.password) if self.password else entry["body"]
+            data = json.dumps(body).encode("utf-8")
+        elif "body_text" in entry:
+            data = entry["body_text"].encode("utf-8")
+        url = f"{self.target}{entry['path']}" + (f"?{query}" if query else "")
+        started = time.perf_counter()
+        lag = started - scheduled
+        try:
+            response = self._session().request(entry["method"], url, headers=headers, data=data,
+                                               timeout=self.timeout)
+            status, size = response.status_code, len(response.content)
+        except requests.RequestException as e:
+            status, size = None, 0
+            error = type(e).__name__
+        else:
+            error = None
+        return {
+            "route": f"{entry['method']} {entry.get('route') or entry['path']}",
+            "status": status,
+            "original_status": entry.get("status"),
+            "latency_ms": (time.perf_counter() - started) * 1000,
+            "original_ms": entry.get("duration_ms"),
+            "lag_ms": lag * 1000,
+            "response_bytes": size,
+            "error": error,
+        }
+
+    def run(self, entries) -> list:
+        """Replay entries; speed 0 sends as fast as the concurrency allows"""
+        entries = [e for e in entries if self.include_streams or not e.get("streamed")]
+        if not entries:
+            return []
+        first = entries[0]["ts"]
+        start = time.perf_counter()
+        futures = []
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="replay") as pool:
+            for entry in entries:
+                scheduled = start + (entry["ts"] - first) / self.speed if self.speed else time.perf_counter()
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(pool.submit(self._request, entry, scheduled))
+        return [f.result() for f in futures]
+
+
+# ==================== REPORTING ====================
+
+def _percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else None
+
+
+def summarize(results) -> dict:
+    """Per-route and overall latency percentiles, error and status-mismatch counts"""
+    groups = {"ALL": results}
+    for r in results:
+        groups.setdefault(r["route"], []).append(r)
+    summary = {}
+    for route, rows in groups.items():
+        latencies = sorted(r["latency_ms"] for r in rows)
+        summary[route] = {
+            "count": len(rows),
+            "p50_ms": _percentile(latencies, 0.5),
+            "p95_ms": _percentile(latencies, 0.95),
+            "p99_ms": _percentile(latencies, 0.99),
+            "errors": sum(1 for r in rows if r["status"] is None or r["status"] >= 500),
+            "status_changed": sum(1 for r in rows if r["status"] != r["original_status"]),
+            "max_lag_ms": max(r["lag_ms"] for r in rows),
+        }
+    return summary
+
+
+def compare(baseline: dict, candidate: dict) -> list:
+    """(route, count, baseline p50/p95, candidate p50/p95, p95 change %) rows, worst change first"""
+    rows = []
+    for route, base in baseline.items():
+        cand = candidate.get(route)
+        if not cand or not base["p95_ms"]:
+            continue
+        change = (cand["p95_ms"] - base["p95_ms"]) / base["p95_ms"] * 100
+        rows.append((route, base["count"], base["p50_ms"], base["p95_ms"], cand["p50_ms"], cand["p95_ms"], change))
+    rows.sort(key=lambda r: (r[0] != "ALL", -r[6]))
+    return rows
+
+
+def _print_summary(target, summary):
+    print(f"{target}")
+    for route, s in summary.items():
+        print(f"  {route:<45} {s['count']:>7}  p50 {s['p50_ms']:8.2f}  p95 {s['p95_ms']:8.2f}  "
+              f"p99 {s['p99_ms']:8.2f} ms  errors {s['errors']}  status changed {s['status_changed']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay captured API traffic and compare latency between builds")
+    parser.add_argument("--replay", nargs="+", metavar="FILE", required=True,
+                        help="capture files or globs (rotated .gz backups included)")
+    parser.add_argument("--target", action="append", required=True,
+                        help="base URL; give two to compare builds (the first is the baseline)")
+    parser.add_argument("--speed", type=float, default=1.0, help="pacing multiplier; 0 = as fast as possible")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--login", metavar="USER:PASSWORD", help="log in on each target for authenticated requests")
+    parser.add_argument("--token", help="bearer token used instead of --login")
+    parser.add_argument("--api-key", help="X-API-Key for captured API key requests")
+    parser.add_argument("--password", help="value for redacted password fields in bodies")
+    parser.add_argument("--include-streams", action="store_true", help="also replay event-stream requests")
+    parser.add_argument("--results", help="write per-request results here as JSON lines")
+    args = parser.parse_args()
+
+    captured = load_capture(args.replay)
+    span = captured[-1]["ts"] - captured[0]["ts"] if captured else 0
+    print(f"✓ Loaded {len(captured)} requests spanning {span:.0f}s")
+    summaries = []
+    for target in args.target:
+        token = login(target, args.login) if args.login else args.token
+        results = Replayer(target, args.speed, args.concurrency, token, args.api_key, args.password,
+                           args.include_streams).run(captured)
+        summary = summarize(results)
+        summaries.append(summary)
+        _print_summary(target, summary)
+        if args.results:
+            with open(f"{args.results}.{len(summaries)}" if len(args.target) > 1 else args.results, "w") as f:
+                for r in results:
+                    f.write(json.dumps(dict(r, target=target)) + "\n")
+    for target, summary in zip(args.target[1:], summaries[1:]):
+        print(f"{args.target[0]} -> {target} (p95 change)")
+        for route, count, b50, b95, c50, c95, change in compare(summaries[0], summary):
+            mark = "✗" if change > 10 else "✓"
+            print(f"  {mark} {route:<45} {count:>7}  p50 {b50:8.2f} -> {c50:8.2f}  "
+                  f"p95 {b95:8.2f} -> {c95:8.2f} ms  {change:+6.1f}%")
@@ -0,0 +1,191 @@
+"""
+Event coalescing - folds bursts of identical events into one summary to cut QRadar EPS.
+Events are identical when (event_type, username, ip_address, reason) match. The first event of
+a key passes straight through; repeats inside COALESCE_WINDOW seconds are absorbed, and when the
+window closes one summary event is emitted carrying:
+    count       - number of identical events folded into the summary
+    first_seen  - timestamp of the first folded event
+    last_seen   - timestamp of the last folded event
+High-severity types (COALESCE_PASSTHROUGH) are never coalesced. The key table is bounded;
+when full, the oldest window is closed early.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+COALESCE_WINDOW = float(os.getenv("COALESCE_WINDOW", "5"))  # seconds; 0 disables coalescing
+COALESCE_MAX_KEYS = int(os.getenv("COALESCE_MAX_KEYS", "10000"))
+COALESCE_PASSTHROUGH = frozenset(
+    t.strip() for t in os.getenv("COALESCE_PASSTHROUGH", "SUSPICIOUS_ACTIVITY,AUDIT_COMMITMENT").split(",") if t.strip()
+)
+
+
+class RateMeter:
+    """Per-second event counts over a sliding window, for EPS reporting"""
+
+    def __init__(self, seconds: int = 60):
+        self.seconds = seconds
+        self._buckets = deque()  # [second, count]
+
+    def add(self, n: int = 1, now: float = None):
+        second = int(now if now is not None else time.time())
+        if self._buckets and self._buckets[-1][0] == second:
+            self._buckets[-1][1] += n
+        else:
+            self._buckets.append([second, n])
+        while self._buckets and self._buckets[0][0] <= second - self.seconds:
+            self._buckets.popleft()
+
+    def rate(self, now: float = None) -> float:
+        cutoff = int(now if now is not None else time.time()) - self.seconds
+        return sum(c for s, c in self._buckets if s > cutoff) / self.seconds
+
+
+class _Window:
+    __slots__ = ("event_type", "details", "opened", "count", "first_seen", "last_seen")
+
+    def __init__(self, event_type, details, opened):
+        self.event_type = event_type
+        self.details = details
+        self.opened = opened
+        self.count = 0
+        self.first_seen = None
+        self.last_seen = None
+
+
+class EventCoalescer:
+    """Pipeline stage folding identical events within a time window"""
+
+    name = "coalescing"
+
+    def __init__(self, window: float = COALESCE_WINDOW, max_keys: int = COALESCE_MAX_KEYS,
+                 passthrough=COALESCE_PASSTHROUGH, flush_interval: float = None):
+        self.window = window
+        self.max_keys = max_keys
+        self.passthrough = frozenset(passthrough)
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._emit = None
+        self._stop = threading.Event()
+        self.flush_interval = flush_interval or max(window / 2, 0.1)
+        # Metrics
+        self.events_in = 0
+        self.events_out = 0
+        self.evictions = 0
+        self.rate_in = RateMeter()
+        self.rate_out = RateMeter()
+
+    def bind(self, emit):
+        """Attach the downstream callable for summaries emitted after a window closes"""
+        self._emit = emit
+        if self.window > 0:
+            threading.Thread(target=self._flush_loop, name="event-coalescer", daemon=True).start()
+
+    @staticmethod
+    def key(event_type, details):
+        nested = details.get("details") if isinstance(details.get("details"), dict) else {}
+        reason = nested.get("reason") or details.get("activity_type") or details.get("resource")
+        return (event_type, details.get("username"), details.get("ip_address"), reason)
+
+    def _count(self, n_in, n_out):
+        with self._stats_lock:
+            self.events_in += n_in
+            self.events_out += n_out
+            if n_in:
+                self.rate_in.add(n_in)
+            if n_out:
+                self.rate_out.add(n_out)
+
+    def process(self, event_type, details):
+        if self.window <= 0 or event_type in self.passthrough or not isinstance(details, dict):
+            self._count(1, 1)
+            return [(event_type, details)]
+
+        key = self.key(event_type, details)
+        now = time.monotonic()
+        seen = details.get("timestamp") or datetime.utcnow().isoformat()
+        evicted = None
+        with self._lock:
+            window = self._windows.get(key)
+            if window is not None and now - window.opened < self.window:
+                # Duplicate inside the window: absorb it
+                window.count += 1
+                window.first_seen = window.first_seen or seen
+                window.last_seen = seen
+                self._count(1, 0)
+                return []
+            if window is not None:
+                del self._windows[key]
+                evicted = self._summary(window)
+            elif len(self._windows) >= self.max_keys:
+                _, oldest = self._windows.popitem(last=False)
+                evicted = self._summary(oldest)
+                self.evictions += 1
+            self._windows[key] = _Window(event_type, details, now)
+
+        out = [(event_type, details)]
+        if evicted:
+            out.insert(0, evicted)
+        self._count(1, len(out))
+        return out
+
+    @staticmethod
+    def _summary(window):
+        """Summary event for a closed window, or None if nothing was absorbed"""
+        if window.count == 0:
+            return None
+        details = dict(window.details)
+        details.update({
+            "count": window.count,
+            "first_seen": window.first_seen,
+            "last_seen": window.last_seen,
+            "coalesced": True
+        })
+        return (window.event_type, details)
+
+    def flush(self, force: bool = False):
+        """Close expired windows (all windows if force) and return their summaries"""
+        now = time.monotonic()
+        summaries = []
+        with self._lock:
+            # Windows are kept in opening order, so stop at the first one still open
+            while self._windows:
+                key, window = next(iter(self._windows.items()))
+                if not force and now - window.opened < self.window:
+                    break
+                del self._windows[key]
+                summary = self._summary(window)
+                if summary:
+                    summaries.append(summary)
+        if summaries:
+            self._count(0, len(summaries))
+        return summaries
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            summaries = self.flush()
+            if summaries and self._emit:
+                self._emit(summaries)
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> dict:
+        return {
+            "window_seconds": self.window,
+            "events_in": self.events_in,
+            "events_out": self.events_out,
+            "suppressed": self.events_in - self.events_out,
+            "reduction_pct": round(100.0 * (1 - self.events_out / self.events_in), 2) if self.events_in else 0.0,
+            "eps_in": round(self.rate_in.rate(), 2),
+            "eps_out": round(self.rate_out.rate(), 2),
+            "active_keys": len(self._windows),
+            "evictions": self.evictions,
+        }
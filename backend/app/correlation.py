@@ -0,0 +1,498 @@
+"""
+Correlation rules - evaluates declarative detection rules on every event before it is forwarded,
+and emits a derived SUSPICIOUS_ACTIVITY event when a rule fires.
+
+Rules live in a JSON file (or YAML when PyYAML is installed) at CORRELATION_RULES:
+    {"rules": [
+      {"name": "password_spray", "severity": "high",
+       "match": {"event_type": "LOGIN_ATTEMPT", "status": "failure"},
+       "group_by": "ip_address", "distinct": "username", "threshold": 10, "window": 300},
+      {"name": "success_after_failures", "group_by": ["username", "ip_address"], "window": 600,
+       "sequence": [{"match": {"event_type": "LOGIN_ATTEMPT", "status": "failure"}, "count": 3},
+                    {"match": {"event_type": "LOGIN_ATTEMPT", "status": "success"}}]}
+    ]}
+match     field -> value; a list means any of; dotted paths reach nested details
+          ("details.anomaly.score"). Operators: {"eq", "ne", "in", "not_in", "gt", "gte",
+          "lt", "lte", "regex", "exists"}
+group_by  field(s) keying the rule's state; events without them are skipped
+threshold matching events per group within window seconds (default 1: every match fires);
+          with distinct, the number of different values of that field instead
+sequence  steps matched in order per group, all within window seconds; count repeats a step
+suppress  seconds before the same rule fires again for a group (default: window)
+
+Rules are compiled once into predicate tuples and indexed by event_type, so an event is only
+tested against rules that can match it. State is bounded: a threshold keeps its last
+`threshold` timestamps, a sequence its current step, and each rule keeps at most
+CORRELATION_MAX_GROUPS groups (least recently active evicted). The file is watched and
+recompiled off the event path; rules whose definition is unchanged keep their state.
+Windows use arrival time, not the event's own timestamp.
+
+    python -m app.correlation --check              # compile the rules file and list rules
+    python -m app.correlation --bench              # synthetic stream, per-rule evaluation cost
+"""
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Optional
+
+from dotenv import load_dotenv
+
+try:
+    import yaml
+except ImportError:  # YAML rule files are optional; JSON always works
+    yaml = None
+
+load_dotenv()
+
+CORRELATION_RULES = os.getenv("CORRELATION_RULES", "correlation_rules.json")  # empty disables rules
+CORRELATION_RELOAD_SECONDS = float(os.getenv("CORRELATION_RELOAD_SECONDS", "10"))
+CORRELATION_MAX_GROUPS = int(os.getenv("CORRELATION_MAX_GROUPS", "10000"))  # per rule
+
+
+class RuleError(ValueError):
+    """A rule definition that cannot be compiled"""
+
+
+# ==================== COMPILING ====================
+
+def _getter(path: str):
+    """Fast accessor for a top-level field, or a walker for a dotted path"""
+    parts = path.split(".")
+    if len(parts) == 1:
+        return lambda event: event.get(path)
+
+    def get(event):
+        for part in parts:
+            if not isinstance(event, dict):
+                return None
+            event = event.get(part)
+        return event
+    return get
+
+
+def _compare(get, op, operand):
+    def check(event):
+        value = get(event)
+        try:
+            return value is not None and op(value, operand)
+        except TypeError:
+            return False
+    return check
+
+
+_NUMERIC_OPS = {
+    "gt": lambda a, b: a > b,
+    "gte": lambda a, b: a >= b,
+    "lt": lambda a, b: a < b,
+    "lte": lambda a, b: a <= b,
+}
+
+
+def _condition(path: str, spec):
+    """Compile one field condition into a predicate over the event details"""
+    get = _getter(path)
+    if isinstance(spec, list):
+        values = frozenset(spec)
+        return lambda event: get(event) in values
+    if not isinstance(spec, dict):
+        return lambda event: get(event) == spec
+    checks = []
+    for op, operand in spec.items():
+        if op == "eq":
+            checks.append(lambda event, v=operand: get(event) == v)
+        elif op == "ne":
+            checks.append(lambda event, v=operand: get(event) != v)
+        elif op in ("in", "not_in"):
+            values = frozenset(operand)
+            checks.append((lambda event: get(event) in values) if op == "in"
+                          else (lambda event: get(event) not in values))
+        elif op in _NUMERIC_OPS:
+            checks.append(_compare(get, _NUMERIC_OPS[op], operand))
+        elif op == "regex":
+            pattern = re.compile(operand)
+            checks.append(lambda event: isinstance(get(event), str) and pattern.search(get(event)) is not None)
+        elif op == "exists":
+            checks.append(lambda event, want=bool(operand): (get(event) is not None) == want)
+        else:
+            raise RuleError(f"unknown operator {op!r} for {path}")
+    if len(checks) == 1:
+        return checks[0]
+    return lambda event: all(check(event) for check in checks)
+
+
+def _matcher(spec: dict):
+    """(event types or None for any, predicate tuple) for a match block"""
+    if not isinstance(spec, dict):
+        raise RuleError("match must be an object of field conditions")
+    spec = dict(spec)
+    event_types = spec.pop("event_type", None)
+    if isinstance(event_types, str):
+        event_types = [event_types]
+    elif event_types is not None and not isinstance(event_types, list):
+        raise RuleError("event_type must be a string or a list")
+    return (frozenset(event_types) if event_types else None,
+            tuple(_condition(path, cond) for path, cond in spec.items()))
+
+
+def _matches(predicates, event_type, types, details) -> bool:
+    if types is not None and event_type not in types:
+        return False
+    for predicate in predicates:
+        if not predicate(details):
+            return False
+    return True
+
+
+class _GroupState:
+    __slots__ = ("times", "values", "step", "step_count", "started", "suppressed_until")
+
+    def __init__(self):
+        self.times = None
+        self.values = None
+        self.step = 0
+        self.step_count = 0
+        self.started = 0.0
+        self.suppressed_until = 0.0
+
+
+class Rule:
+    """One compiled rule with its per-group state and evaluation counters"""
+
+    def __init__(self, spec: dict, max_groups: int = CORRELATION_MAX_GROUPS):
+        if not isinstance(spec, dict) or not spec.get("name"):
+            raise RuleError("every rule must be an object with a name")
+        self.name = spec["name"]
+        self.fingerprint = json.dumps(spec, sort_keys=True)
+        self.severity = spec.get("severity", "medium")
+        self.description = spec.get("description", "")
+        group_by = spec.get("group_by") or []
+        self.group_fields = [group_by] if isinstance(group_by, str) else list(group_by)
+        self._group_getters = tuple(_getter(f) for f in self.group_fields)
+        self.window = float(spec.get("window", 60))
+        self.suppress = float(spec.get("suppress", self.window))
+        self.max_groups = max_groups
+        if "sequence" in spec:
+            steps = spec["sequence"]
+            if not isinstance(steps, list) or len(steps) < 2:
+                raise RuleError(f"{self.name}: a sequence needs at least two steps")
+            if not all(isinstance(step, dict) for step in steps):
+                raise RuleError(f"{self.name}: every sequence step must be an object")
+            self.steps = [(*_matcher(step.get("match", {})), max(int(step.get("count", 1)), 1)) for step in steps]
+            types = [t for t, _, _ in self.steps]
+            self.event_types = None if None in types else frozenset().union(*types)
+            self.threshold = None
+        else:
+            if "match" not in spec:
+                raise RuleError(f"{self.name}: needs match or sequence")
+            self.steps = None
+            self.event_types, self.predicates = _matcher(spec["match"])
+            self.threshold = max(int(spec.get("threshold", 1)), 1)
+            self._distinct = _getter(spec["distinct"]) if spec.get("distinct") else None
+        self._groups = OrderedDict()
+        self._lock = threading.Lock()
+        self.evaluations = 0
+        self.matches = 0
+        self.alerts = 0
+        self.evictions = 0
+        self.seconds = 0.0
+
+    def _group(self, key):
+        state = self._groups.get(key)
+        if state is None:
+            state = self._groups[key] = _GroupState()
+            if len(self._groups) > self.max_groups:
+                self._groups.popitem(last=False)
+                self.evictions += 1
+        else:
+            self._groups.move_to_end(key)
+        return state
+
+    def evaluate(self, event_type, details, now: float) -> Optional[tuple]:
+        """(group key, count) when the rule fires on this event, else None"""
+        try:
+            return self._evaluate(event_type, details, now)
+        except TypeError:
+            return None  # an unhashable field value (list, dict) cannot match, key or count
+
+    def _evaluate(self, event_type, details, now: float) -> Optional[tuple]:
+        if self.steps is None and not _matches(self.predicates, event_type, self.event_types, details):
+            return None
+        key = tuple(get(details) for get in self._group_getters)
+        if None in key:
+            return None
+        if self.steps is not None:
+            return self._sequence(key, event_type, details, now)
+        self.matches += 1
+        if self.threshold == 1 and self._distinct is None and not self.group_fields:
+            return key, 1
+        with self._lock:
+            state = self._group(key)
+            if now < state.suppressed_until:
+                return None
+            if self._distinct is not None:
+                value = self._distinct(details)
+                if value is None:
+                    return None
+                values = state.values
+                if values is None:
+                    values = state.values = OrderedDict()
+                values.pop(value, None)
+                values[value] = now
+                while values and next(iter(values.values())) <= now - self.window:
+                    values.popitem(last=False)
+                count = len(values)
+            else:
+                if state.times is None:
+                    state.times = deque(maxlen=self.threshold)
+                state.times.append(now)
+                count = len(state.times)
+                if count == self.threshold and now - state.times[0] > self.window:
+                    count = 0
+            if count < self.threshold:
+                return None
+            state.times = state.values = None
+            state.suppressed_until = now + self.suppress
+        return key, count
+
+    def _sequence(self, key, event_type, details, now: float) -> Optional[tuple]:
+        with self._lock:
+            state = self._groups.get(key)
+            if state is not None and (state.step or state.step_count) and now - state.started > self.window:
+                state.step = state.step_count = 0
+            step = state.step if state is not None else 0
+            types, predicates, count = self.steps[step]
+            if not _matches(predicates, event_type, types, details):
+                return None
+            self.matches += 1
+            if state is None:
+                state = self._group(key)
+            else:
+                self._groups.move_to_end(key)
+            if now < state.suppressed_until:
+                return None
+            if step == 0 and state.step_count == 0:
+                state.started = now
+            state.step_count += 1
+            if state.step_count < count:
+                return None
+            state.step += 1
+            state.step_count = 0
+            if state.step < len(self.steps):
+                return None
+            state.step = 0
+            state.suppressed_until = now + self.suppress
+        return key, sum(c for _, _, c in self.steps)
+
+    def stats(self) -> dict:
+        return {
+            "evaluations": self.evaluations,
+            "matches": self.matches,
+            "alerts": self.alerts,
+            "avg_eval_us": round(self.seconds * 1e6 / self.evaluations, 3) if self.evaluations else None,
+            "total_ms": round(self.seconds * 1000, 2),
+            "groups": len(self._groups),
+            "evictions": self.evictions,
+        }
+
+
+class RuleSet:
+    """Compiled rules indexed by the event types they can match"""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        names = [r.name for r in self.rules]
+        if len(set(names)) != len(names):
+            raise RuleError("rule names must be unique")
+        self._any = [r for r in self.rules if r.event_types is None]
+        self._by_type = {}
+        for rule in self.rules:
+            for event_type in rule.event_types or ():
+                self._by_type.setdefault(event_type, []).append(rule)
+
+    def candidates(self, event_type):
+        typed = self._by_type.get(event_type)
+        if not self._any:
+            return typed or ()
+        return (typed or []) + self._any
+
+
+def load_rules(path: str) -> list:
+    """Rule definitions from a JSON or YAML file ({"rules": [...]} or a bare list)"""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            if yaml is None:
+                raise RuleError("YAML rule files need PyYAML (pip install pyyaml); use JSON instead")
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    rules = data.get("rules", []) if isinstance(data, dict) else data
+    if not isinstance(rules, list):
+        raise RuleError("the rules file must hold a list of rules")
+    return rules
+
+
+def compile_rules(specs, previous: Optional[RuleSet] = None, max_groups: int = CORRELATION_MAX_GROUPS) -> RuleSet:
+    """Compile rule specs; unchanged rules from previous are reused with their state"""
+    kept = {r.fingerprint: r for r in previous.rules} if previous else {}
+    rules = []
+    for spec in specs:
+        fingerprint = json.dumps(spec, sort_keys=True)
+        rules.append(kept.get(fingerprint) or Rule(spec, max_groups))
+    return RuleSet(rules)
+
+
+# ==================== PIPELINE STAGE ====================
+
+class CorrelationEngine:
+    """Pipeline stage evaluating correlation rules on every event"""
+
+    name = "correlation"
+
+    def __init__(self, rules_path: Optional[str] = CORRELATION_RULES,
+                 reload_seconds: float = CORRELATION_RELOAD_SECONDS, max_groups: int = CORRELATION_MAX_GROUPS):
+        self.rules_path = rules_path
+        self.reload_seconds = reload_seconds
+        self.max_groups = max_groups
+        self.ruleset = RuleSet([])
+        self._mtime = None
+        self._stop = threading.Event()
+        self.events = 0
+        self.alerts = 0
+        self.seconds = 0.0
+        self.reloads = 0
+        self.reload_errors = 0
+        self.last_error = None
+        if rules_path:
+            self.reload()
+            threading.Thread(target=self._watch, name="correlation-reload", daemon=True).start()
+
+    def reload(self) -> bool:
+        """Recompile the rules if the file changed; the swap is a single reference assignment"""
+        try:
+            mtime = os.stat(self.rules_path).st_mtime
+        except OSError:
+            return False  # no rules file: nothing to evaluate
+        if mtime == self._mtime:
+            return False
+        try:
+            ruleset = compile_rules(load_rules(self.rules_path), self.ruleset, self.max_groups)
+        except Exception as e:
+            # Keep evaluating the previous rules until the file is fixed (this also runs on the watcher thread)
+            self._mtime = mtime
+            self.reload_errors += 1
+            self.last_error = str(e)
+            return False
+        self.ruleset, self._mtime, self.last_error = ruleset, mtime, None
+        self.reloads += 1
+        return True
+
+    def _watch(self):
+        while not self._stop.wait(self.reload_seconds):
+            self.reload()
+
+    def stop(self):
+        self._stop.set()
+
+    @staticmethod
+    def _alert(rule: Rule, key, count, details) -> dict:
+        """Derived event shaped like QRadarLogger.log_suspicious_activity payloads"""
+        group = dict(zip(rule.group_fields, key))
+        return {
+            "event_type": "SUSPICIOUS_ACTIVITY",
+            "username": group.get("username", details.get("username")),
+            "ip_address": group.get("ip_address", details.get("ip_address")),
+            "activity_type": rule.name,
+            "timestamp": datetime.utcnow().isoformat(),
+            "details": {
+                "rule": rule.name,
+                "severity": rule.severity,
+                "description": rule.description,
+                "group": group,
+                "count": count,
+                "window_seconds": rule.window,
+                "source": "correlation",
+            },
+        }
+
+    def process(self, event_type, details):
+        out = [(event_type, details)]
+        if not isinstance(details, dict):
+            return out
+        candidates = self.ruleset.candidates(event_type)
+        if not candidates:
+            return out
+        start = now = time.perf_counter()
+        wall = time.time()
+        for rule in candidates:
+            fired = rule.evaluate(event_type, details, wall)
+            end = time.perf_counter()
+            rule.evaluations += 1
+            rule.seconds += end - now
+            now = end
+            if fired:
+                rule.alerts += 1
+                out.append(("SUSPICIOUS_ACTIVITY", self._alert(rule, *fired, details)))
+        self.events += 1
+        self.alerts += len(out) - 1
+        self.seconds += now - start
+        return out
+
+    def stats(self) -> dict:
+        return {
+            "rules_file": self.rules_path,
+            "rules": {r.name: r.stats() for r in self.ruleset.rules},
+            "events_evaluated": self.events,
+            "alerts": self.alerts,
+            "avg_event_us": round(self.seconds * 1e6 / self.events, 3) if self.events else None,
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+            "last_error": self.last_error,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check correlation rules or measure their cost")
+    parser.add_argument("--rules", default=CORRELATION_RULES or "correlation_rules.json")
+    parser.add_argument("--check", action="store_true", help="compile the rules file and list its rules")
+    parser.add_argument("--bench", action="store_true", help="run a synthetic event stream through the rules")
+    parser.add_argument("--events", type=int, default=200000)
+    args = parser.parse_args()
+
+    if args.check:
+        ruleset = compile_rules(load_rules(args.rules))
+        for rule in ruleset.rules:
+            kind = "sequence" if rule.steps else (f"threshold {rule.threshold}" if rule.threshold > 1 else "match")
+            types = ",".join(sorted(rule.event_types)) if rule.event_types else "any"
+            print(f"✓ {rule.name:<28} {kind:<14} on {types:<32} by {','.join(rule.group_fields) or '-'}")
+    elif args.bench:
+        import random
+
+        engine = CorrelationEngine(args.rules, reload_seconds=3600)
+        users = [f"user{i}" for i in range(2000)]
+        ips = [f"10.{i // 256}.{i % 256}.{random.randint(1, 254)}" for i in range(1000)]
+        stream = []
+        for _ in range(args.events):
+            kind = random.random()
+            event_type = "ADMIN_ACCESS" if kind < 0.05 else "LOGIN_ATTEMPT"
+            stream.append((event_type, {
+                "event_type": event_type, "username": random.choice(users), "ip_address": random.choice(ips),
+                "status": "failure" if random.random() < 0.3 else "success",
+                "details": {"anomaly": {"score": random.random()}},
+            }))
+        start = time.perf_counter()
+        for event_type, details in stream:
+            engine.process(event_type, details)
+        elapsed = time.perf_counter() - start
+        stats = engine.stats()
+        print(f"✓ {args.events} events in {elapsed:.2f}s ({args.events / elapsed:,.0f} events/s), "
+              f"{stats['alerts']} alerts, {stats['avg_event_us']} us/event in rules")
+        for name, rule in stats["rules"].items():
+            print(f"  {name:<28} {rule['evaluations']:>8} evals {rule['avg_eval_us']:>7} us  "
+                  f"{rule['alerts']:>6} alerts  {rule['groups']:>6} groups")
+    else:
+        parser.print_help()
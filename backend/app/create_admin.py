@@ -1,27 +1,47 @@
-# backend/app/create_admin.py
-from db import SessionLocal
-from models import User
-from auth import hash_password
-
-# Initialize DB session
-db = SessionLocal()
-
-# Create admin user if not exists
-admin_username = "admin"
-admin = db.query(User).filter(User.username == admin_username).first()
-
-if not admin:
-    admin = User(
-        username=admin_username,
-        hashed_password=hash_password("admin123"),
-        role="admin",
-        full_name="System Admin",
-        email="admin@example.com"
-    )
-    db.add(admin)
-    db.commit()
-    print(f"✅ Admin user created: {admin_username} / admin123")
-else:
-    print("⚠️ Admin user already exists")
-
-db.close()
+"""
+Create the initial admin account.
+
+Usage:
+    python -m app.create_admin
+    python -m app.create_admin --username root --email root@example.com --password '...'
+
+For many accounts at once use python -m app.provision.
+"""
+import argparse
+
+from .db import SessionLocal, engine, Base
+from .models import User
+from .auth import get_password_hash
+
+
+def create_admin(username: str, email: str, password: str, full_name: str = "System Admin") -> bool:
+    """Create the admin user if it does not exist; returns True when created"""
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if db.query(User).filter(User.username == username).first():
+            return False
+        db.add(User(
+            username=username,
+            hashed_password=get_password_hash(password),
+            role="admin",
+            full_name=full_name,
+            email=email
+        ))
+        db.commit()
+        return True
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the initial admin user")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--email", default="admin@example.com")
+    parser.add_argument("--password", default="admin123")
+    args = parser.parse_args()
+
+    if create_admin(args.username, args.email, args.password):
+        print(f"✅ Admin user created: {args.username} / {args.password}")
+    else:
+        print("⚠️ Admin user already exists")
@@ -0,0 +1,206 @@
+"""
+IP enrichment - attaches ASN, country, organisation and internal/external zone to events
+before they are forwarded to QRadar.
+
+The CIDR database is a local CSV file (IPv4 and IPv6, '#' comments allowed):
+    network,asn,country,org
+    8.8.8.0/24,15169,US,GOOGLE
+    2001:4860::/32,15169,US,GOOGLE
+
+Networks are flattened into disjoint intervals (most specific prefix wins) and stored in
+sorted arrays, so a lookup is one binary search. IPv6 is keyed on the upper 64 bits, which
+covers routed prefixes; longer prefixes are widened to /64. The file is watched and
+rebuilt off the send path; the finished table is swapped in with a single assignment.
+"""
+import bisect
+import csv
+import ipaddress
+import os
+import threading
+from array import array
+from functools import lru_cache
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+IP_ENRICHMENT_DB = os.getenv("IP_ENRICHMENT_DB")  # path to CIDR CSV, optional
+IP_ENRICHMENT_RELOAD_SECONDS = float(os.getenv("IP_ENRICHMENT_RELOAD_SECONDS", "60"))
+IP_ENRICHMENT_CACHE_SIZE = int(os.getenv("IP_ENRICHMENT_CACHE_SIZE", "4096"))
+ENRICH_EVENT_TYPES = frozenset(
+    t.strip() for t in os.getenv("ENRICH_EVENT_TYPES", "LOGIN_ATTEMPT,SUSPICIOUS_ACTIVITY").split(",") if t.strip()
+)
+INTERNAL_NETWORKS = [
+    n.strip() for n in os.getenv(
+        "INTERNAL_NETWORKS",
+        "10.0.0.0/8,172.16.0.0/12,192.168.0.0/16,127.0.0.0/8,169.254.0.0/16,fc00::/7,fe80::/10,::1/128"
+    ).split(",") if n.strip()
+]
+
+_V6_SHIFT = 64  # IPv6 keys keep the upper 64 bits
+
+
+def _flatten(ranges):
+    """Turn nested (start, end, value) CIDR ranges into disjoint ranges, innermost winning"""
+    out = []
+    stack = []  # open (end, value) ranges, innermost last
+    cursor = 0
+
+    def emit(start, end, value):
+        if start <= end:
+            out.append((start, end, value))
+
+    for start, end, value in sorted(ranges, key=lambda r: (r[0], -r[1])):
+        while stack and stack[-1][0] < start:
+            top_end, top_value = stack.pop()
+            emit(cursor, top_end, top_value)
+            cursor = top_end + 1
+        if stack:
+            emit(cursor, start - 1, stack[-1][1])
+        stack.append((end, value))
+        cursor = start
+    while stack:
+        top_end, top_value = stack.pop()
+        emit(cursor, top_end, top_value)
+        cursor = top_end + 1
+    return out
+
+
+class IntervalTable:
+    """Disjoint address ranges in sorted unsigned arrays with an index into a value table"""
+
+    def __init__(self, ranges, typecode):
+        flat = _flatten(ranges)
+        self.starts = array(typecode, (r[0] for r in flat))
+        self.ends = array(typecode, (r[1] for r in flat))
+        self.values = array("I", (r[2] for r in flat))
+
+    def find(self, key: int) -> Optional[int]:
+        i = bisect.bisect_right(self.starts, key) - 1
+        if i >= 0 and key <= self.ends[i]:
+            return self.values[i]
+        return None
+
+    def __len__(self):
+        return len(self.starts)
+
+
+class CIDRDatabase:
+    """Longest-prefix lookup for IPv4 and IPv6 networks with memoized results"""
+
+    def __init__(self, networks, cache_size: int = IP_ENRICHMENT_CACHE_SIZE):
+        """networks: iterable of (cidr string, value) pairs; value is any hashable record"""
+        values, index = [], {}
+        v4, v6 = [], []
+        for cidr, value in networks:
+            net = ipaddress.ip_network(cidr, strict=False)
+            slot = index.setdefault(value, len(values))
+            if slot == len(values):
+                values.append(value)
+            start, end = int(net.network_address), int(net.broadcast_address)
+            if net.version == 4:
+                v4.append((start, end, slot))
+            else:
+                v6.append((start >> _V6_SHIFT, end >> _V6_SHIFT, slot))
+        self.records = values
+        self.v4 = IntervalTable(v4, "I")
+        self.v6 = IntervalTable(v6, "Q")
+        self.lookup = lru_cache(maxsize=cache_size)(self._lookup)
+
+    def _lookup(self, ip: str):
+        try:
+            addr = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        if addr.version == 4:
+            slot = self.v4.find(int(addr))
+        else:
+            mapped = addr.ipv4_mapped
+            slot = self.v4.find(int(mapped)) if mapped else self.v6.find(int(addr) >> _V6_SHIFT)
+        return None if slot is None else self.records[slot]
+
+    def __len__(self):
+        return len(self.v4) + len(self.v6)
+
+    @classmethod
+    def from_csv(cls, path: str, cache_size: int = IP_ENRICHMENT_CACHE_SIZE) -> "CIDRDatabase":
+        """Load network,asn,country,org rows; a header row and '#' comments are skipped"""
+        def rows():
+            with open(path, newline="", encoding="utf-8") as f:
+                for row in csv.reader(f):
+                    if not row or row[0].startswith("#") or row[0] == "network":
+                        continue
+                    asn = int(row[1]) if len(row) > 1 and row[1].strip().isdigit() else None
+                    country = row[2].strip() or None if len(row) > 2 else None
+                    org = row[3].strip() or None if len(row) > 3 else None
+                    yield row[0].strip(), (asn, country, org)
+        return cls(rows(), cache_size)
+
+
+class IPEnricher:
+    """Pipeline stage adding asn/country/org/zone fields to events carrying an ip_address"""
+
+    name = "enrichment"
+
+    def __init__(self, db_path: Optional[str] = None, event_types=ENRICH_EVENT_TYPES,
+                 internal_networks=INTERNAL_NETWORKS, reload_seconds: float = IP_ENRICHMENT_RELOAD_SECONDS):
+        self.db_path = db_path
+        self.event_types = frozenset(event_types)
+        self.reload_seconds = reload_seconds
+        self.internal = CIDRDatabase((n, "internal") for n in internal_networks)
+        self.db = None
+        self._mtime = None
+        self._stop = threading.Event()
+        self.reloads = 0
+        self.reload_errors = 0
+        if db_path:
+            self.reload()
+            threading.Thread(target=self._watch, name="ip-enrichment-reload", daemon=True).start()
+
+    def reload(self) -> bool:
+        """Rebuild the table if the file changed; the swap is a single reference assignment"""
+        try:
+            mtime = os.stat(self.db_path).st_mtime
+            if mtime == self._mtime:
+                return False
+            db = CIDRDatabase.from_csv(self.db_path)
+        except (OSError, ValueError):
+            self.reload_errors += 1
+            return False
+        self.db, self._mtime = db, mtime
+        self.reloads += 1
+        return True
+
+    def _watch(self):
+        while not self._stop.wait(self.reload_seconds):
+            self.reload()
+
+    def stop(self):
+        self._stop.set()
+
+    def enrich(self, ip: Optional[str]) -> dict:
+        """Return enrichment fields for one address"""
+        if not ip:
+            return {}
+        fields = {"zone": "internal" if self.internal.lookup(ip) else "external"}
+        db = self.db  # read the reference once; a reload may swap it concurrently
+        record = db.lookup(ip) if db is not None else None
+        if record:
+            fields["asn"], fields["country"], fields["as_org"] = record
+        return fields
+
+    def stats(self) -> dict:
+        db = self.db
+        return {
+            "database": self.db_path,
+            "intervals": len(db) if db is not None else 0,
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+            "cache": db.lookup.cache_info()._asdict() if db is not None else None,
+        }
+
+    def process(self, event_type, details):
+        if event_type in self.event_types and isinstance(details, dict) and details.get("ip_address"):
+            details = {**details, **self.enrich(details["ip_address"])}
+        return [(event_type, details)]
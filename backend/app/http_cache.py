@@ -0,0 +1,131 @@
+"""
+HTTP caching helpers - conditional GET validators and a small per-process response cache.
+Admin list endpoints cache their serialized JSON body together with its ETag/Last-Modified;
+entries are tagged with the tables they were built from and dropped once a write to them commits.
+"""
+import hashlib
+import os
+import threading
+import time
+from itertools import chain
+from datetime import datetime
+from typing import Optional
+
+from flask import request, current_app
+from sqlalchemy import event
+from dotenv import load_dotenv
+
+load_dotenv()
+
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "30"))  # seconds
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "64"))
+
+
+class CachedResponse:
+    """Serialized response body plus its validators"""
+    __slots__ = ("body", "etag", "last_modified", "tables", "expires_at")
+
+    def __init__(self, body: bytes, etag: str, last_modified: Optional[datetime], tables, expires_at: float):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.tables = frozenset(tables)
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """Thread-safe TTL cache of serialized responses, invalidated per table"""
+
+    def __init__(self, ttl: float = RESPONSE_CACHE_TTL, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """Return a live entry for key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry
+
+    def set(self, key: str, body: bytes, etag: str, last_modified: Optional[datetime], tables) -> CachedResponse:
+        """Store a serialized response built from the given tables"""
+        entry = CachedResponse(body, etag, last_modified, tables, time.monotonic() + self.ttl)
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self.max_entries:
+                # Evict the entry closest to expiry
+                oldest = min(self._entries, key=lambda k: self._entries[k].expires_at)
+                del self._entries[oldest]
+            self._entries[key] = entry
+        return entry
+
+    def invalidate(self, *tables: str):
+        """Drop every entry built from any of the given tables"""
+        with self._lock:
+            stale = [k for k, e in self._entries.items() if e.tables.intersection(tables)]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def dump_json(payload) -> bytes:
+    """Serialize a payload the same way jsonify does"""
+    return current_app.json.dumps(payload).encode("utf-8")
+
+
+def make_etag(*parts) -> str:
+    """Derive a short strong ETag from validator parts (ids, timestamps, counts)"""
+    raw = "|".join("" if p is None else str(p) for p in parts)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20]
+
+
+def conditional_response(body: bytes, etag: str, last_modified: Optional[datetime] = None):
+    """Build a JSON response with validators; answers 304 if the client copy is current"""
+    response = current_app.response_class(body, mimetype="application/json")
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    # Allow the browser to keep the copy but always revalidate it
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def register_invalidation(session_factory, models, cache: "ResponseCache"):
+    """Invalidate cache entries for the models' tables once a transaction writing to them commits"""
+    tables = {model: model.__tablename__ for model in models}
+
+    def _after_flush(session, flush_context):
+        changed = session.info.setdefault("cache_pending", set())
+        for target in chain(session.new, session.deleted):
+            if type(target) in tables:
+                changed.add(tables[type(target)])
+        for target in session.dirty:
+            if type(target) in tables and session.is_modified(target):
+                changed.add(tables[type(target)])
+
+    def _after_commit(session):
+        changed = session.info.pop("cache_pending", None)
+        if changed:
+            cache.invalidate(*changed)
+
+    def _after_rollback(session):
+        session.info.pop("cache_pending", None)
+
+    event.listen(session_factory, "after_flush", _after_flush)
+    event.listen(session_factory, "after_commit", _after_commit)
+    event.listen(session_factory, "after_rollback", _after_rollback)
+
+
+# Global instance
+response_cache = ResponseCache()
@@ -0,0 +1,173 @@
+"""
+Bulk event ingestion - parses and validates NDJSON batches pushed by external services.
+Each line is one event in a compact schema:
+  {"event_type": "LOGIN_ATTEMPT", "username": "alice", "ip_address": "10.0.0.5",
+   "status": "failure", "timestamp": "2024-01-01T12:00:00Z", "user_agent": "...",
+   "source": "vpn-gw", "details": {...}}
+Only event_type is required. Accepted events are inserted into activity_logs with a
+single executemany and forwarded to QRadar as one batch.
+"""
+import ipaddress
+import json
+import os
+import re
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+from dotenv import load_dotenv
+
+from .models import User, ActivityLog
+
+load_dotenv()
+
+INGEST_MAX_EVENTS = int(os.getenv("INGEST_MAX_EVENTS", "50000"))
+INGEST_MAX_ERRORS_REPORTED = 100
+INGEST_API_KEY = os.getenv("INGEST_API_KEY")  # lets services push without an admin JWT
+USERNAME_LOOKUP_CHUNK = 500
+
+EVENT_TYPE_RE = re.compile(r"^[A-Z][A-Z0-9_]{0,49}$")
+ALLOWED_STATUSES = frozenset(("success", "failure", "error"))
+ALLOWED_FIELDS = frozenset((
+    "event_type", "username", "ip_address", "status", "timestamp",
+    "user_agent", "source", "details"
+))
+
+
+class EventValidationError(ValueError):
+    """Raised when an ingested event does not match the schema"""
+
+
+def _parse_timestamp(value) -> datetime:
+    if not isinstance(value, str):
+        raise EventValidationError("timestamp must be an ISO-8601 string")
+    try:
+        ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise EventValidationError("timestamp is not ISO-8601")
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def validate_event(obj) -> dict:
+    """Validate one decoded event and return a normalized event dict"""
+    if not isinstance(obj, dict):
+        raise EventValidationError("event must be a JSON object")
+    unknown = obj.keys() - ALLOWED_FIELDS
+    if unknown:
+        raise EventValidationError(f"unknown field(s): {', '.join(sorted(unknown))}")
+
+    event_type = obj.get("event_type")
+    if not isinstance(event_type, str) or not EVENT_TYPE_RE.match(event_type):
+        raise EventValidationError("event_type must be an UPPER_SNAKE_CASE string")
+
+    username = obj.get("username")
+    if username is not None and (not isinstance(username, str) or len(username) > 50):
+        raise EventValidationError("username must be a string of at most 50 characters")
+
+    ip_address = obj.get("ip_address")
+    if ip_address is not None:
+        try:
+            ip_address = str(ipaddress.ip_address(ip_address))
+        except (TypeError, ValueError):
+            raise EventValidationError("ip_address is not a valid IPv4/IPv6 address")
+
+    status = obj.get("status", "success")
+    if status not in ALLOWED_STATUSES:
+        raise EventValidationError("status must be one of success, failure, error")
+
+    user_agent = obj.get("user_agent")
+    if user_agent is not None and not isinstance(user_agent, str):
+        raise EventValidationError("user_agent must be a string")
+
+    source = obj.get("source")
+    if source is not None and not isinstance(source, str):
+        raise EventValidationError("source must be a string")
+
+    details = obj.get("details")
+    if details is not None and not isinstance(details, dict):
+        raise EventValidationError("details must be a JSON object")
+
+    timestamp = _parse_timestamp(obj["timestamp"]) if "timestamp" in obj else datetime.utcnow()
+
+    return {
+        "event_type": event_type,
+        "username": username,
+        "ip_address": ip_address,
+        "status": status,
+        "timestamp": timestamp,
+        "user_agent": user_agent[:255] if user_agent else None,
+        "source": source,
+        "details": details or {},
+    }
+
+
+def parse_ndjson(body: bytes):
+    """Parse an NDJSON body; returns (events, errors) where errors are {line, error} dicts"""
+    events, errors = [], []
+    for lineno, line in enumerate(body.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            events.append(validate_event(json.loads(line)))
+        except json.JSONDecodeError as e:
+            errors.append({"line": lineno, "error": f"invalid JSON: {e.msg}"})
+        except EventValidationError as e:
+            errors.append({"line": lineno, "error": str(e)})
+    return events, errors
+
+
+def store_events(db, events) -> list:
+    """Bulk insert validated events into activity_logs with a single executemany;
+    returns the inserted rows with their ids"""
+    if not events:
+        return []
+
+    # Resolve usernames with one IN query per chunk (SQLite caps bound parameters)
+    usernames = list({e["username"] for e in events if e["username"]})
+    user_ids = {}
+    for i in range(0, len(usernames), USERNAME_LOOKUP_CHUNK):
+        chunk = usernames[i:i + USERNAME_LOOKUP_CHUNK]
+        user_ids.update(db.execute(
+            select(User.username, User.id).where(User.username.in_(chunk))
+        ).all())
+
+    rows = []
+    for e in events:
+        details = dict(e["details"])
+        if e["source"]:
+            details["source"] = e["source"]
+        if e["username"] and e["username"] not in user_ids:
+            details["username"] = e["username"]
+        rows.append({
+            "user_id": user_ids.get(e["username"]),
+            "timestamp": e["timestamp"],
+            "action": e["event_type"],
+            "ip_address": e["ip_address"],
+            "user_agent": e["user_agent"],
+            "status": e["status"],
+            "details": json.dumps(details) if details else None,
+        })
+
+    # insertmanyvalues batches the rows and hands back ids in parameter order
+    table = ActivityLog.__table__
+    ids = db.execute(
+        table.insert().returning(table.c.id, sort_by_parameter_order=True), rows
+    ).scalars().all()
+    db.commit()
+    for row, log_id in zip(rows, ids):
+        row["id"] = log_id
+    return rows
+
+
+def to_qradar_event(event: dict) -> dict:
+    """Shape an ingested event like the payloads QRadarLogger builds itself"""
+    return {
+        "event_type": event["event_type"],
+        "username": event["username"],
+        "ip_address": event["ip_address"],
+        "status": event["status"],
+        "timestamp": event["timestamp"].isoformat(),
+        "source": event["source"],
+        "details": event["details"],
+    }
@@ -0,0 +1,352 @@
+"""
+JWT signing keys - asymmetric token signing (ES256 or EdDSA) with a rotating set of keys.
+
+With JWT_ALGORITHM=ES256 or EdDSA, tokens are signed with a private key from JWT_KEY_DIR and
+carry its id in the "kid" header. Other services verify them locally with the public keys
+published at /.well-known/jwks.json and never need a shared secret or a call back to this app.
+JWT_ALGORITHM=HS256 (the default) keeps the shared-secret tokens from auth.py.
+
+Key files are PEM, named after their key id:
+    <kid>.pem       private key (PKCS#8); signs and verifies
+    <kid>.pub.pem   public key only; verifies tokens issued before a rotation
+Keys are parsed once into key objects, and each key's encoded header segment is
+precomputed, so signing and verifying never re-parse PEM. New tokens are signed with
+JWT_ACTIVE_KID, or else the newest private key of JWT_ALGORITHM. Every worker checks the
+directory's mtime at most every KEY_RELOAD_MIN_SECONDS while signing or verifying, and re-reads
+it when keys were added or removed; a token whose kid is not loaded forces the same re-read.
+Workers that only sign therefore switch to a new key too.
+
+Rotation: generate a key, let every worker load it (restart, or wait for the reload), then
+delete the old private key or keep only its .pub.pem until REFRESH_TOKEN_EXPIRE_DAYS have passed.
+    python -m app.jwt_keys --generate            # new key for JWT_ALGORITHM
+    python -m app.jwt_keys --list
+    python -m app.jwt_keys --bench               # cached key objects vs parsing PEM per call
+"""
+import argparse
+import base64
+import calendar
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature, encode_dss_signature
+from dotenv import load_dotenv
+
+load_dotenv()
+
+JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")  # HS256, ES256 or EdDSA
+JWT_KEY_DIR = os.getenv("JWT_KEY_DIR", "jwt_keys")
+JWT_ACTIVE_KID = os.getenv("JWT_ACTIVE_KID")  # default: newest private key of JWT_ALGORITHM
+JWKS_MAX_AGE = int(os.getenv("JWKS_MAX_AGE", "300"))  # seconds verifiers may cache the key set
+KEY_RELOAD_MIN_SECONDS = 30
+ASYMMETRIC_ALGORITHMS = ("ES256", "EdDSA")
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def _json(payload) -> bytes:
+    return json.dumps(payload, separators=(",", ":"), default=_timestamp).encode("utf-8")
+
+
+def _timestamp(value):
+    """datetime claims (exp, iat) as NumericDate, like jose"""
+    if isinstance(value, datetime):
+        return calendar.timegm(value.utctimetuple())
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class SigningKey:
+    """One parsed key; private is None for verify-only keys"""
+
+    def __init__(self, kid: str, key, mtime: float = 0.0):
+        self.kid = kid
+        self.mtime = mtime
+        if isinstance(key, (ec.EllipticCurvePrivateKey, ed25519.Ed25519PrivateKey)):
+            self.private, self.public = key, key.public_key()
+        else:
+            self.private, self.public = None, key
+        if isinstance(self.public, ec.EllipticCurvePublicKey):
+            if not isinstance(self.public.curve, ec.SECP256R1):
+                raise ValueError(f"{kid}: only P-256 EC keys are supported (ES256)")
+            self.alg = "ES256"
+        elif isinstance(self.public, ed25519.Ed25519PublicKey):
+            self.alg = "EdDSA"
+        else:
+            raise ValueError(f"{kid}: unsupported key type {type(self.public).__name__}")
+        self.header = _b64encode(_json({"alg": self.alg, "typ": "JWT", "kid": kid}))
+
+    def sign(self, data: bytes) -> bytes:
+        if self.alg == "EdDSA":
+            return self.private.sign(data)
+        r, s = decode_dss_signature(self.private.sign(data, ec.ECDSA(hashes.SHA256())))
+        return r.to_bytes(32, "big") + s.to_bytes(32, "big")  # JWS wants raw r || s, not DER
+
+    def verify(self, signature: bytes, data: bytes) -> bool:
+        try:
+            if self.alg == "EdDSA":
+                self.public.verify(signature, data)
+            else:
+                if len(signature) != 64:
+                    return False
+                der = encode_dss_signature(int.from_bytes(signature[:32], "big"),
+                                           int.from_bytes(signature[32:], "big"))
+                self.public.verify(der, data, ec.ECDSA(hashes.SHA256()))
+            return True
+        except InvalidSignature:
+            return False
+
+    def jwk(self) -> dict:
+        if self.alg == "EdDSA":
+            raw = self.public.public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+            fields = {"kty": "OKP", "crv": "Ed25519", "x": _b64encode(raw)}
+        else:
+            numbers = self.public.public_numbers()
+            fields = {"kty": "EC", "crv": "P-256",
+                      "x": _b64encode(numbers.x.to_bytes(32, "big")),
+                      "y": _b64encode(numbers.y.to_bytes(32, "big"))}
+        return {**fields, "kid": self.kid, "use": "sig", "alg": self.alg}
+
+
+def _read_key(path: str):
+    with open(path, "rb") as f:
+        data = f.read()
+    if path.endswith(".pub.pem"):
+        return serialization.load_pem_public_key(data)
+    return serialization.load_pem_private_key(data, password=None)
+
+
+class KeySet:
+    """Signing keys by kid, loaded from a directory and reloaded when it changes or on unknown kids"""
+
+    def __init__(self, directory: str = JWT_KEY_DIR, algorithm: str = JWT_ALGORITHM,
+                 active_kid: Optional[str] = JWT_ACTIVE_KID):
+        self.directory = directory
+        self.algorithm = algorithm
+        self.active_kid = active_kid
+        self.keys = {}
+        self.active = None
+        self.errors = []
+        self.signed = 0
+        self.verified = 0
+        self.rejected = 0
+        self.reloads = 0
+        self._last_load = 0.0
+        self._last_check = time.monotonic()
+        self._directory_mtime = None
+        self._lock = threading.Lock()
+        if self.enabled:
+            if algorithm not in ASYMMETRIC_ALGORITHMS:
+                raise ValueError(f"JWT_ALGORITHM must be HS256, ES256 or EdDSA, not {algorithm}")
+            self.load()
+
+    @property
+    def enabled(self) -> bool:
+        return self.algorithm != "HS256"
+
+    def require_signing_key(self):
+        """Fail startup instead of the first login when no signing key is available"""
+        if self.enabled and self.active is None:
+            raise RuntimeError(f"No {self.algorithm} signing key in {self.directory}; "
+                               f"create one with python -m app.jwt_keys --generate")
+
+    def load(self):
+        """Parse every key file and pick the active key; swapped in with single assignments"""
+        self._directory_mtime = self._mtime()  # before listing, so a change during the load is seen next time
+        keys, errors = {}, []
+        if os.path.isdir(self.directory):
+            for name in sorted(os.listdir(self.directory)):
+                if not name.endswith(".pem"):
+                    continue
+                kid = name[:-len(".pub.pem")] if name.endswith(".pub.pem") else name[:-len(".pem")]
+                path = os.path.join(self.directory, name)
+                try:
+                    key = SigningKey(kid, _read_key(path), os.path.getmtime(path))
+                except (OSError, ValueError, TypeError) as e:
+                    errors.append(f"{name}: {e}")
+                    continue
+                if kid not in keys or key.private is not None:
+                    keys[kid] = key
+        signers = [k for k in keys.values() if k.private is not None and k.alg == self.algorithm]
+        if self.active_kid:
+            active = keys.get(self.active_kid)
+            if active is None or active not in signers:
+                errors.append(f"JWT_ACTIVE_KID {self.active_kid} is not a {self.algorithm} private key")
+                active = None
+        else:
+            active = max(signers, key=lambda k: (k.mtime, k.kid), default=None)
+        self.keys, self.errors = keys, errors
+        if active is not None or self.active is None:
+            self.active = active
+        self._last_load = time.monotonic()
+
+    def _mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.directory).st_mtime_ns
+        except OSError:
+            return None
+
+    def _refresh(self):
+        """Reload if keys were added or removed; the directory is checked at most every KEY_RELOAD_MIN_SECONDS"""
+        if time.monotonic() - self._last_check < KEY_RELOAD_MIN_SECONDS:
+            return
+        with self._lock:
+            if time.monotonic() - self._last_check < KEY_RELOAD_MIN_SECONDS:
+                return
+            self._last_check = time.monotonic()
+            if self._mtime() != self._directory_mtime:
+                self.load()
+                self.reloads += 1
+
+    def _reload_for(self, kid: str) -> Optional[SigningKey]:
+        with self._lock:
+            if kid not in self.keys and time.monotonic() - self._last_load >= KEY_RELOAD_MIN_SECONDS:
+                self.load()
+                self.reloads += 1
+        return self.keys.get(kid)
+
+    def encode(self, claims: dict) -> str:
+        self._refresh()
+        key = self.active
+        signing_input = f"{key.header}.{_b64encode(_json(claims))}"
+        self.signed += 1
+        return f"{signing_input}.{_b64encode(key.sign(signing_input.encode('ascii')))}"
+
+    def decode(self, token: str) -> Optional[dict]:
+        """Verified, unexpired claims of token, or None"""
+        self._refresh()
+        try:
+            header_segment, payload_segment, signature_segment = token.split(".")
+            header = json.loads(_b64decode(header_segment))
+            kid = header.get("kid")
+            key = self.keys.get(kid) or (self._reload_for(kid) if isinstance(kid, str) else None)
+            # The key decides the algorithm; the header's alg must agree (no alg substitution)
+            if key is None or header.get("alg") != key.alg:
+                raise ValueError("unknown key")
+            if not key.verify(_b64decode(signature_segment), f"{header_segment}.{payload_segment}".encode("ascii")):
+                raise ValueError("bad signature")
+            claims = json.loads(_b64decode(payload_segment))
+            exp = claims.get("exp")
+            if not isinstance(exp, (int, float)) or exp <= time.time():
+                raise ValueError("expired")
+        except (ValueError, TypeError, AttributeError, UnicodeError):
+            self.rejected += 1
+            return None
+        self.verified += 1
+        return claims
+
+    def jwks(self) -> dict:
+        return {"keys": [k.jwk() for k in self.keys.values()]}
+
+    def stats(self) -> dict:
+        return {
+            "algorithm": self.algorithm,
+            "active_kid": self.active.kid if self.active else None,
+            "kids": sorted(self.keys),
+            "signed": self.signed,
+            "verified": self.verified,
+            "rejected": self.rejected,
+            "reloads": self.reloads,
+            "errors": self.errors,
+        }
+
+
+def generate_key(directory: str = JWT_KEY_DIR, algorithm: str = JWT_ALGORITHM) -> str:
+    """Write a new private key to directory; returns its kid"""
+    if algorithm == "ES256":
+        key = ec.generate_private_key(ec.SECP256R1())
+    elif algorithm == "EdDSA":
+        key = ed25519.Ed25519PrivateKey.generate()
+    else:
+        raise ValueError(f"cannot generate a key for {algorithm}; use ES256 or EdDSA")
+    kid = f"{algorithm.lower()}-{datetime.utcnow():%Y%m%d%H%M%S}-{os.urandom(2).hex()}"
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{kid}.pem")
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+    return kid
+
+
+def retire_key(directory: str, kid: str):
+    """Replace a private key with its public half, so it only verifies outstanding tokens"""
+    path = os.path.join(directory, f"{kid}.pem")
+    public = _read_key(path).public_key()
+    with open(os.path.join(directory, f"{kid}.pub.pem"), "wb") as f:
+        f.write(public.public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo))
+    os.remove(path)
+
+
+# Global instance
+key_set = KeySet()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage JWT signing keys")
+    parser.add_argument("--generate", action="store_true", help="create a new signing key")
+    parser.add_argument("--alg", default=JWT_ALGORITHM if JWT_ALGORITHM != "HS256" else "ES256",
+                        choices=ASYMMETRIC_ALGORITHMS)
+    parser.add_argument("--retire", metavar="KID", help="keep only the public half of a key")
+    parser.add_argument("--list", action="store_true", help="list loaded keys")
+    parser.add_argument("--bench", action="store_true", help="time sign + verify with cached and re-parsed keys")
+    parser.add_argument("--tokens", type=int, default=2000)
+    args = parser.parse_args()
+
+    if args.generate:
+        print(f"✓ Created {args.alg} key {generate_key(JWT_KEY_DIR, args.alg)} in {JWT_KEY_DIR}")
+    elif args.retire:
+        retire_key(JWT_KEY_DIR, args.retire)
+        print(f"✓ Retired {args.retire}; tokens it signed still verify until {args.retire}.pub.pem is removed")
+    elif args.list:
+        keys = KeySet(JWT_KEY_DIR, args.alg)
+        for kid, key in sorted(keys.keys.items()):
+            role = "active" if key is keys.active else ("signing" if key.private else "verify only")
+            print(f"  {kid:<32} {key.alg:<6} {role}")
+        for error in keys.errors:
+            print(f"✗ {error}")
+    elif args.bench:
+        import tempfile
+        from datetime import timedelta
+        from jose import jwt
+
+        claims = {"sub": "alice", "role": "user", "type": "access",
+                  "exp": datetime.utcnow() + timedelta(hours=1)}
+        with tempfile.TemporaryDirectory() as tmp:
+            generate_key(tmp, "ES256")
+            generate_key(tmp, "EdDSA")
+            for alg in ASYMMETRIC_ALGORITHMS:
+                keys = KeySet(tmp, alg)
+                start = time.perf_counter()
+                for _ in range(args.tokens):
+                    keys.decode(keys.encode(claims))
+                cached = (time.perf_counter() - start) / args.tokens
+                private_pem = keys.active.private.private_bytes(
+                    serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+                public_pem = keys.active.public.public_bytes(
+                    serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+                start = time.perf_counter()
+                for _ in range(args.tokens):
+                    # What loading keys per call adds: one PEM parse to sign and one to verify
+                    serialization.load_pem_private_key(private_pem, password=None)
+                    serialization.load_pem_public_key(public_pem)
+                parsed = (time.perf_counter() - start) / args.tokens
+                print(f"  {alg:<6} sign+verify {cached * 1e6:8.1f} us (cached key)   "
+                      f"{(cached + parsed) * 1e6:8.1f} us (PEM parsed per call)")
+        start = time.perf_counter()
+        for _ in range(args.tokens):
+            jwt.decode(jwt.encode(claims, "secret", algorithm="HS256"), "secret", algorithms=["HS256"])
+        print(f"  HS256  sign+verify {(time.perf_counter() - start) / args.tokens * 1e6:8.1f} us (jose, shared secret)")
+    else:
+        parser.print_help()
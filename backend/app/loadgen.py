@@ -0,0 +1,326 @@
+"""
+Load generator - realistic security event mixes at high rate through QRadarLogger.
+
+Events go through a copy of the global qradar_logger (same formatting and delivery code) with
+its own fresh pipeline stages, one local app.syslog_sink as its only destination and a journal
+in a temporary directory, so forwarder changes can be measured end to end while nothing
+synthetic reaches the real collectors, qradar_events.log (which app.replay backfills from) or
+the shaper's spill file, not even window summaries emitted after the run. The mix is drawn from weighted scenarios:
+    normal       users logging in from their usual address, with the odd mistyped password
+    brute_force  one address hammering one account, occasionally ending in a success
+    spray        one address trying a few passwords across many accounts
+    admin        admin resource access, mostly by admins, sometimes denied to regular users
+Each event's details carry a marker ("stream", "seq", "sent_at") that the sink uses for
+ordering and latency; loss is what the destination sent minus what the sink received.
+
+Usage:
+    python -m app.loadgen --protocol tcp --eps 20000 --duration 10
+    python -m app.loadgen --protocol udp --eps 50000 --threads 4 --batch 100
+    python -m app.loadgen --protocol tls --mix normal=60,brute_force=25,spray=10,admin=5
+    python -m app.loadgen --no-stages        # transport only: skip correlation, coalescing, ...
+"""
+import argparse
+import copy
+import json
+import os
+import logging
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from .coalesce import EventCoalescer
+from .correlation import CorrelationEngine
+from .enrichment import IPEnricher, IP_ENRICHMENT_DB
+from .log_handlers import attach_queued_handlers, CompressingRotatingFileHandler, _queue
+from .qradar_logger import qradar_logger
+from .qradar_transport import DestinationPool, SyslogDestination, TLSSyslogDestination, tls_context
+from .shaper import EventShaper
+from .syslog_sink import SinkProcess
+
+DEFAULT_MIX = "normal=70,brute_force=15,spray=10,admin=5"
+ADMIN_RESOURCES = ("/admin/users", "/admin/stats", "/admin/logs", "/admin/audit/proof")
+
+
+# ==================== SCENARIOS ====================
+
+class Scenarios:
+    """Weighted, stateful event scenarios; next() yields (event_type, username, ip, success, resource, details)"""
+
+    def __init__(self, mix: dict, users: int = 5000, seed: int = None):
+        self.rng = random.Random(seed)
+        rng = self.rng
+        self.users = [f"user{i:05d}" for i in range(users)]
+        self.home = {u: f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}" for u in self.users}
+        self.admins = self.users[:max(1, users // 100)]
+        generators = {
+            "normal": self._normal(),
+            "brute_force": self._brute_force(),
+            "spray": self._spray(),
+            "admin": self._admin(),
+        }
+        unknown = set(mix) - set(generators)
+        if unknown:
+            raise ValueError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        self.generators = [generators[name] for name in mix]
+        self.weights = list(mix.values())
+        self._picks = []
+
+    def __next__(self):
+        if not self._picks:
+            self._picks = self.rng.choices(self.generators, self.weights, k=4096)
+        return next(self._picks.pop())
+
+    def _attacker(self):
+        rng = self.rng
+        return f"{rng.choice((45, 89, 185, 198))}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}"
+
+    def _normal(self):
+        rng = self.rng
+        while True:
+            user = rng.choice(self.users)
+            if rng.random() < 0.03:
+                yield "LOGIN_ATTEMPT", user, self.home[user], False, None, {"reason": "invalid_password"}
+            yield "LOGIN_ATTEMPT", user, self.home[user], True, None, {}
+
+    def _brute_force(self):
+        rng = self.rng
+        while True:
+            user, ip = rng.choice(self.users), self._attacker()
+            for attempt in range(rng.randint(20, 200)):
+                yield "LOGIN_ATTEMPT", user, ip, False, None, {"reason": "invalid_password", "attempts": attempt + 1}
+            if rng.random() < 0.05:
+                yield "LOGIN_ATTEMPT", user, ip, True, None, {}
+
+    def _spray(self):
+        rng = self.rng
+        while True:
+            ip = self._attacker()
+            for user in rng.sample(self.users, rng.randint(50, 500)):
+                if rng.random() < 0.2:
+                    yield "LOGIN_ATTEMPT", f"{user}.old", ip, False, None, {"reason": "user_not_found"}
+                else:
+                    yield "LOGIN_ATTEMPT", user, ip, False, None, {"reason": "invalid_password"}
+
+    def _admin(self):
+        rng = self.rng
+        while True:
+            resource = rng.choice(ADMIN_RESOURCES)
+            if rng.random() < 0.9:
+                user = rng.choice(self.admins)
+                yield "ADMIN_ACCESS", user, self.home[user], True, resource, {}
+            else:
+                user = rng.choice(self.users)
+                yield "ADMIN_ACCESS", user, self.home[user], False, resource, {"reason": "not_admin"}
+
+
+def parse_mix(spec: str) -> dict:
+    """'normal=70,brute_force=15' -> {"normal": 70.0, "brute_force": 15.0}"""
+    mix = {}
+    for item in spec.split(","):
+        name, _, weight = item.strip().partition("=")
+        if name:
+            mix[name] = float(weight or 1)
+    return mix
+
+
+def _payload(event_type, username, ip, success, resource, details):
+    """Same shape as QRadarLogger.log_login_attempt / log_admin_access payloads"""
+    data = {"event_type": event_type, "username": username, "ip_address": ip}
+    if resource is not None:
+        data["resource"] = resource
+    data["status"] = "success" if success else "failure"
+    data["timestamp"] = datetime.utcnow().isoformat()
+    data["details"] = details
+    return data
+
+
+# ==================== GENERATOR ====================
+
+class Generator(threading.Thread):
+    """One paced event stream; batch == 1 uses the per-event log_* API, larger batches send_batch"""
+
+    def __init__(self, stream: int, scenarios: Scenarios, eps: float, duration: float, batch: int = 1,
+                 forwarder=qradar_logger):
+        super().__init__(name=f"loadgen-{stream}", daemon=True)
+        self.stream = stream
+        self.forwarder = forwarder
+        self.scenarios = scenarios
+        self.eps = eps
+        self.duration = duration
+        self.batch = max(1, batch)
+        self.generated = 0
+        self.failed_sends = 0
+        self.elapsed = 0.0
+
+    def _event(self, seq):
+        event_type, username, ip, success, resource, details = next(self.scenarios)
+        details = dict(details, stream=self.stream, seq=seq, sent_at=time.time())  # marker keys last
+        return event_type, username, ip, success, resource, details
+
+    def _send(self, count):
+        if self.batch == 1:
+            for _ in range(count):
+                event_type, username, ip, success, resource, details = self._event(self.generated)
+                if event_type == "ADMIN_ACCESS":
+                    ok = self.forwarder.log_admin_access(username, ip, resource, success, details)
+                else:
+                    ok = self.forwarder.log_login_attempt(username, ip, success, details)
+                self.failed_sends += not ok
+                self.generated += 1
+            return
+        for offset in range(0, count, self.batch):
+            events = []
+            for _ in range(min(self.batch, count - offset)):
+                event = self._event(self.generated)
+                events.append((event[0], _payload(*event)))
+                self.generated += 1
+            self.failed_sends += not self.forwarder.send_batch(events)
+
+    def run(self):
+        start = time.perf_counter()
+        while True:
+            elapsed = time.perf_counter() - start
+            if elapsed >= self.duration:
+                break
+            # Catch up to the schedule in slices, so the clock is re-read at least every 1000 events
+            due = 1000 if not self.eps else min(int(elapsed * self.eps) + 1 - self.generated, 1000)
+            if due <= 0:
+                time.sleep(0.0005)
+                continue
+            self._send(due)
+        self.elapsed = time.perf_counter() - start
+
+
+def _destination(protocol, port, ca_file):
+    if protocol == "tls":
+        return TLSSyslogDestination("localhost", port, tls_context(ca_file=ca_file))
+    return SyslogDestination("127.0.0.1", port, protocol.upper())
+
+
+def _forwarder(dest, journal_path, stages):
+    """A QRadarLogger sharing nothing mutable with the global one: own pool, stages and journal"""
+    journal = logging.getLogger("loadgen.journal")
+    journal.propagate = False
+    journal.setLevel(logging.INFO)
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    handlers = [CompressingRotatingFileHandler(journal_path), logging.StreamHandler()]
+    handlers[1].setLevel(logging.WARNING)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    forwarder = copy.copy(qradar_logger)
+    forwarder.pool = DestinationPool([dest])
+    forwarder.stages = []
+    forwarder.logger = attach_queued_handlers(journal, handlers)
+    if stages:
+        # Same order as the global instance; deferred output is bound to this copy
+        forwarder.add_stage(CorrelationEngine())
+        forwarder.add_stage(EventCoalescer())
+        forwarder.add_stage(IPEnricher(IP_ENRICHMENT_DB))
+        forwarder.add_stage(EventShaper(spill_file=None))
+    return forwarder
+
+
+def _close_forwarder(forwarder):
+    for stage in forwarder.stages:
+        if hasattr(stage, "stop"):
+            stage.stop()
+    forwarder.pool.close()
+    _queue.join()  # let queued journal records reach the file before it is closed
+    attach_queued_handlers(forwarder.logger, [])
+
+
+def _drain(sink, dest, timeout):
+    """Wait until the sink has everything the destination sent, or stops making progress"""
+    deadline = time.monotonic() + timeout
+    last, last_change = -1, time.monotonic()
+    while time.monotonic() < deadline:
+        received = sink.stats()["received"]
+        if received >= dest.sent_events:
+            break
+        if received != last:
+            last, last_change = received, time.monotonic()
+        elif time.monotonic() - last_change > 2.0:
+            break
+        time.sleep(0.1)
+    return sink.stats()
+
+
+def run(protocol="tcp", eps=20000, duration=10.0, threads=1, batch=1, mix=DEFAULT_MIX,
+        stages=True, seed=None, drain=30.0) -> dict:
+    """Generate a mix against a fresh sink and return generator, forwarder and sink figures"""
+    with tempfile.TemporaryDirectory() as tmp:
+        ca_file = cert_file = key_file = None
+        if protocol == "tls":
+            from .bench_transport import write_certificates
+            ca_file, cert_file, key_file = write_certificates(tmp)
+        sink = SinkProcess(protocol, cert_file=cert_file, key_file=key_file)
+        dest = _destination(protocol, sink.port, ca_file)
+        forwarder = _forwarder(dest, os.path.join(tmp, "qradar_events.log"), stages)
+        try:
+            mix = parse_mix(mix)
+            seed = random.randrange(1 << 30) if seed is None else seed
+            generators = [Generator(i, Scenarios(mix, seed=seed + i), eps / threads, duration, batch, forwarder)
+                          for i in range(threads)]
+            for g in generators:
+                g.start()
+            for g in generators:
+                g.join()
+            received = _drain(sink, dest, drain)
+        finally:
+            _close_forwarder(forwarder)
+            sink.stop()
+
+    generated = sum(g.generated for g in generators)
+    elapsed = max(g.elapsed for g in generators)
+    per_stream = received.pop("per_stream_unique")
+    return {
+        "generator": {
+            "protocol": protocol,
+            "target_eps": eps,
+            "threads": threads,
+            "batch": batch,
+            "stages": stages,
+            "generated": generated,
+            "generated_eps": round(generated / elapsed) if elapsed else None,
+            "failed_sends": sum(g.failed_sends for g in generators),
+        },
+        "forwarder": {
+            "sent_events": dest.sent_events,
+            "absorbed_by_stages": generated - dest.sent_events,
+            "send_errors": dest.send_errors,
+            "avg_send_ms": dest.stats()["avg_send_ms"],
+        },
+        "sink": dict(received, lost=max(dest.sent_events - received["received"], 0),
+                     marked_not_received=sum(g.generated - per_stream.get(g.stream, 0) for g in generators)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic security events against a local syslog sink")
+    parser.add_argument("--protocol", choices=("tcp", "udp", "tls"), default="tcp")
+    parser.add_argument("--eps", type=float, default=20000, help="target events/sec across threads (0 = unthrottled)")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of generation")
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--batch", type=int, default=1, help="events per send_batch call (1 = per-event API)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="scenario weights, e.g. normal=70,spray=30")
+    parser.add_argument("--no-stages", action="store_true", help="bypass the pipeline stages")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = run(args.protocol, args.eps, args.duration, args.threads, args.batch, args.mix,
+                 not args.no_stages, args.seed)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for section, values in report.items():
+            print(section)
+            for key, value in values.items():
+                print(f"  {key:<20} {value}")
+        sink = report["sink"]
+        mark = "✓" if not sink["lost"] else "✗"
+        print(f"{mark} {report['forwarder']['sent_events']} forwarded, {sink['received']} received, "
+              f"{sink['lost']} lost, {sink['out_of_order']} out of order, "
+              f"{sink['sustained_eps']} EPS sustained at the sink")
@@ -0,0 +1,192 @@
+"""
+Lockout tracking - failed-login counts and account locks, kept out of the users table.
+
+Each failed password is one atomic upsert on login_failures, so concurrent failures for an
+account never lose an increment and never touch the users row. The count decays as a leaky
+bucket: it drains at LOCKOUT_MAX_ATTEMPTS per LOCKOUT_WINDOW_SECONDS. Failures spread thinly
+over time therefore never lock an account, while LOCKOUT_MAX_ATTEMPTS failures in quick
+succession do, for LOCKOUT_DURATION_SECONDS. The decay, the increment and the lock decision
+all happen in one statement:
+    attempts     = max(attempts - elapsed * leak, 0) + 1
+    locked_until = now + duration   if that exceeds LOCKOUT_MAX_ATTEMPTS - 1 and no lock is running
+(the "- 1" absorbs the little decay between failures made in quick succession).
+Times are stored as epoch seconds so the arithmetic is portable. A successful login deletes
+the row.
+
+    python -m app.lockout --list
+    python -m app.lockout --unlock alice
+    python -m app.lockout --bench --threads 16      # concurrent failures against one account
+"""
+import argparse
+import os
+import time
+from datetime import datetime
+from typing import Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import and_, bindparam, case, delete, func, or_, select
+
+from .models import LoginFailure
+
+load_dotenv()
+
+LOCKOUT_MAX_ATTEMPTS = int(os.getenv("LOCKOUT_MAX_ATTEMPTS", "5"))
+LOCKOUT_WINDOW_SECONDS = float(os.getenv("LOCKOUT_WINDOW_SECONDS", "900"))  # time for a full count to drain
+LOCKOUT_DURATION_SECONDS = float(os.getenv("LOCKOUT_DURATION_SECONDS", "900"))
+
+_TABLE = LoginFailure.__table__
+
+
+def _upsert(dialect: str):
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        raise NotImplementedError(f"lockout tracking needs an upsert; {dialect} is not supported")
+    return dialect_insert(_TABLE)
+
+
+class LockoutTracker:
+    """Failed-login counters with time decay and locks, one statement per failure"""
+
+    def __init__(self, max_attempts: int = LOCKOUT_MAX_ATTEMPTS, window: float = LOCKOUT_WINDOW_SECONDS,
+                 duration: float = LOCKOUT_DURATION_SECONDS):
+        self.max_attempts = max_attempts
+        self.window = window
+        self.duration = duration
+        self.leak = max_attempts / window if window > 0 else 0.0  # attempts drained per second
+        self._statements = {}
+        self.failures = 0
+        self.locks = 0
+
+    def _failure_statement(self, dialect: str):
+        """Compiled once per dialect; bound with username and now"""
+        statement = self._statements.get(dialect)
+        if statement is None:
+            stmt = _upsert(dialect)
+            now = bindparam("now")
+            excluded = stmt.excluded
+            greatest = func.greatest if dialect == "postgresql" else func.max  # two-argument max
+            decayed = greatest(_TABLE.c.attempts - (excluded.updated_at - _TABLE.c.updated_at) * self.leak, 0) + 1
+            statement = stmt.values(
+                username=bindparam("username"), attempts=1, updated_at=now,
+                locked_until=now + self.duration if self.max_attempts <= 1 else None,
+            ).on_conflict_do_update(
+                index_elements=[_TABLE.c.username],
+                set_={
+                    "attempts": decayed,
+                    "updated_at": excluded.updated_at,
+                    # A running lock is neither extended nor re-announced by racing failures
+                    "locked_until": case(
+                        (and_(decayed > self.max_attempts - 1,
+                              or_(_TABLE.c.locked_until.is_(None), _TABLE.c.locked_until <= excluded.updated_at)),
+                         excluded.updated_at + self.duration),
+                        else_=_TABLE.c.locked_until,
+                    ),
+                },
+            ).returning(_TABLE.c.attempts, _TABLE.c.locked_until)
+            self._statements[dialect] = statement
+        return statement
+
+    def record_failure(self, db, username: str, now: float = None) -> dict:
+        """Count one failed password; returns attempts, locked_until and whether this failure locked"""
+        now = time.time() if now is None else now
+        statement = self._failure_statement(db.get_bind().dialect.name)
+        attempts, locked_until = db.execute(statement, {"username": username, "now": now}).one()
+        db.commit()
+        # locked_until equals now + duration only when this very statement set it
+        newly_locked = locked_until is not None and abs(locked_until - (now + self.duration)) < 1e-6
+        self.failures += 1
+        self.locks += newly_locked
+        return {
+            "attempts": round(attempts, 2),
+            "locked_until": datetime.utcfromtimestamp(locked_until) if locked_until and locked_until > now else None,
+            "newly_locked": newly_locked,
+        }
+
+    def locked_until(self, db, username: str, now: float = None) -> Optional[datetime]:
+        """End of the account's current lock, or None when it is not locked"""
+        now = time.time() if now is None else now
+        locked_until = db.execute(
+            select(_TABLE.c.locked_until).where(_TABLE.c.username == username)
+        ).scalar()
+        return datetime.utcfromtimestamp(locked_until) if locked_until and locked_until > now else None
+
+    def reset(self, db, username: str):
+        """Forget failures after a successful login (the caller commits)"""
+        db.execute(delete(_TABLE).where(_TABLE.c.username == username))
+
+    def stats(self) -> dict:
+        return {
+            "failures_recorded": self.failures,
+            "locks": self.locks,
+            "max_attempts": self.max_attempts,
+            "window_seconds": self.window,
+            "lock_seconds": self.duration,
+        }
+
+
+# Global instance
+lockout_tracker = LockoutTracker()
+
+
+if __name__ == "__main__":
+    from .db import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Inspect failed-login counters and account locks")
+    parser.add_argument("--list", action="store_true", help="accounts with recent failures")
+    parser.add_argument("--unlock", metavar="USERNAME", help="clear an account's failures and lock")
+    parser.add_argument("--bench", action="store_true", help="concurrent failures against one account")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--failures", type=int, default=50, help="failures per thread")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.unlock:
+            lockout_tracker.reset(db, args.unlock)
+            db.commit()
+            print(f"✓ Unlocked {args.unlock}")
+        elif args.list:
+            now = time.time()
+            rows = db.execute(select(_TABLE).order_by(_TABLE.c.updated_at.desc()).limit(100)).all()
+            for row in rows:
+                current = max(row.attempts - (now - row.updated_at) * lockout_tracker.leak, 0)
+                state = f"locked until {datetime.utcfromtimestamp(row.locked_until):%Y-%m-%d %H:%M:%S}" \
+                    if row.locked_until and row.locked_until > now else ""
+                print(f"  {row.username:<30} {current:5.2f} attempts {state}")
+        elif args.bench:
+            import threading
+
+            username = "lockout-bench"
+            tracker = LockoutTracker(max_attempts=10 ** 9, window=0)  # no decay, no lock: count only
+            lockout_tracker.reset(db, username)
+            db.commit()
+
+            def hammer():
+                session = SessionLocal()
+                try:
+                    for _ in range(args.failures):
+                        tracker.record_failure(session, username)
+                finally:
+                    session.close()
+
+            threads = [threading.Thread(target=hammer) for _ in range(args.threads)]
+            start = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - start
+            counted = db.execute(select(_TABLE.c.attempts).where(_TABLE.c.username == username)).scalar()
+            expected = args.threads * args.failures
+            mark = "✓" if round(counted) == expected else "✗"
+            print(f"{mark} {expected} concurrent failures counted as {counted:.0f} in {elapsed:.2f}s "
+                  f"({expected / elapsed:.0f}/s)")
+            lockout_tracker.reset(db, username)
+            db.commit()
+        else:
+            parser.print_help()
+    finally:
+        db.close()
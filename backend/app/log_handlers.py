@@ -0,0 +1,176 @@
+"""
+Non-blocking logging - one background writer for every application logger.
+Loggers get a QueueHandler, so logger.info() on the request path only enqueues the record.
+A single QueueListener thread dispatches records to each logger's real handlers (files,
+console, syslog). File handlers rotate by size and by age, and rotated files are gzipped on
+a separate thread so compression never stalls the writer.
+"""
+import atexit
+import gzip
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_ROTATE_SECONDS = float(os.getenv("LOG_ROTATE_SECONDS", "86400"))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "7"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "100000"))
+
+
+class CompressingRotatingFileHandler(RotatingFileHandler):
+    """Rotates when the file exceeds max_bytes or is older than rotate_seconds; backups are gzipped
+    in the background (app.log.1.gz, app.log.2.gz, ...)"""
+
+    def __init__(self, filename, max_bytes=LOG_MAX_BYTES, rotate_seconds=LOG_ROTATE_SECONDS,
+                 backup_count=LOG_BACKUP_COUNT, encoding="utf-8"):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding=encoding, delay=True)
+        self.rotate_seconds = rotate_seconds
+        self.rollover_at = time.time() + rotate_seconds if rotate_seconds > 0 else None
+        self.namer = lambda name: name + ".gz"
+        self.rotator = self._rotate_compressed
+        self._compressor = None
+
+    def shouldRollover(self, record):
+        if self.rollover_at is not None and time.time() >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        # Finish the previous compression first so backup shifting never races it
+        if self._compressor is not None:
+            self._compressor.join()
+        super().doRollover()
+        if self.rotate_seconds > 0:
+            self.rollover_at = time.time() + self.rotate_seconds
+
+    def _rotate_compressed(self, source, dest):
+        if not os.path.exists(source):
+            return
+        pending = f"{source}.rotating"
+        os.replace(source, pending)
+        self._compressor = threading.Thread(
+            target=self._compress, args=(pending, dest), name="log-compress", daemon=True
+        )
+        self._compressor.start()
+
+    @staticmethod
+    def _compress(source, dest):
+        try:
+            with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+                shutil.copyfileobj(f_in, f_out)
+            os.remove(source)
+        except OSError:
+            pass
+
+
+class _DispatchHandler(logging.Handler):
+    """Routes dequeued records to the handlers registered for their logger or its nearest ancestor"""
+
+    def __init__(self):
+        super().__init__()
+        self.routes = {}
+        self._reported = {}
+        self._reported_total = 0
+
+    def _handlers(self, name):
+        while name:
+            handlers = self.routes.get(name)
+            if handlers is not None:
+                return handlers
+            name = name.rpartition(".")[0]
+        return ()
+
+    def handle(self, record):
+        if _NonBlockingQueueHandler.dropped != self._reported_total:
+            self.report_dropped()
+        for handler in self._handlers(record.name):
+            if record.levelno >= handler.level:
+                handler.handle(record)
+        return True
+
+    def report_dropped(self):
+        """Write a warning to each logger's own handlers for the records it shed since the last one"""
+        with _dropped_lock:
+            counts = dict(_dropped)
+            self._reported_total = _NonBlockingQueueHandler.dropped
+        for name, count in counts.items():
+            missing = count - self._reported.get(name, 0)
+            if missing <= 0:
+                continue
+            self._reported[name] = count
+            warning = logging.LogRecord(
+                name, logging.WARNING, __file__, 0,
+                "%d log record(s) dropped because the log queue was full", (missing,), None
+            )
+            for handler in self._handlers(name):
+                handler.handle(warning)
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks the caller: a full queue sheds the record and counts it"""
+
+    dropped = 0
+
+    def __init__(self, log_queue, name):
+        super().__init__(log_queue)
+        self.logger_name = name
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with _dropped_lock:
+                _dropped[self.logger_name] = _dropped.get(self.logger_name, 0) + 1
+                _NonBlockingQueueHandler.dropped += 1
+
+
+_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+_dropped = {}  # logger name -> records shed on a full queue
+_dropped_lock = threading.Lock()
+_dispatch = _DispatchHandler()
+_listener = QueueListener(_queue, _dispatch, respect_handler_level=False)
+_listener.start()
+_lock = threading.Lock()
+
+
+def attach_queued_handlers(logger: logging.Logger, handlers):
+    """Replace logger's handlers with a queue handler; handlers run on the background writer.
+    Records from child loggers (logger.name + ".x") that propagate here use the same handlers."""
+    with _lock:
+        for old in _dispatch.routes.get(logger.name, ()):
+            old.close()
+        _dispatch.routes[logger.name] = list(handlers)
+        for h in list(logger.handlers):
+            if isinstance(h, QueueHandler):
+                logger.removeHandler(h)
+        logger.addHandler(_NonBlockingQueueHandler(_queue, logger.name))
+    return logger
+
+
+def dropped_records(name=None):
+    """Records shed because the queue was full, for one logger or {logger name: count}"""
+    with _dropped_lock:
+        return _dropped.get(name, 0) if name is not None else dict(_dropped)
+
+
+def stop_listener():
+    """Flush queued records and stop the writer (registered with atexit)"""
+    try:
+        _listener.stop()
+    except Exception:
+        pass
+    _dispatch.report_dropped()
+    for handlers in _dispatch.routes.values():
+        for h in handlers:
+            h.close()
+
+
+atexit.register(stop_listener)
@@ -1,12 +1,16 @@
 """
 Application logger configuration - logs to file and console.
 Uses syslog forwarding to QRadar if QRADAR_HOST is configured.
+All handlers run on the shared background writer (see log_handlers); the log file
+rotates by size and age with gzip-compressed backups.
 """
 import logging
 import os
 from logging.handlers import SysLogHandler
 from pathlib import Path
 
+from .log_handlers import attach_queued_handlers, CompressingRotatingFileHandler
+
 # Log file path - use writable directory
 log_dir = Path.home() / '.qradar_logs'
 log_dir.mkdir(exist_ok=True)
@@ -17,13 +21,14 @@ QRADAR_PORT = int(os.getenv("QRADAR_PORT", "514"))
 
 logger = logging.getLogger("secure_app")
 logger.setLevel(logging.INFO)
+handlers = []
 
 # File handler
 try:
-    fh = logging.FileHandler(LOG_FILE)
+    fh = CompressingRotatingFileHandler(LOG_FILE)
     fh.setLevel(logging.INFO)
     fh.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
-    logger.addHandler(fh)
+    handlers.append(fh)
 except Exception as e:
     print(f"Warning: Could not create file logger: {e}")
 
@@ -31,13 +36,16 @@ except Exception as e:
 ch = logging.StreamHandler()
 ch.setLevel(logging.INFO)
 ch.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
-logger.addHandler(ch)
+handlers.append(ch)
 
 # Syslog Handler to forward to QRadar if QRADAR_HOST provided
 if QRADAR_HOST:
     try:
         sh = SysLogHandler(address=(QRADAR_HOST, QRADAR_PORT))
         sh.setFormatter(logging.Formatter("%(asctime)s secure_app: %(levelname)s %(message)s"))
-        logger.addHandler(sh)
+        handlers.append(sh)
     except Exception as e:
-        logger.warning(f"Could not create SysLogHandler: {e}")
+        print(f"Warning: Could not create SysLogHandler: {e}")
+
+# Request threads only enqueue; the background writer does the blocking I/O
+attach_queued_handlers(logger, handlers)
@@ -6,17 +6,24 @@ Endpoints:
   GET /users/me - Get current user profile
   PUT /users/me - Update user profile
   GET /admin/users - List all users (admin only)
-  GET /admin/logs - View activity logs (admin only)
+  GET /admin/logs - View activity logs, with optional q/action/user/ip/since/until filters (admin only)
+  GET /admin/logs/stream - Live activity logs as server-sent events (admin only)
+  GET /admin/forwarder/stats - QRadar forwarding metrics (admin only)
+  GET /admin/db/replicas - Read replica health and routing counters (admin only)
+  GET /admin/audit/proof/<log_id> - Merkle inclusion proof for one activity log (admin only)
+  POST /events/bulk - Ingest an NDJSON batch of external events (API key or admin)
+  GET /.well-known/jwks.json - Public keys for verifying ES256/EdDSA tokens
   GET /health - Health check
 """
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from datetime import datetime
 from sqlalchemy.exc import IntegrityError
+import hmac
 import os
 from dotenv import load_dotenv
 
-from .db import SessionLocal, engine, Base
+from .db import SessionLocal, engine
 from .models import User, ActivityLog
 from .auth import (
     authenticate_user, get_current_user, is_admin,
@@ -24,11 +31,38 @@ from .auth import (
 )
 from .qradar_logger import qradar_logger
 from .logger_conf import logger
+from .http_cache import (
+    response_cache, register_invalidation, conditional_response, dump_json, make_etag
+)
+from .broadcast import (
+    log_broadcaster, register_stream_source, format_sse, log_record,
+    STREAM_HEARTBEAT_SECONDS, STREAM_REPLAY_SIZE
+)
+from .replicas import read_session, replica_router
+from .migrations import migrate
+from .breached import breached_passwords
+from .jwt_keys import key_set, JWKS_MAX_AGE
+from .audit import audit_sealer, inclusion_proof
+from .search import ensure_search_index, filter_logs, SearchTimeout
+from .ingest import (
+    parse_ndjson, store_events, to_qradar_event,
+    INGEST_API_KEY, INGEST_MAX_EVENTS, INGEST_MAX_ERRORS_REPORTED
+)
+from .capture import request_capture, register_capture
 
 load_dotenv()
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Create database tables, or upgrade an existing database
+migrate(engine)
+ensure_search_index(engine)
+key_set.require_signing_key()
+# Seal new activity logs into signed Merkle batches in the background
+audit_sealer.start()
+
+# Drop cached admin responses whenever a change to users or activity logs commits
+register_invalidation(SessionLocal, (User, ActivityLog), response_cache)
+# Publish committed activity logs to live stream subscribers
+register_stream_source(SessionLocal, ActivityLog, User, log_broadcaster)
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -39,8 +73,13 @@ CORS(app, resources={
     r"/auth/*": {"origins": "http://localhost:8080"},
     r"/users/*": {"origins": "http://localhost:8080"},
     r"/admin/*": {"origins": "http://localhost:8080"},
-    r"/health": {"origins": "*"}
+    r"/health": {"origins": "*"},
+    r"/.well-known/*": {"origins": "*"}
 })
+# Sample requests to CAPTURE_FILE for replay against test instances (off unless CAPTURE_SAMPLE_RATE > 0)
+register_capture(app, request_capture)
+
+BREACHED_PASSWORD_DETAIL = "This password appears in a known data breach; choose a different one"
 
 # ==================== HELPER FUNCTIONS ====================
 
@@ -48,6 +87,9 @@ def get_token_from_header():
     """Extract JWT token from Authorization header"""
     auth_header = request.headers.get('Authorization', '')
     if not auth_header.startswith('Bearer '):
+        # EventSource cannot set headers, so event streams may pass the token as a query param
+        if request.accept_mimetypes.best == 'text/event-stream':
+            return request.args.get('access_token')
         return None
     return auth_header[7:]  # Remove 'Bearer ' prefix
 
@@ -95,6 +137,18 @@ def require_admin(f):
     decorated.__name__ = f.__name__
     return decorated
 
+def require_ingest_auth(f):
+    """Decorator to accept either the ingestion API key or an admin JWT"""
+    def decorated(*args, **kwargs):
+        api_key = request.headers.get('X-API-Key')
+        if INGEST_API_KEY and api_key and hmac.compare_digest(api_key, INGEST_API_KEY):
+            request.current_user = None
+            return f(*args, **kwargs)
+        return require_admin(f)(*args, **kwargs)
+    
+    decorated.__name__ = f.__name__
+    return decorated
+
 # ==================== ROUTES ====================
 
 @app.post('/auth/signup')
@@ -115,6 +169,9 @@ def signup():
         if db.query(User).filter(User.email == data['email']).first():
             return jsonify({"detail": "Email already exists"}), 400
         
+        if breached_passwords.is_breached(data['password']):
+            return jsonify({"detail": BREACHED_PASSWORD_DETAIL}), 400
+        
         # Create user
         user = User(
             username=data['username'],
@@ -184,7 +241,7 @@ def login():
 def get_profile():
     """Get current user profile"""
     user = request.current_user
-    return jsonify({
+    body = dump_json({
         "id": user.id,
         "username": user.username,
         "email": user.email,
@@ -192,7 +249,10 @@ def get_profile():
         "role": user.role,
         "is_active": user.is_active,
         "last_login": user.last_login.isoformat() if user.last_login else None
-    }), 200
+    })
+    # updated_at has one-second resolution, so the body itself is folded into the validator
+    etag = make_etag(user.id, user.updated_at, body)
+    return conditional_response(body, etag, user.updated_at or user.created_at)
 
 @app.put('/users/me')
 @require_auth
@@ -211,6 +271,8 @@ def update_profile():
         
         # Handle password change
         if data.get('new_password') and data.get('current_password'):
+            if breached_passwords.is_breached(data['new_password']):
+                return jsonify({"detail": BREACHED_PASSWORD_DETAIL}), 400
             if not user.check_password(data['current_password']):
                 return jsonify({"detail": "Incorrect password"}), 400
             user.set_password(data['new_password'])
@@ -243,10 +305,14 @@ def update_profile():
 @require_admin
 def list_users():
     """List all users (admin only)"""
-    db = SessionLocal()
+    cached = response_cache.get('admin_users')
+    if cached:
+        return conditional_response(cached.body, cached.etag, cached.last_modified)
+    
+    db = read_session(request.current_user.id)
     try:
         users = db.query(User).all()
-        return jsonify([{
+        body = dump_json([{
             "id": u.id,
             "username": u.username,
             "email": u.email,
@@ -254,7 +320,12 @@ def list_users():
             "role": u.role,
             "is_active": u.is_active,
             "last_login": u.last_login.isoformat() if u.last_login else None
-        } for u in users]), 200
+        } for u in users])
+        stamps = [u.updated_at or u.created_at for u in users if u.updated_at or u.created_at]
+        last_modified = max(stamps) if stamps else None
+        etag = make_etag(len(users), last_modified, body)
+        cached = response_cache.set('admin_users', body, etag, last_modified, ['users'])
+        return conditional_response(cached.body, cached.etag, cached.last_modified)
         
     finally:
         db.close()
@@ -262,11 +333,38 @@ def list_users():
 @app.get('/admin/logs')
 @require_admin
 def get_logs():
-    """Get activity logs (admin only)"""
-    db = SessionLocal()
+    """Get activity logs, optionally filtered by search text, action and time (admin only)"""
+    cache_key = 'admin_logs?' + request.query_string.decode('utf-8')
+    cached = response_cache.get(cache_key)
+    if cached:
+        return conditional_response(cached.body, cached.etag, cached.last_modified)
+    
+    try:
+        since = datetime.fromisoformat(request.args['since']) if request.args.get('since') else None
+        until = datetime.fromisoformat(request.args['until']) if request.args.get('until') else None
+        limit = int(request.args.get('limit', 500))
+        if limit < 1:
+            raise ValueError("limit must be at least 1")  # LIMIT -1 would be unbounded
+        limit = min(limit, 500)
+    except ValueError:
+        return jsonify({"detail": "Invalid since/until (ISO-8601) or limit"}), 400
+    
+    db = read_session(request.current_user.id)
     try:
-        logs = db.query(ActivityLog).order_by(ActivityLog.timestamp.desc()).limit(500).all()
-        return jsonify([{
+        try:
+            logs = filter_logs(
+                db,
+                q=request.args.get('q'),
+                action=request.args.get('action'),
+                username=request.args.get('user'),
+                ip_address=request.args.get('ip'),
+                since=since,
+                until=until,
+                limit=limit
+            )
+        except SearchTimeout as e:
+            return jsonify({"detail": f"Search timed out ({e}); narrow the time range"}), 503
+        body = dump_json([{
             "id": l.id,
             "user_id": l.user_id,
             "username": l.user.username if l.user else None,
@@ -275,11 +373,143 @@ def get_logs():
             "ip_address": l.ip_address,
             "status": l.status,
             "details": l.details
-        } for l in logs]), 200
+        } for l in logs])
+        # Logs are append-only, so the newest id identifies the list
+        max_id = max((l.id for l in logs), default=0)
+        last_modified = max((l.timestamp for l in logs), default=None)
+        etag = make_etag(max_id, len(logs), body)
+        cached = response_cache.set(cache_key, body, etag, last_modified, ['activity_logs', 'users'])
+        return conditional_response(cached.body, cached.etag, cached.last_modified)
         
     finally:
         db.close()
 
+@app.get('/admin/logs/stream')
+@require_admin
+def stream_logs():
+    """Stream new activity logs as server-sent events (admin only)"""
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        return jsonify({"detail": "Invalid Last-Event-ID"}), 400
+    
+    sub, backlog, complete = log_broadcaster.subscribe(last_id)
+    if not complete:
+        # Client fell further behind than the replay ring; catch up from the primary, since a
+        # lagging replica could leave a gap before the ring
+        db = SessionLocal()
+        try:
+            missed = db.query(ActivityLog).filter(ActivityLog.id > last_id)\
+                .order_by(ActivityLog.id).limit(STREAM_REPLAY_SIZE).all()
+            caught_up = [log_record(l.id, l.user_id, l.user.username if l.user else None, l.timestamp,
+                                    l.action, l.ip_address, l.status, l.details) for l in missed]
+        finally:
+            db.close()
+        seen = {r["id"] for r in caught_up}
+        backlog = caught_up + [r for r in backlog if r["id"] not in seen]
+    
+    def generate():
+        sent = {r["id"] for r in backlog}
+        try:
+            yield "retry: 3000\n\n"
+            for record in backlog:
+                yield format_sse(record)
+            while True:
+                record = sub.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                if record is None:
+                    if sub.dropped:
+                        # Too slow to keep up; the client reconnects with Last-Event-ID
+                        yield "event: overflow\ndata: {}\n\n"
+                        return
+                    yield ": keep-alive\n\n"
+                elif record["id"] not in sent:
+                    yield format_sse(record)
+        finally:
+            log_broadcaster.unsubscribe(sub)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.get('/admin/forwarder/stats')
+@require_admin
+def forwarder_stats():
+    """QRadar forwarding metrics per collector (admin only)"""
+    return jsonify(qradar_logger.stats()), 200
+
+@app.get('/admin/db/replicas')
+@require_admin
+def replica_stats():
+    """Read replica health and routing counters (admin only)"""
+    return jsonify(replica_router.stats()), 200
+
+@app.get('/admin/audit/proof/<int:log_id>')
+@require_admin
+def audit_proof(log_id):
+    """Inclusion proof of one activity log in its signed batch (admin only)"""
+    db = SessionLocal()
+    try:
+        proof = inclusion_proof(db, log_id)
+        if proof is None:
+            return jsonify({"detail": "Log entry is not sealed yet"}), 404
+        return jsonify(proof), 200
+    finally:
+        db.close()
+
+@app.post('/events/bulk')
+@require_ingest_auth
+def ingest_events():
+    """Ingest a batch of NDJSON events, store them and forward them to QRadar"""
+    body = request.get_data(cache=False)
+    if not body:
+        return jsonify({"detail": "Empty request body"}), 400
+    
+    events, errors = parse_ndjson(body)
+    if len(events) + len(errors) > INGEST_MAX_EVENTS:
+        return jsonify({"detail": f"Batch exceeds {INGEST_MAX_EVENTS} events"}), 413
+    
+    db = SessionLocal()
+    try:
+        rows = store_events(db, events)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Bulk ingest failed: {e}")
+        return jsonify({"detail": "Database error - batch not stored"}), 500
+    finally:
+        db.close()
+    
+    # Core executemany bypasses ORM events, so invalidate and publish explicitly
+    response_cache.invalidate('activity_logs')
+    log_broadcaster.publish([
+        log_record(r["id"], r["user_id"], e["username"], r["timestamp"], r["action"],
+                   r["ip_address"], r["status"], r["details"])
+        for r, e in zip(rows, events)
+    ])
+    forwarded = qradar_logger.send_batch([
+        (e["event_type"], to_qradar_event(e)) for e in events
+    ])
+    
+    logger.info(f"Bulk ingest: {len(rows)} accepted, {len(errors)} rejected")
+    return jsonify({
+        "accepted": len(rows),
+        "rejected": len(errors),
+        "forwarded": forwarded,
+        "errors": errors[:INGEST_MAX_ERRORS_REPORTED]
+    }), 200
+
+@app.get('/.well-known/jwks.json')
+def jwks():
+    """Public signing keys, so other services can verify tokens without calling back"""
+    body = dump_json(key_set.jwks())
+    response = Response(body, mimetype="application/json")
+    response.set_etag(make_etag(body))
+    # Public and cacheable: verifiers and proxies keep it for JWKS_MAX_AGE
+    response.cache_control.public = True
+    response.cache_control.max_age = JWKS_MAX_AGE
+    return response.make_conditional(request)
+
 @app.get('/health')
 def health_check():
     """Health check endpoint"""
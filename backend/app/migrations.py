@@ -0,0 +1,201 @@
+"""
+Schema migrations - versioned, transactional upgrades for existing databases.
+Applied versions are recorded in schema_migrations. Each pending migration runs in its own
+transaction (BEGIN IMMEDIATE on SQLite, so DDL is rolled back on failure and concurrent
+workers starting together apply each migration once). The app upgrades on startup; run
+manually with:
+    python -m app.migrations            # show applied and pending migrations
+    python -m app.migrations --upgrade  # apply pending migrations
+    python -m app.migrations --explain  # query plans for the main activity log queries
+
+New migrations are appended to MIGRATIONS with the next version number; models.py stays the
+source of truth for fresh databases, and migrations bring older databases up to it.
+"""
+import argparse
+import calendar
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event, text, Column, DateTime, Integer, MetaData, String, Table
+from sqlalchemy.pool import NullPool
+
+from .db import Base
+from .models import ActivityLog, AuditBatch, LoginFailure, User
+
+_meta = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _meta,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(100), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+    Column("duration_ms", Integer),
+)
+
+
+def _baseline(conn):
+    """Tables and indexes as declared in models.py"""
+    Base.metadata.create_all(bind=conn)
+
+
+def _activity_log_indexes(conn):
+    """Composite (column, timestamp) indexes for the user/action/IP time-range filters"""
+    for index in ActivityLog.__table__.indexes:
+        if len(index.columns) > 1:
+            index.create(bind=conn, checkfirst=True)
+
+
+def _audit_batches(conn):
+    """Merkle commitments for the tamper-evident activity log"""
+    AuditBatch.__table__.create(bind=conn, checkfirst=True)
+
+
+def _login_failures(conn):
+    """Move failed-login counts and active locks off the users table"""
+    LoginFailure.__table__.create(bind=conn, checkfirst=True)
+    now = datetime.utcnow()
+    rows = conn.execute(
+        User.__table__.select().where((User.login_attempts > 0) | (User.locked_until > now))
+    ).all()
+    if rows:
+        conn.execute(LoginFailure.__table__.insert(), [{
+            "username": row.username,
+            "attempts": float(row.login_attempts or 0),
+            "updated_at": time.time(),
+            "locked_until": calendar.timegm(row.locked_until.utctimetuple())
+            if row.locked_until and row.locked_until > now else None,
+        } for row in rows])
+
+
+# (version, name, upgrade(conn)) in order; never edit or renumber an applied migration
+MIGRATIONS = [
+    (1, "baseline schema", _baseline),
+    (2, "activity_logs composite indexes", _activity_log_indexes),
+    (3, "audit_batches", _audit_batches),
+    (4, "login_failures", _login_failures),
+]
+
+
+def _transactional(engine):
+    """Engine whose transactions cover DDL. pysqlite only opens a transaction before DML,
+    so SQLite migrations use a separate engine that issues BEGIN IMMEDIATE itself"""
+    if engine.dialect.name != "sqlite" or engine.url.database in (None, "", ":memory:"):
+        return engine
+    migration_engine = create_engine(engine.url, poolclass=NullPool)
+
+    @event.listens_for(migration_engine, "connect")
+    def _autocommit_driver(dbapi_conn, record):
+        dbapi_conn.isolation_level = None
+
+    @event.listens_for(migration_engine, "begin")
+    def _begin_immediate(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return migration_engine
+
+
+def applied_versions(conn) -> dict:
+    schema_migrations.create(bind=conn, checkfirst=True)
+    return {row.version: row for row in conn.execute(schema_migrations.select())}
+
+
+def pending(engine) -> list:
+    with engine.begin() as conn:
+        applied = applied_versions(conn)
+    return [m for m in MIGRATIONS if m[0] not in applied]
+
+
+def migrate(engine) -> list:
+    """Apply pending migrations, one transaction each; returns the versions applied"""
+    migration_engine = _transactional(engine)
+    done = []
+    try:
+        for version, name, upgrade in MIGRATIONS:
+            with migration_engine.begin() as conn:
+                # Re-read inside the transaction: another worker may have applied it meanwhile
+                if version in applied_versions(conn):
+                    continue
+                start = time.perf_counter()
+                upgrade(conn)
+                conn.execute(schema_migrations.insert().values(
+                    version=version, name=name, applied_at=datetime.utcnow(),
+                    duration_ms=int((time.perf_counter() - start) * 1000)
+                ))
+            done.append(version)
+    finally:
+        if migration_engine is not engine:
+            migration_engine.dispose()
+    return done
+
+
+# ==================== QUERY PLANS ====================
+
+def main_queries(db):
+    """The app's main activity log queries, as (name, statement, expected index) tuples"""
+    from .search import log_query
+
+    week_ago = datetime.utcnow() - timedelta(days=7)
+    return [
+        ("admin logs, newest first", log_query(db).limit(500), "ix_activity_logs_timestamp"),
+        ("admin logs by action", log_query(db, action="LOGIN_ATTEMPT", since=week_ago).limit(500),
+         "ix_activity_logs_action_timestamp"),
+        ("admin logs by user", log_query(db, username="admin", since=week_ago).limit(500),
+         "ix_activity_logs_user_id_timestamp"),
+        ("admin logs by IP", log_query(db, ip_address="10.0.0.5", since=week_ago).limit(500),
+         "ix_activity_logs_ip_address_timestamp"),
+        ("login lookup", db.query(User).filter(User.username == "admin").limit(1), "ix_users_username"),
+    ]
+
+
+def explain(db, statement) -> list:
+    """Query plan lines for a Query or select() on the session's database"""
+    statement = getattr(statement, "statement", statement)
+    conn = db.connection()
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True})
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    rows = conn.exec_driver_sql(prefix + str(compiled)).all()
+    # SQLite returns (id, parent, notused, detail); other databases one text column
+    return [row[-1] for row in rows]
+
+
+def explain_report(db) -> list:
+    """Plan every main query and check that it uses its expected index"""
+    report = []
+    for name, statement, index in main_queries(db):
+        plan = explain(db, statement)
+        report.append({
+            "query": name,
+            "expected_index": index,
+            "uses_index": any(index in line for line in plan),
+            "plan": plan,
+        })
+    return report
+
+
+if __name__ == "__main__":
+    from .db import engine, SessionLocal
+
+    parser = argparse.ArgumentParser(description="Apply and inspect schema migrations")
+    parser.add_argument("--upgrade", action="store_true", help="apply pending migrations")
+    parser.add_argument("--explain", action="store_true", help="show query plans for the main queries")
+    args = parser.parse_args()
+
+    if args.upgrade:
+        applied = migrate(engine)
+        print(f"✓ Applied {len(applied)} migration(s)" + (f": {applied}" if applied else ""))
+    elif args.explain:
+        db = SessionLocal()
+        try:
+            for entry in explain_report(db):
+                mark = "✓" if entry["uses_index"] else "✗"
+                print(f"{mark} {entry['query']} (expects {entry['expected_index']})")
+                for line in entry["plan"]:
+                    print(f"    {line}")
+        finally:
+            db.close()
+    else:
+        with engine.begin() as conn:
+            applied = applied_versions(conn)
+        for version, name, _ in MIGRATIONS:
+            row = applied.get(version)
+            state = f"applied {row.applied_at:%Y-%m-%d %H:%M:%S} ({row.duration_ms} ms)" if row else "pending"
+            print(f"  {version:>3}  {name:<40} {state}")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Text, Index, LargeBinary, Float
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .db import Base
@@ -19,6 +19,7 @@ class User(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     last_login = Column(DateTime(timezone=True))
+    # Superseded by login_failures (lockout.py); kept for existing databases
     login_attempts = Column(Integer, default=0)
     locked_until = Column(DateTime(timezone=True))
     
@@ -46,6 +47,14 @@ class User(Base):
 
 class ActivityLog(Base):
     __tablename__ = "activity_logs"
+    # Fetch the server-side timestamp with the INSERT so live streams can publish it
+    __mapper_args__ = {"eager_defaults": True}
+    # Filters are by user, action or IP over a time range (added to existing databases by migration 2)
+    __table_args__ = (
+        Index("ix_activity_logs_user_id_timestamp", "user_id", "timestamp"),
+        Index("ix_activity_logs_action_timestamp", "action", "timestamp"),
+        Index("ix_activity_logs_ip_address_timestamp", "ip_address", "timestamp"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -84,3 +93,28 @@ class ActivityLog(Base):
         db.add(log)
         db.commit()
         return log
+
+class LoginFailure(Base):
+    """Decaying failed-login count and lock per account; written with one upsert per failure"""
+    __tablename__ = "login_failures"
+    
+    username = Column(String(50), primary_key=True)
+    attempts = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False)  # epoch seconds
+    locked_until = Column(Float)  # epoch seconds
+
+class AuditBatch(Base):
+    """Signed Merkle commitment over a contiguous id range of activity_logs (see audit.py)"""
+    __tablename__ = "audit_batches"
+    
+    id = Column(Integer, primary_key=True)
+    first_log_id = Column(Integer, nullable=False, unique=True)
+    last_log_id = Column(Integer, nullable=False, index=True)
+    leaf_count = Column(Integer, nullable=False)
+    root = Column(String(64), nullable=False)
+    commitment = Column(String(64), nullable=False)  # hash chaining this batch to the previous one
+    signature = Column(String(128), nullable=False)
+    key_id = Column(String(32), nullable=False)
+    nodes = Column(LargeBinary, nullable=False)  # every tree level, leaves first, 32 bytes per node
+    log_ids = Column(LargeBinary, nullable=False)  # sorted uint64 ids of the sealed rows
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
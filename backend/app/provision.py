@@ -0,0 +1,364 @@
+"""
+Bulk user provisioning - creates and updates accounts from HR exports.
+Input is CSV with a header row, or NDJSON with one object per line, using the columns:
+    username, email, password, full_name, role, is_active
+hashed_password may be given instead of password for accounts that already have a bcrypt hash.
+
+Usage:
+    python -m app.provision users.csv
+    python -m app.provision users.ndjson --dry-run
+    python -m app.provision users.csv --skip-existing --workers 8 --report conflicts.csv
+
+Existing usernames are updated (or left alone with --skip-existing); an update only changes the
+columns a row gives, so blank or missing full_name, role, is_active and password cells keep the
+account's current values, while new accounts default to role "user" and active. Rows whose username or
+email repeats an earlier row, or whose email belongs to a different account, are reported as
+conflicts and not written. Passwords are bcrypt-hashed across a process pool while the main
+process writes finished rows in batched transactions, one transaction per --batch-size rows.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+
+import bcrypt
+from pydantic import EmailStr, TypeAdapter, ValidationError
+from sqlalchemy import bindparam, insert, select, update
+from dotenv import load_dotenv
+
+from .models import User
+
+load_dotenv()
+
+BCRYPT_ROUNDS = 12  # same cost as signup
+PROVISION_BATCH_SIZE = 1000
+HASH_CHUNK = 16  # passwords per task sent to a worker
+LOOKUP_CHUNK = 500  # SQLite caps bound parameters per query
+MAX_CONFLICTS_PRINTED = 20
+
+ROLES = frozenset(("user", "admin"))
+FIELDS = frozenset(("username", "email", "password", "hashed_password", "full_name", "role", "is_active"))
+_TRUE = frozenset(("1", "true", "yes", "y", "t"))
+_FALSE = frozenset(("0", "false", "no", "n", "f"))
+_email = TypeAdapter(EmailStr)
+CREATE_DEFAULTS = {"full_name": None, "role": "user", "is_active": True}  # optional columns, applied to new accounts only
+
+
+class ProvisionError(ValueError):
+    """Raised when an input row cannot be provisioned"""
+
+
+def read_rows(path: str, fmt: str = None):
+    """Yield (line number, row dict) from a CSV or NDJSON file"""
+    fmt = fmt or ("ndjson" if path.endswith((".ndjson", ".jsonl", ".json")) else "csv")
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if fmt == "csv":
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for lineno, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield lineno, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield lineno, ProvisionError(f"invalid JSON: {e.msg}")
+
+
+def _text(row, field, max_length, required=False):
+    value = row.get(field)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        if required:
+            raise ProvisionError(f"{field} is required")
+        return None
+    if not isinstance(value, str):
+        raise ProvisionError(f"{field} must be a string")
+    value = value.strip()
+    if max_length and len(value) > max_length:
+        raise ProvisionError(f"{field} must be at most {max_length} characters")
+    return value
+
+
+def _flag(value):
+    """True/False, or None when the cell is missing or blank"""
+    if value is None or isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if not text:
+        return None
+    if text in _TRUE:
+        return True
+    if text in _FALSE:
+        return False
+    raise ProvisionError("is_active must be true or false")
+
+
+def validate_row(row) -> dict:
+    """Validate one input row and return a normalized account dict"""
+    if isinstance(row, ProvisionError):
+        raise row
+    if not isinstance(row, dict):
+        raise ProvisionError("row must be an object")
+    unknown = {k for k in row if k is not None} - FIELDS
+    if unknown:
+        raise ProvisionError(f"unknown field(s): {', '.join(sorted(unknown))}")
+
+    username = _text(row, "username", 50, required=True)
+    email = _text(row, "email", 100, required=True)
+    try:
+        email = _email.validate_python(email)
+    except ValidationError:
+        raise ProvisionError("email is not a valid address")
+
+    role = _text(row, "role", 20)
+    if role is not None and role not in ROLES:
+        raise ProvisionError(f"role must be one of {', '.join(sorted(ROLES))}")
+
+    password = row.get("password") or None
+    hashed = _text(row, "hashed_password", 255)
+    if password is not None and not isinstance(password, str):
+        raise ProvisionError("password must be a string")
+    if hashed and not hashed.startswith("$2"):
+        raise ProvisionError("hashed_password must be a bcrypt hash")
+
+    return {
+        "username": username,
+        "email": email,
+        "password": password,
+        "hashed_password": hashed,
+        "full_name": _text(row, "full_name", 100),
+        "role": role,
+        "is_active": _flag(row.get("is_active")),
+    }
+
+
+def _hash_passwords(passwords, rounds):
+    """Worker task: bcrypt-hash a chunk of passwords"""
+    return [
+        bcrypt.hashpw(p.encode("utf-8"), bcrypt.gensalt(rounds=rounds)).decode("utf-8")
+        for p in passwords
+    ]
+
+
+def _lookup(db, column, values, *extra):
+    found = {}
+    values = list(values)
+    for i in range(0, len(values), LOOKUP_CHUNK):
+        chunk = values[i:i + LOOKUP_CHUNK]
+        for row in db.execute(select(column, *extra).where(column.in_(chunk))):
+            found[row[0]] = row[1:]
+    return found
+
+
+def _insert_ignoring_conflicts(table, dialect: str):
+    """INSERT that skips rows hitting a unique constraint (e.g. a concurrent signup)"""
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return insert(table)
+    return dialect_insert(table).on_conflict_do_nothing()
+
+
+class Provisioner:
+    """Plans, hashes and writes one provisioning run"""
+
+    def __init__(self, db, update_existing: bool = True, dry_run: bool = False,
+                 batch_size: int = PROVISION_BATCH_SIZE, workers: int = None, rounds: int = BCRYPT_ROUNDS,
+                 progress=None):
+        self.db = db
+        self.update_existing = update_existing
+        self.dry_run = dry_run
+        self.batch_size = batch_size
+        self.workers = workers or os.cpu_count() or 1
+        self.rounds = rounds
+        self.progress = progress
+        self.conflicts = []  # {line, username, email, reason}
+        self.counts = {"rows": 0, "created": 0, "updated": 0, "skipped": 0, "conflicts": 0, "invalid": 0}
+
+    def _conflict(self, kind, lineno, account, reason):
+        self.counts[kind] += 1
+        self.conflicts.append({
+            "line": lineno,
+            "username": account.get("username") if isinstance(account, dict) else None,
+            "email": account.get("email") if isinstance(account, dict) else None,
+            "reason": reason,
+        })
+
+    def plan(self, rows):
+        """Validate rows and decide create/update/skip for each; returns [(line, action, account, user_id)]"""
+        accounts, seen_usernames, seen_emails = [], {}, {}
+        for lineno, row in rows:
+            self.counts["rows"] += 1
+            try:
+                account = validate_row(row)
+            except ProvisionError as e:
+                self._conflict("invalid", lineno, row, str(e))
+                continue
+            if account["username"] in seen_usernames:
+                self._conflict("conflicts", lineno, account,
+                               f"duplicate username (line {seen_usernames[account['username']]})")
+                continue
+            if account["email"] in seen_emails:
+                self._conflict("conflicts", lineno, account,
+                               f"duplicate email (line {seen_emails[account['email']]})")
+                continue
+            seen_usernames[account["username"]] = lineno
+            seen_emails[account["email"]] = lineno
+            accounts.append((lineno, account))
+
+        users = _lookup(self.db, User.username, seen_usernames, User.id)
+        emails = _lookup(self.db, User.email, seen_emails, User.username)
+
+        plan = []
+        for lineno, account in accounts:
+            existing = users.get(account["username"])
+            owner = emails.get(account["email"], (None,))[0]
+            if owner is not None and owner != account["username"]:
+                self._conflict("conflicts", lineno, account, f"email belongs to user {owner}")
+            elif existing is not None and not self.update_existing:
+                self._conflict("skipped", lineno, account, "username exists")
+            elif existing is None and not (account["password"] or account["hashed_password"]):
+                self._conflict("invalid", lineno, account, "password is required for a new user")
+            else:
+                plan.append((lineno, "update" if existing else "create", account, existing and existing[0]))
+        return plan
+
+    def _hashed(self, plan, executor):
+        """Yield plan entries with hashed_password filled in, in plan order"""
+        passwords = [a["password"] for _, _, a, _ in plan if a["password"]]
+        chunks = [passwords[i:i + HASH_CHUNK] for i in range(0, len(passwords), HASH_CHUNK)]
+        hashes = chain.from_iterable(executor.map(_hash_passwords, chunks, [self.rounds] * len(chunks)))
+        for entry in plan:
+            account = entry[2]
+            if account["password"]:
+                account["hashed_password"] = next(hashes)
+                account["password"] = None
+            yield entry
+
+    def write(self, plan):
+        """Hash passwords in the pool and write accounts in batched transactions"""
+        if self.dry_run:
+            for _, action, _, _ in plan:
+                self.counts["created" if action == "create" else "updated"] += 1
+            return
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            batch = []
+            for entry in self._hashed(plan, executor):
+                batch.append(entry)
+                if len(batch) >= self.batch_size:
+                    self._write_batch(batch)
+                    batch = []
+            if batch:
+                self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        table = User.__table__
+        creates = [(lineno, a) for lineno, action, a, _ in batch if action == "create"]
+        updates = [(a, user_id) for _, action, a, user_id in batch if action == "update"]
+        try:
+            if creates:
+                stmt = _insert_ignoring_conflicts(table, self.db.get_bind().dialect.name)
+                inserted = set(self.db.execute(
+                    stmt.returning(table.c.username),
+                    [self._columns(a, create=True) for _, a in creates]
+                ).scalars())
+                for lineno, a in creates:
+                    if a["username"] in inserted:
+                        self.counts["created"] += 1
+                    else:
+                        self._conflict("conflicts", lineno, a, "username or email taken during import")
+            # One executemany per set of given columns, so absent columns are left untouched
+            groups = {}
+            for a, user_id in updates:
+                params = dict(self._columns(a), b_id=user_id)
+                groups.setdefault(tuple(params), []).append(params)
+            for keys, params in groups.items():
+                columns = [c for c in keys if c not in ("b_id", "username")]
+                self.db.execute(
+                    update(table).where(table.c.id == bindparam("b_id"))
+                    .values({c: bindparam(c) for c in columns}),
+                    params
+                )
+                self.counts["updated"] += len(params)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        if self.progress:
+            self.progress(self.counts)
+
+    @staticmethod
+    def _columns(account, create=False):
+        """Column values to write; updates leave out optional columns the row did not give"""
+        columns = {"username": account["username"], "email": account["email"]}
+        for field, default in CREATE_DEFAULTS.items():
+            if account[field] is not None:
+                columns[field] = account[field]
+            elif create:
+                columns[field] = default
+        if account["hashed_password"]:
+            columns["hashed_password"] = account["hashed_password"]
+        return columns
+
+
+def write_report(path: str, conflicts):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["line", "username", "email", "reason"])
+        writer.writeheader()
+        writer.writerows(conflicts)
+
+
+if __name__ == "__main__":
+    from .db import SessionLocal, engine, Base
+
+    parser = argparse.ArgumentParser(description="Create or update users in bulk from CSV or NDJSON")
+    parser.add_argument("path", help="CSV (with header row) or NDJSON file")
+    parser.add_argument("--format", choices=("csv", "ndjson"), help="input format (default: by extension)")
+    parser.add_argument("--skip-existing", action="store_true", help="leave existing usernames unchanged")
+    parser.add_argument("--dry-run", action="store_true", help="validate and report without hashing or writing")
+    parser.add_argument("--batch-size", type=int, default=PROVISION_BATCH_SIZE, help="rows per transaction")
+    parser.add_argument("--workers", type=int, help="hashing processes (default: CPU count)")
+    parser.add_argument("--report", help="write every conflict and invalid row to this CSV")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    start = time.perf_counter()
+
+    def progress(counts):
+        done = counts["created"] + counts["updated"]
+        print(f"  {done} written, {done / (time.perf_counter() - start):.0f} rows/sec", flush=True)
+
+    db = SessionLocal()
+    try:
+        provisioner = Provisioner(
+            db, update_existing=not args.skip_existing, dry_run=args.dry_run,
+            batch_size=args.batch_size, workers=args.workers, progress=progress
+        )
+        plan = provisioner.plan(read_rows(args.path, args.format))
+        planned = time.perf_counter() - start
+        print(f"✓ Planned {len(plan)} of {provisioner.counts['rows']} rows in {planned:.2f}s")
+        provisioner.write(plan)
+    finally:
+        db.close()
+
+    elapsed = time.perf_counter() - start
+    counts = provisioner.counts
+    summary = (f"{counts['created']} created, {counts['updated']} updated, {counts['skipped']} skipped, "
+               f"{counts['conflicts']} conflicts, {counts['invalid']} invalid")
+    print(f"✓ {'Dry run, nothing written: ' if args.dry_run else ''}{summary}")
+    print(f"✓ {counts['rows']} rows in {elapsed:.2f}s ({counts['rows'] / elapsed:.0f} rows/sec)")
+    for conflict in provisioner.conflicts[:MAX_CONFLICTS_PRINTED]:
+        print(f"  line {conflict['line']}: {conflict['username']} - {conflict['reason']}")
+    if len(provisioner.conflicts) > MAX_CONFLICTS_PRINTED:
+        print(f"  ... {len(provisioner.conflicts) - MAX_CONFLICTS_PRINTED} more")
+    if args.report:
+        write_report(args.report, provisioner.conflicts)
+        print(f"✓ Conflict report written to {args.report}")
+    sys.exit(1 if counts["conflicts"] or counts["invalid"] else 0)
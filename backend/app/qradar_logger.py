@@ -1,49 +1,68 @@
 """
 QRadar Logger - forwards security events to QRadar via syslog or HTTP.
 Handles login attempts, admin access, and suspicious activities.
+
+qradar_events.log is the replay journal (app.replay): every event handed to the collectors is
+written after the pipeline stages as "Event sent to QRadar: TYPE payload={...}", and every event
+that could not be delivered (including HTTP batches dropped later by the background flusher) as
+"Failed to send event to QRadar (error): TYPE payload={...}".
 """
 import logging
+import re
 import socket
 import json
 import requests
 from datetime import datetime
 import os
 from dotenv import load_dotenv
+from .enrichment import IPEnricher, IP_ENRICHMENT_DB
+from .coalesce import EventCoalescer
+from .correlation import CorrelationEngine
+from .shaper import EventShaper
+from .log_handlers import attach_queued_handlers, CompressingRotatingFileHandler, dropped_records
+from .qradar_transport import pool_from_env
 
 load_dotenv()
 
+_FORMATTED = re.compile(r'type="(?P<type>[A-Z][A-Z0-9_]*)" details="(?P<details>.*)"$', re.DOTALL)
+
 class QRadarLogger:
     def __init__(self):
         self.host = os.getenv('QRADAR_HOST')
         self.port = int(os.getenv('QRADAR_PORT', 514))
         self.protocol = os.getenv('QRADAR_PROTOCOL', 'TCP').upper()
         self.logger = self._setup_logger()
-        self.sock = None
-        
-        # Only try to connect if QRADAR_HOST is set
-        if self.host and self.protocol == 'TCP':
-            try:
-                self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                self.sock.connect((self.host, self.port))
-            except Exception as e:
-                self.logger.warning(f"Could not connect to QRadar: {e}")
-                self.sock = None
+        # Event Collector pool (QRADAR_HOSTS, or the single QRADAR_HOST); connects lazily
+        self.pool = pool_from_env()
+        # Pipeline stages; each maps one (event_type, details) pair to a list of pairs
+        self.stages = []
+    
+    @property
+    def pool(self):
+        return self._pool
+    
+    @pool.setter
+    def pool(self, pool):
+        """Batches a pool drops after accepting them (HTTP flush failures) are journaled as failed"""
+        self._pool = pool
+        pool.on_dropped = self._journal_dropped
     
     def _setup_logger(self):
         logger = logging.getLogger('QRadarLogger')
         logger.setLevel(logging.INFO)
+        formatter = logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        )
+        handlers = []
         
         # Try to create file handler; skip if permission denied
         try:
             log_dir = os.path.dirname(os.path.abspath('qradar_events.log'))
             os.makedirs(log_dir, exist_ok=True)
-            fh = logging.FileHandler('qradar_events.log')
+            fh = CompressingRotatingFileHandler('qradar_events.log')
             fh.setLevel(logging.INFO)
-            formatter = logging.Formatter(
-                '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-            )
             fh.setFormatter(formatter)
-            logger.addHandler(fh)
+            handlers.append(fh)
         except PermissionError:
             pass  # Skip file logging if permission denied
         except Exception as e:
@@ -52,13 +71,11 @@ class QRadarLogger:
         # Console handler (always works)
         ch = logging.StreamHandler()
         ch.setLevel(logging.INFO)
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        )
         ch.setFormatter(formatter)
-        logger.addHandler(ch)
+        handlers.append(ch)
         
-        return logger
+        # Writes happen on the shared background log writer, not the caller's thread
+        return attach_queued_handlers(logger, handlers)
     
     def _format_syslog_message(self, event_type, details):
         """Format message according to QRadar syslog format"""
@@ -71,24 +88,95 @@ class QRadarLogger:
         
         return f'<134>{timestamp} {hostname} WebApp: type="{event_type}" details="{details}"'
     
+    def add_stage(self, stage):
+        """Append a pipeline stage exposing process(event_type, details) -> [(event_type, details)].
+        Stages that emit events later (e.g. window summaries) get a bind(emit) callback."""
+        self.stages.append(stage)
+        if hasattr(stage, 'bind'):
+            index = len(self.stages)
+            stage.bind(lambda events: self._forward(events, index))
+        return stage
+    
+    def _forward(self, events, start):
+        """Deliver events emitted asynchronously by the stage before position start"""
+        try:
+            events = self._run_stages(events, start)
+            if events:
+                self._deliver(events)
+        except Exception as e:
+            self.logger.error(f"Failed to send deferred events to QRadar: {str(e)}")
+    
+    def _run_stages(self, events, start=0):
+        """Pass events through every pipeline stage in order; a stage that raises passes the event on unchanged"""
+        for stage in self.stages[start:]:
+            out = []
+            for event_type, details in events:
+                try:
+                    out.extend(stage.process(event_type, details))
+                except Exception as e:
+                    self.logger.error(f"Pipeline stage {getattr(stage, 'name', type(stage).__name__)} "
+                                      f"failed on {event_type}, forwarding it unchanged: {str(e)}")
+                    out.append((event_type, details))
+            events = out
+        return events
+    
+    @staticmethod
+    def _routing_key(details):
+        """Source key used for consistent-hash routing: username, else IP"""
+        if isinstance(details, dict):
+            return details.get('username') or details.get('ip_address')
+        return None
+    
+    def _deliver(self, events):
+        """Format events and hand them to the collector pool, journaling each one; raises on failure"""
+        try:
+            if not self.pool.destinations:
+                raise ConnectionError("no QRadar destinations configured")
+            self.pool.send_keyed([
+                (self._routing_key(d), self._format_syslog_message(t, d)) for t, d in events
+            ])
+        except Exception as e:
+            self._journal_failed(events, e)
+            raise
+        # Payloads are journaled after the stages so app.replay re-sends exactly what was delivered
+        for event_type, details in events:
+            self.logger.info(f"Event sent to QRadar: {event_type} payload={json.dumps(details, default=str)}")
+    
+    def _journal_failed(self, events, error):
+        for event_type, details in events:
+            self.logger.error(
+                f"Failed to send event to QRadar ({str(error)}): {event_type} payload={json.dumps(details, default=str)}"
+            )
+    
+    def _journal_dropped(self, messages, error):
+        """Turn formatted messages a destination dropped back into journal failure lines"""
+        events = []
+        for message in messages:
+            match = _FORMATTED.search(message)
+            if not match:
+                continue
+            try:
+                details = json.loads(match['details'])
+            except ValueError:
+                details = match['details']
+            events.append((match['type'], details))
+        self._journal_failed(events, error)
+    
     def send_event(self, event_type, details):
-        """Send event to QRadar via syslog"""
+        """Send event to QRadar through the destination pool"""
+        return self.send_batch([(event_type, details)])
+    
+    def send_batch(self, events):
+        """Send a batch of (event_type, details) pairs to QRadar in one write"""
+        if not events:
+            return True
+        events = self._run_stages(events)
+        if not events:
+            return True
         try:
-            message = self._format_syslog_message(event_type, details)
-            
-            if self.host and self.sock:
-                self.sock.send(f"{message}\n".encode('utf-8'))
-            else:  # UDP or no host configured
-                if self.host:
-                    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-                    sock.sendto(message.encode('utf-8'), (self.host, self.port))
-                    sock.close()
-            
-            self.logger.info(f"Event sent to QRadar: {event_type}")
+            self._deliver(events)  # journals the outcome
             return True
-            
-        except Exception as e:
-            self.logger.error(f"Failed to send event to QRadar: {str(e)}")
+        except Exception:
             return False
     
     def log_login_attempt(self, username, ip_address, success, details=None):
@@ -128,13 +216,27 @@ class QRadarLogger:
         }
         return self.send_event("SUSPICIOUS_ACTIVITY", event_data)
     
+    def stats(self):
+        """Forwarding metrics for every collector"""
+        return {
+            "destinations": self.pool.stats(),
+            "stages": {s.name: s.stats() for s in self.stages if hasattr(s, 'stats')},
+            # Journal lines shed by the background log writer; replay cannot see those events
+            "journal_dropped": dropped_records(self.logger.name)
+        }
+    
     def __del__(self):
-        """Cleanup socket connection"""
-        if hasattr(self, 'sock') and self.sock:
+        """Cleanup socket connections"""
+        if hasattr(self, 'pool'):
             try:
-                self.sock.close()
+                self.pool.close()
             except:
                 pass
 
 # Global instance
 qradar_logger = QRadarLogger()
+# Correlation runs first so its rules see every event, before coalescing folds repeats
+qradar_logger.add_stage(CorrelationEngine())
+qradar_logger.add_stage(EventCoalescer())
+qradar_logger.add_stage(IPEnricher(IP_ENRICHMENT_DB))
+qradar_logger.add_stage(EventShaper())
@@ -0,0 +1,585 @@
+"""
+QRadar transport - delivers formatted syslog messages to a pool of Event Collectors.
+Destinations are configured as a comma-separated list:
+    QRADAR_HOSTS=10.0.0.5:514/tcp,10.0.0.6:514/tcp,10.0.0.7:514/udp,https://10.0.0.8:12469/
+(falls back to QRADAR_HOST/QRADAR_PORT/QRADAR_PROTOCOL for a single collector).
+
+TLS destinations (10.0.0.5:6514/tls) speak syslog over TLS as in RFC 5425: octet-counted frames
+on one long-lived, certificate-verified stream. Reconnects resume the previous TLS session
+(session ticket) instead of running a full handshake.
+
+HTTP(S) destinations POST batches of newline-separated messages to an HTTP Receiver log source
+over one keep-alive session. Messages are buffered and flushed by a background thread once
+QRADAR_HTTP_BATCH_SIZE messages are waiting or the oldest has waited QRADAR_HTTP_FLUSH_SECONDS,
+so callers never block on the network. Bodies are gzip-compressed (QRADAR_HTTP_GZIP); 5xx, 429
+and connection errors are retried with exponential backoff, honouring Retry-After.
+
+Routing is round-robin per batch, or consistent-hash by source (username/IP) so events for one
+user always reach the same collector in order. A destination that fails is taken out of rotation
+for QRADAR_FAILOVER_COOLDOWN seconds and traffic fails over to the next healthy one; once the
+cooldown expires it is tried again (failback).
+"""
+import atexit
+import bisect
+import gzip
+import hashlib
+import itertools
+import logging
+import os
+import random
+import socket
+import ssl
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+load_dotenv()
+
+QRADAR_ROUTING = os.getenv("QRADAR_ROUTING", "round_robin").lower()  # round_robin | hash
+QRADAR_FAILOVER_COOLDOWN = float(os.getenv("QRADAR_FAILOVER_COOLDOWN", "30"))
+QRADAR_CONNECT_TIMEOUT = float(os.getenv("QRADAR_CONNECT_TIMEOUT", "2"))
+HASH_RING_REPLICAS = 100
+
+QRADAR_TLS_CA_FILE = os.getenv("QRADAR_TLS_CA_FILE")  # CA bundle for collector certificates; system store if unset
+QRADAR_TLS_VERIFY = os.getenv("QRADAR_TLS_VERIFY", "true").lower() in ("1", "true", "yes")
+QRADAR_TLS_CERT_FILE = os.getenv("QRADAR_TLS_CERT_FILE")  # client certificate for mutual TLS
+QRADAR_TLS_KEY_FILE = os.getenv("QRADAR_TLS_KEY_FILE")
+SYSLOG_TLS_PORT = 6514
+
+QRADAR_HTTP_BATCH_SIZE = int(os.getenv("QRADAR_HTTP_BATCH_SIZE", "500"))
+QRADAR_HTTP_FLUSH_SECONDS = float(os.getenv("QRADAR_HTTP_FLUSH_SECONDS", "1"))
+QRADAR_HTTP_MAX_BUFFER = int(os.getenv("QRADAR_HTTP_MAX_BUFFER", "100000"))
+QRADAR_HTTP_RETRIES = int(os.getenv("QRADAR_HTTP_RETRIES", "4"))
+QRADAR_HTTP_BACKOFF = float(os.getenv("QRADAR_HTTP_BACKOFF", "0.5"))  # first retry delay, doubled each time
+QRADAR_HTTP_MAX_BACKOFF = 30.0
+QRADAR_HTTP_TIMEOUT = float(os.getenv("QRADAR_HTTP_TIMEOUT", "10"))
+QRADAR_HTTP_GZIP = os.getenv("QRADAR_HTTP_GZIP", "true").lower() in ("1", "true", "yes")
+QRADAR_HTTP_VERIFY = os.getenv("QRADAR_HTTP_VERIFY", "true")  # true, false or a CA bundle path
+
+logger = logging.getLogger("QRadarLogger")
+
+
+class NoHealthyDestination(ConnectionError):
+    """Raised when every destination in the pool is down or failed the send"""
+
+
+class SyslogDestination:
+    """One collector endpoint speaking newline-framed TCP or datagram UDP syslog"""
+
+    def __init__(self, host: str, port: int, protocol: str = "TCP", connect_timeout: float = QRADAR_CONNECT_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.protocol = protocol.upper()
+        self.connect_timeout = connect_timeout
+        self.sock = None
+        self.lock = threading.Lock()
+        # Health
+        self.down_until = 0.0
+        self.consecutive_failures = 0
+        self.last_error = None
+        # Metrics
+        self.sent_events = 0
+        self.sent_bytes = 0
+        self.send_errors = 0
+        self.failovers = 0
+        self.connects = 0
+        self.send_seconds = 0.0
+
+    @property
+    def name(self) -> str:
+        return f"{self.host}:{self.port}/{self.protocol.lower()}"
+
+    def is_available(self, now: float) -> bool:
+        return now >= self.down_until
+
+    def _connect(self):
+        if self.protocol == "UDP":
+            family, socktype, proto, _, address = socket.getaddrinfo(
+                self.host, self.port, type=socket.SOCK_DGRAM
+            )[0]
+            sock = socket.socket(family, socktype, proto)
+            # Connected UDP surfaces ICMP port-unreachable as send errors
+            sock.connect(address)
+        else:
+            sock = socket.create_connection((self.host, self.port), timeout=self.connect_timeout)
+            sock.settimeout(None)
+        self.connects += 1
+        return sock
+
+    def _write(self, messages):
+        if self.protocol == "UDP":
+            for message in messages:
+                self.sock.send(message.encode("utf-8"))
+            return sum(len(m) for m in messages)
+        payload = "".join(f"{m}\n" for m in messages).encode("utf-8")
+        self.sock.sendall(payload)
+        return len(payload)
+
+    def send(self, messages):
+        """Send messages; raises OSError after closing the socket on failure"""
+        with self.lock:
+            start = time.perf_counter()
+            try:
+                if self.sock is None:
+                    self.sock = self._connect()
+                self.sent_bytes += self._write(messages)
+            except OSError:
+                self.close()
+                raise
+            self.sent_events += len(messages)
+            self.send_seconds += time.perf_counter() - start
+
+    def mark_success(self):
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+
+    def mark_failure(self, error: Exception, cooldown: float):
+        self.send_errors += 1
+        self.consecutive_failures += 1
+        self.last_error = str(error)
+        self.down_until = time.monotonic() + cooldown
+
+    def close(self):
+        if self.sock:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def stats(self) -> dict:
+        return {
+            "destination": self.name,
+            "healthy": self.is_available(time.monotonic()),
+            "sent_events": self.sent_events,
+            "sent_bytes": self.sent_bytes,
+            "send_errors": self.send_errors,
+            "failovers_from": self.failovers,
+            "connects": self.connects,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+            "avg_send_ms": round(self.send_seconds * 1000 / self.sent_events, 4) if self.sent_events else None,
+        }
+
+
+def tls_context(ca_file: str = QRADAR_TLS_CA_FILE, verify: bool = QRADAR_TLS_VERIFY,
+                cert_file: str = QRADAR_TLS_CERT_FILE, key_file: str = QRADAR_TLS_KEY_FILE) -> ssl.SSLContext:
+    """Client context for TLS syslog: TLS 1.2+, certificate and hostname verification"""
+    context = ssl.create_default_context(cafile=ca_file)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    if not verify:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    if cert_file:
+        context.load_cert_chain(cert_file, key_file)
+    return context
+
+
+class TLSSyslogDestination(SyslogDestination):
+    """Collector endpoint speaking RFC 5425 syslog over TLS, resuming its session on reconnect"""
+
+    def __init__(self, host: str, port: int = SYSLOG_TLS_PORT, context: ssl.SSLContext = None,
+                 connect_timeout: float = QRADAR_CONNECT_TIMEOUT):
+        super().__init__(host, port, "TLS", connect_timeout)
+        self.context = context or tls_context()
+        self.tls_session = None
+        self.resumed = 0
+        self.tls_version = None
+
+    def _connect(self):
+        raw = socket.create_connection((self.host, self.port), timeout=self.connect_timeout)
+        raw.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        try:
+            sock = self.context.wrap_socket(raw, server_hostname=self.host, session=self.tls_session)
+        except OSError:
+            raw.close()
+            raise
+        sock.settimeout(None)
+        self.connects += 1
+        if sock.session_reused:
+            self.resumed += 1
+        self.tls_version = sock.version()
+        self._keep_session(sock)
+        return sock
+
+    def _keep_session(self, sock):
+        """Store the session for the next reconnect. TLS 1.3 tickets arrive after the handshake
+        and are only processed on read, so poll the socket once without blocking"""
+        sock.setblocking(False)
+        try:
+            sock.recv(1)  # collectors never send data; this only drains handshake messages
+        except (ssl.SSLWantReadError, ssl.SSLWantWriteError, BlockingIOError):
+            pass
+        finally:
+            sock.setblocking(True)
+        session = sock.session
+        if session is not None and (session.has_ticket or sock.version() != "TLSv1.3"):
+            self.tls_session = session
+
+    def _write(self, messages):
+        # RFC 5425 octet counting: "<length> <message>", no newline delimiter
+        encoded = [m.encode("utf-8") for m in messages]
+        payload = b"".join(b"%d %s" % (len(m), m) for m in encoded)
+        self.sock.sendall(payload)
+        if self.tls_session is None or not self.tls_session.has_ticket:
+            self._keep_session(self.sock)
+        return len(payload)
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats.update({"tls_version": self.tls_version, "resumed_connects": self.resumed})
+        return stats
+
+
+def _retry_after(value) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class HTTPDestination:
+    """HTTP Receiver endpoint fed with buffered, compressed batches over a keep-alive session"""
+
+    protocol = "HTTP"
+
+    def __init__(self, url: str, batch_size: int = QRADAR_HTTP_BATCH_SIZE,
+                 flush_seconds: float = QRADAR_HTTP_FLUSH_SECONDS, max_buffer: int = QRADAR_HTTP_MAX_BUFFER,
+                 retries: int = QRADAR_HTTP_RETRIES, backoff: float = QRADAR_HTTP_BACKOFF,
+                 timeout: float = QRADAR_HTTP_TIMEOUT, compress: bool = QRADAR_HTTP_GZIP,
+                 verify=QRADAR_HTTP_VERIFY):
+        self.url = url
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_buffer = max_buffer
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.compress = compress
+        self.session = requests.Session()
+        self.session.mount(url, HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self.session.verify = {"true": True, "false": False}.get(str(verify).lower(), verify)
+        self.session.headers["Content-Type"] = "text/plain; charset=utf-8"
+        self.buffer = []
+        self.oldest = None
+        self.cond = threading.Condition()
+        self.flushing = 0
+        self.on_failure = None  # set by the pool to re-route batches that exhaust their retries
+        self.on_dropped = None  # set by the pool; called with (messages, error) for batches nobody took
+        self._stop = False
+        self._flusher = None
+        # Health
+        self.down_until = 0.0
+        self.consecutive_failures = 0
+        self.last_error = None
+        # Metrics
+        self.sent_events = 0
+        self.sent_bytes = 0
+        self.raw_bytes = 0
+        self.send_errors = 0
+        self.failovers = 0
+        self.send_seconds = 0.0
+        self.batches = 0
+        self.retried = 0
+        self.dropped = 0
+        atexit.register(self.close)
+
+    @property
+    def name(self) -> str:
+        return self.url
+
+    def is_available(self, now: float) -> bool:
+        return now >= self.down_until
+
+    def send(self, messages):
+        """Queue messages for the next batch; raises OSError when the buffer is full"""
+        with self.cond:
+            if len(self.buffer) + len(messages) > self.max_buffer:
+                raise OSError(f"HTTP buffer full ({len(self.buffer)} messages waiting)")
+            if not self.buffer:
+                self.oldest = time.monotonic()
+            self.buffer.extend(messages)
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="qradar-http", daemon=True)
+                self._flusher.start()
+            if len(self.buffer) >= self.batch_size:
+                self.cond.notify()
+
+    def _next_batch(self):
+        """Wait until a batch is due and take it; returns [] once stopped and drained"""
+        with self.cond:
+            while not self._stop:
+                if len(self.buffer) >= self.batch_size:
+                    break
+                if self.buffer and time.monotonic() - self.oldest >= self.flush_seconds:
+                    break
+                timeout = self.flush_seconds
+                if self.buffer:
+                    timeout = max(self.oldest + self.flush_seconds - time.monotonic(), 0.001)
+                self.cond.wait(timeout)
+            batch = self.buffer[:self.batch_size]
+            del self.buffer[:self.batch_size]
+            self.oldest = time.monotonic() if self.buffer else None
+            self.flushing = len(batch)
+            return batch
+
+    def _flush_loop(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            try:
+                self._post(batch)
+            except OSError as e:
+                self.mark_failure(e, QRADAR_FAILOVER_COOLDOWN)
+                if self.on_failure is None or not self.on_failure(batch):
+                    self.dropped += len(batch)
+                    logger.error(f"Dropped {len(batch)} events for {self.name}: {e}")
+                    if self.on_dropped is not None:
+                        self.on_dropped(batch, e)
+            else:
+                self.mark_success()
+            finally:
+                self.flushing = 0
+
+    def _post(self, batch):
+        """POST one batch, retrying 5xx/429/connection errors with backoff"""
+        raw = "".join(f"{m}\n" for m in batch).encode("utf-8")
+        body = gzip.compress(raw, compresslevel=5) if self.compress else raw
+        headers = {"Content-Encoding": "gzip"} if self.compress else {}
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            start = time.perf_counter()
+            retry_after = None
+            try:
+                response = self.session.post(self.url, data=body, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            else:
+                if response.status_code < 400:
+                    self.batches += 1
+                    self.sent_events += len(batch)
+                    self.sent_bytes += len(body)
+                    self.raw_bytes += len(raw)
+                    return
+                if response.status_code < 500 and response.status_code != 429:
+                    raise OSError(f"HTTP {response.status_code} from {self.url}: {response.text[:200]}")
+                error = f"HTTP {response.status_code}"
+                retry_after = _retry_after(response.headers.get("Retry-After"))
+            finally:
+                self.send_seconds += time.perf_counter() - start
+            if attempt == self.retries or self._stop:
+                raise OSError(f"{error} after {attempt + 1} attempt(s)")
+            self.retried += 1
+            if retry_after is None:
+                retry_after = delay * random.uniform(0.5, 1.0)
+                delay = min(delay * 2, QRADAR_HTTP_MAX_BACKOFF)
+            time.sleep(min(retry_after, QRADAR_HTTP_MAX_BACKOFF * 2))
+
+    def mark_success(self):
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+
+    def mark_failure(self, error: Exception, cooldown: float):
+        self.send_errors += 1
+        self.consecutive_failures += 1
+        self.last_error = str(error)
+        self.down_until = time.monotonic() + cooldown
+
+    def flush(self, timeout: float = None):
+        """Wait until everything buffered so far has been posted (or failed)"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self.cond:
+            if self.buffer:
+                self.oldest = -self.flush_seconds  # make the waiting batch due now
+                self.cond.notify()
+        while self.buffer or self.flushing:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+    def close(self):
+        with self.cond:
+            self._stop = True
+            self.cond.notify()
+        if self._flusher is not None and self._flusher is not threading.current_thread():
+            self._flusher.join(self.timeout)
+        self.session.close()
+
+    def stats(self) -> dict:
+        return {
+            "destination": self.name,
+            "healthy": self.is_available(time.monotonic()),
+            "sent_events": self.sent_events,
+            "sent_bytes": self.sent_bytes,
+            "send_errors": self.send_errors,
+            "failovers_from": self.failovers,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+            "batches": self.batches,
+            "avg_batch_size": round(self.sent_events / self.batches, 1) if self.batches else None,
+            "compression_ratio": round(self.raw_bytes / self.sent_bytes, 2) if self.sent_bytes else None,
+            "retries": self.retried,
+            "buffered": len(self.buffer),
+            "dropped": self.dropped,
+            "avg_post_ms": round(self.send_seconds * 1000 / self.batches, 3) if self.batches else None,
+        }
+
+
+class DestinationPool:
+    """Routes message batches across destinations with health tracking and failover"""
+
+    def __init__(self, destinations, routing: str = QRADAR_ROUTING, cooldown: float = QRADAR_FAILOVER_COOLDOWN):
+        if routing not in ("round_robin", "hash"):
+            raise ValueError(f"Unknown QRadar routing mode: {routing}")
+        self.destinations = list(destinations)
+        self.routing = routing
+        self.cooldown = cooldown
+        self._rr = itertools.count()
+        self._ring_keys, self._ring_nodes = self._build_ring()
+        self.on_dropped = None  # callback(messages, error) for asynchronously dropped batches
+        for dest in self.destinations:
+            if hasattr(dest, "on_failure"):
+                dest.on_failure = lambda messages, failed=dest: self._reroute(messages, failed)
+                dest.on_dropped = self._dropped
+
+    def _build_ring(self):
+        points = []
+        for index, dest in enumerate(self.destinations):
+            for replica in range(HASH_RING_REPLICAS):
+                points.append((self._hash(f"{dest.name}#{replica}"), index))
+        points.sort()
+        return [p[0] for p in points], [p[1] for p in points]
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+    def _candidates(self, key: Optional[str]):
+        """Destinations in preference order for a batch; the first is the primary"""
+        n = len(self.destinations)
+        if self.routing == "hash" and key is not None:
+            start = bisect.bisect(self._ring_keys, self._hash(key)) % len(self._ring_keys)
+            seen = []
+            for i in range(len(self._ring_nodes)):
+                index = self._ring_nodes[(start + i) % len(self._ring_nodes)]
+                if index not in seen:
+                    seen.append(index)
+                    if len(seen) == n:
+                        break
+            return [self.destinations[i] for i in seen]
+        first = next(self._rr) % n
+        return [self.destinations[(first + i) % n] for i in range(n)]
+
+    def send(self, messages, key: Optional[str] = None):
+        """Send a batch to the preferred healthy destination, failing over in order"""
+        if not self.destinations or not messages:
+            return None
+        now = time.monotonic()
+        candidates = self._candidates(key)
+        primary = candidates[0]
+        last_error = None
+        for dest in candidates:
+            if not dest.is_available(now):
+                continue
+            try:
+                dest.send(messages)
+            except OSError as e:
+                dest.mark_failure(e, self.cooldown)
+                last_error = e
+                continue
+            dest.mark_success()
+            if dest is not primary:
+                primary.failovers += 1
+            return dest
+        raise NoHealthyDestination(f"No healthy QRadar destination (last error: {last_error})")
+
+    def _reroute(self, messages, failed) -> bool:
+        """Hand a batch that failed asynchronously to another healthy destination"""
+        now = time.monotonic()
+        for dest in self.destinations:
+            if dest is failed or not dest.is_available(now):
+                continue
+            try:
+                dest.send(messages)
+            except OSError as e:
+                dest.mark_failure(e, self.cooldown)
+                continue
+            dest.mark_success()
+            failed.failovers += 1
+            return True
+        return False
+
+    def _dropped(self, messages, error):
+        if self.on_dropped is not None:
+            self.on_dropped(messages, error)
+
+    def send_keyed(self, keyed_messages):
+        """Send (key, message) pairs, grouping them by routing key when hash-routing"""
+        if self.routing != "hash":
+            return self.send([m for _, m in keyed_messages])
+        groups = {}
+        for key, message in keyed_messages:
+            groups.setdefault(key, []).append(message)
+        for key, messages in groups.items():
+            self.send(messages, key)
+
+    def stats(self) -> list:
+        return [d.stats() for d in self.destinations]
+
+    def close(self):
+        for dest in self.destinations:
+            dest.close()
+
+
+def parse_destinations(spec: str, default_port: int = 514, default_protocol: str = "TCP"):
+    """Parse 'host[:port][/proto],...' and 'http(s)://...' URLs into destinations"""
+    destinations = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        if item.lower().startswith(("http://", "https://")):
+            destinations.append(HTTPDestination(item))
+            continue
+        protocol = default_protocol
+        if "/" in item:
+            item, protocol = item.rsplit("/", 1)
+        # RFC 5425 assigns 6514 to syslog over TLS
+        port = SYSLOG_TLS_PORT if protocol.upper() == "TLS" and default_port == 514 else default_port
+        host = item
+        if item.startswith("["):  # [ipv6]:port
+            host, _, rest = item[1:].partition("]")
+            port = int(rest[1:]) if rest.startswith(":") else port
+        elif item.count(":") == 1:
+            host, port = item.split(":")
+            port = int(port)
+        if protocol.upper() in ("HTTP", "HTTPS"):
+            netloc = f"[{host}]" if ":" in host else host
+            destinations.append(HTTPDestination(f"{protocol.lower()}://{netloc}:{port}/"))
+        elif protocol.upper() == "TLS":
+            destinations.append(TLSSyslogDestination(host, int(port)))
+        else:
+            destinations.append(SyslogDestination(host, int(port), protocol))
+    return destinations
+
+
+def pool_from_env() -> DestinationPool:
+    """Build the destination pool from QRADAR_HOSTS, or the single QRADAR_HOST settings"""
+    port = int(os.getenv("QRADAR_PORT", 514))
+    protocol = os.getenv("QRADAR_PROTOCOL", "TCP").upper()
+    spec = os.getenv("QRADAR_HOSTS") or os.getenv("QRADAR_HOST") or ""
+    return DestinationPool(parse_destinations(spec, port, protocol))
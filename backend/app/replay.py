@@ -0,0 +1,451 @@
+"""
+Replay and backfill - re-sends historical events to QRadar after an outage.
+
+Sources:
+  --qradar-log PATH   qradar_events.log (or a rotated .gz); events are rebuilt from the
+                      journaled "payload=" of each sent/failed line
+  --app-log PATH      secure_app.log; logins, signups and profile updates are rebuilt from
+                      their messages (no IP is recorded there)
+  --db                the activity_logs table
+
+Usage:
+    python -m app.replay --qradar-log qradar_events.log --only-failed
+    python -m app.replay --db --since 2024-01-01T00:00:00 --rate 500
+    python -m app.replay --qradar-log qradar_events.log --speed 10
+
+Log files are memory-mapped and parsed in newline-aligned chunks. Events are formatted and handed
+straight to the destination pool, skipping the pipeline stages (they already went through them
+once, and correlation would re-fire its alerts), either as fast as possible, at --rate events/sec,
+or at --speed N times their original pacing. Progress is checkpointed per source in the --state
+SQLite file together with digests of every delivered event, only once buffering destinations have
+flushed the batch, so an interrupted backfill resumes where it stopped and never re-sends an event
+it already delivered. A log checkpoint also records which file it belongs to (device, inode and a
+hash of the first line): when the log has been rotated since, the replay continues in the matching
+rotated backup (.rotating or .N.gz) and every newer one before the current file, and when no backup
+matches it restarts the current file from 0 with a warning.
+"""
+import argparse
+import glob
+import gzip
+import hashlib
+import json
+import mmap
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+CHUNK_BYTES = 8 * 1024 * 1024
+BATCH_SIZE = 500
+FLUSH_TIMEOUT = 60.0  # seconds to wait for buffering (HTTP) destinations before a batch counts as failed
+
+_QRADAR_LINE = re.compile(
+    r"^(?P<asctime>\S+ \S+) - QRadarLogger - (?P<level>\w+) - "
+    r"(?P<kind>Event sent to QRadar|Failed to send event to QRadar)(?: \((?P<error>.*?)\))?: "
+    r"(?P<type>[A-Z][A-Z0-9_]*) payload=(?P<payload>.*)$"
+)
+_APP_LINE = re.compile(r"^(?P<asctime>\S+ \S+) (?P<level>\w+) (?P<message>.*)$")
+_APP_MESSAGES = [
+    (re.compile(r"^User login success: (?P<username>\S+)$"), "LOGIN_ATTEMPT", "success"),
+    (re.compile(r"^User signup: (?P<username>\S+)$"), "SIGNUP", "success"),
+    (re.compile(r"^User profile updated: (?P<username>\S+)$"), "PROFILE_UPDATE", "success"),
+]
+
+
+def _parse_asctime(value: str) -> datetime:
+    return datetime.strptime(value, "%Y-%m-%d %H:%M:%S,%f")
+
+
+def _event_time(details, fallback: datetime) -> datetime:
+    if isinstance(details, dict) and isinstance(details.get("timestamp"), str):
+        try:
+            return datetime.fromisoformat(details["timestamp"])
+        except ValueError:
+            pass
+    return fallback
+
+
+# ==================== SOURCES ====================
+
+def iter_lines(path: str, offset: int = 0, chunk_bytes: int = CHUNK_BYTES):
+    """Yield (line, end_offset) for complete lines after offset.
+    Plain files are memory-mapped and split in newline-aligned chunks; .gz files are streamed
+    and offsets refer to decompressed bytes."""
+    if path.endswith(".gz"):
+        pos = 0
+        with gzip.open(path, "rb") as f:
+            for line in f:
+                pos += len(line)
+                if pos > offset and line.endswith(b"\n"):
+                    yield line[:-1], pos
+        return
+
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size <= offset:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = offset
+            while pos < size:
+                end = min(pos + chunk_bytes, size)
+                newline = mm.rfind(b"\n", pos, end)
+                if newline == -1:
+                    # Line longer than a chunk: extend to its end, or stop at a partial last line
+                    newline = mm.find(b"\n", end)
+                    if newline == -1:
+                        return
+                end = newline + 1
+                line_end = pos
+                for line in mm[pos:end - 1].split(b"\n"):
+                    line_end += len(line) + 1
+                    yield line, line_end
+                pos = end
+
+
+def file_identity(path: str) -> str:
+    """"dev:inode:first-line hash"; appends keep it, rotation or truncation change it"""
+    st = os.stat(path)
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        first = f.readline(65536)
+    return f"{st.st_dev}:{st.st_ino}:{hashlib.blake2b(first, digest_size=8).hexdigest()}"
+
+
+def rotated_since(path: str, identity: str):
+    """Backups of path from the one whose first line matches identity to the newest, oldest first;
+    None when no backup matches (rotated files get new inodes, so only the hash is compared)"""
+    def number(backup):
+        return int(backup[len(path) + 1:-len(".gz")])
+
+    backups = [b for b in glob.glob(glob.escape(path) + ".*.gz") if b[len(path) + 1:-len(".gz")].isdigit()]
+    backups.sort(key=number, reverse=True)
+    if os.path.exists(path + ".rotating"):
+        backups.append(path + ".rotating")  # the latest rotation, still being compressed into .1.gz
+    first_line = identity.rsplit(":", 1)[-1]
+    for index, backup in enumerate(backups):
+        try:
+            if file_identity(backup).rsplit(":", 1)[-1] == first_line:
+                return backups[index:]
+        except (OSError, EOFError):
+            continue
+    return None
+
+
+def qradar_log_events(path: str, offset: int, only_failed: bool = False):
+    """Rebuild events from qradar_events.log; yields (position, event_type, details, ts)"""
+    for raw, end in iter_lines(path, offset):
+        match = _QRADAR_LINE.match(raw.decode("utf-8", "replace"))
+        if not match:
+            yield end, None, None, None
+            continue
+        if only_failed and match["kind"] != "Failed to send event to QRadar":
+            yield end, None, None, None
+            continue
+        try:
+            details = json.loads(match["payload"])
+        except json.JSONDecodeError:
+            yield end, None, None, None
+            continue
+        yield end, match["type"], details, _event_time(details, _parse_asctime(match["asctime"]))
+
+
+def app_log_events(path: str, offset: int):
+    """Rebuild events from secure_app.log messages; yields (position, event_type, details, ts)"""
+    for raw, end in iter_lines(path, offset):
+        line = _APP_LINE.match(raw.decode("utf-8", "replace"))
+        event = None
+        if line:
+            for pattern, event_type, status in _APP_MESSAGES:
+                m = pattern.match(line["message"])
+                if m:
+                    ts = _parse_asctime(line["asctime"])
+                    event = (event_type, {
+                        "event_type": event_type,
+                        "username": m["username"],
+                        "ip_address": None,
+                        "status": status,
+                        "timestamp": ts.isoformat(),
+                        "details": {"replayed_from": "secure_app.log"}
+                    }, ts)
+                    break
+        if event:
+            yield (end,) + event
+        else:
+            yield end, None, None, None
+
+
+def db_events(last_id: int, since=None, batch: int = 5000):
+    """Stream activity_logs rows after last_id; yields (id, event_type, details, ts)"""
+    from .db import SessionLocal
+    from .models import ActivityLog, User
+
+    db = SessionLocal()
+    try:
+        while True:
+            query = db.query(ActivityLog, User.username).outerjoin(User, ActivityLog.user_id == User.id)\
+                .filter(ActivityLog.id > last_id)
+            if since:
+                query = query.filter(ActivityLog.timestamp >= since)
+            rows = query.order_by(ActivityLog.id).limit(batch).all()
+            if not rows:
+                return
+            for log, username in rows:
+                try:
+                    extra = json.loads(log.details) if log.details else {}
+                except json.JSONDecodeError:
+                    extra = {"raw": log.details}
+                ts = log.timestamp or datetime.utcnow()
+                yield log.id, log.action, {
+                    "event_type": log.action,
+                    "username": username,
+                    "ip_address": log.ip_address,
+                    "status": log.status,
+                    "timestamp": ts.isoformat(),
+                    "details": extra
+                }, ts
+                last_id = log.id
+    finally:
+        db.close()
+
+
+# ==================== STATE ====================
+
+class ReplayState:
+    """Checkpoints and delivered-event digests in a small SQLite file"""
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints "
+            "(source TEXT PRIMARY KEY, position INTEGER, updated_at TEXT, identity TEXT)"
+        )
+        if "identity" not in [row[1] for row in self.conn.execute("PRAGMA table_info(checkpoints)")]:
+            self.conn.execute("ALTER TABLE checkpoints ADD COLUMN identity TEXT")  # state files from before
+        self.conn.execute("CREATE TABLE IF NOT EXISTS delivered (digest BLOB PRIMARY KEY) WITHOUT ROWID")
+        self.conn.commit()
+
+    def position(self, source: str) -> int:
+        row = self.conn.execute("SELECT position FROM checkpoints WHERE source = ?", (source,)).fetchone()
+        return row[0] if row else 0
+
+    def identity(self, source: str):
+        """file_identity() of the file the checkpoint position belongs to (None for the db)"""
+        row = self.conn.execute("SELECT identity FROM checkpoints WHERE source = ?", (source,)).fetchone()
+        return row[0] if row else None
+
+    def undelivered(self, digests):
+        """Return the subset of digests not yet delivered"""
+        seen = set()
+        for i in range(0, len(digests), 500):
+            chunk = digests[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            seen.update(r[0] for r in self.conn.execute(
+                f"SELECT digest FROM delivered WHERE digest IN ({marks})", chunk
+            ))
+        return [d for d in digests if d not in seen]
+
+    def commit(self, source: str, position: int, digests, identity: str = None):
+        """Record delivered digests and advance the checkpoint atomically"""
+        with self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO delivered VALUES (?)", [(d,) for d in digests])
+            self.conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (source, position, updated_at, identity) VALUES (?, ?, ?, ?)",
+                (source, position, datetime.utcnow().isoformat(), identity)
+            )
+
+    def close(self):
+        self.conn.close()
+
+
+def event_digest(event_type: str, details) -> bytes:
+    """Stable identity of an event, independent of where it was read from"""
+    canonical = json.dumps([event_type, details], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).digest()
+
+
+# ==================== REPLAY ====================
+
+class Pacer:
+    """Sleeps to hold a fixed rate, or to reproduce original spacing at N times speed"""
+
+    def __init__(self, rate: float = 0, speed: float = 0):
+        self.rate = rate
+        self.speed = speed
+        self.start = time.monotonic()
+        self.sent = 0
+        self.first_ts = None
+
+    def wait(self, ts: datetime):
+        if self.speed > 0 and ts is not None:
+            if self.first_ts is None:
+                self.first_ts = ts
+            target = self.start + (ts - self.first_ts).total_seconds() / self.speed
+        elif self.rate > 0:
+            target = self.start + self.sent / self.rate
+        else:
+            return
+        delay = target - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def replay(events, source: str, state: ReplayState, sender, pacer: Pacer, batch_size: int = BATCH_SIZE,
+           limit: int = 0, dry_run: bool = False, start: int = None, identity: str = None):
+    """Send events in batches, skipping already-delivered ones; returns counters.
+    start is the position events begins after (default: the checkpoint), identity the file it is in"""
+    stats = {"read": 0, "sent": 0, "duplicates": 0, "unparsed": 0}
+    batch, position = [], state.position(source) if start is None else start
+
+    def flush():
+        nonlocal batch
+        if not batch:
+            return True
+        digests = [d for d, _, _ in batch]
+        fresh = set(state.undelivered(digests))
+        out, out_digests = [], []
+        for digest, event_type, details in batch:
+            if digest in fresh:
+                fresh.discard(digest)  # duplicates inside one batch go once
+                out.append((event_type, details))
+                out_digests.append(digest)
+        stats["duplicates"] += len(batch) - len(out)
+        if out and not dry_run and not sender(out):
+            return False
+        stats["sent"] += len(out)
+        pacer.sent += len(out)
+        if not dry_run:
+            state.commit(source, position, out_digests, identity)
+        batch = []
+        return True
+
+    for position_after, event_type, details, ts in events:
+        if event_type is None:
+            stats["unparsed"] += 1
+            position = position_after
+            continue
+        stats["read"] += 1
+        pacer.wait(ts)
+        batch.append((event_digest(event_type, details), event_type, details))
+        position = position_after
+        # Keep batches small when pacing so sends stay smooth
+        paced = pacer.rate > 0 or pacer.speed > 0
+        if len(batch) >= (min(batch_size, max(1, int(pacer.rate / 20))) if paced else batch_size):
+            if not flush():
+                raise ConnectionError("forwarding failed; checkpoint kept at last delivered batch")
+        if limit and stats["read"] >= limit:
+            break
+    if not flush():
+        raise ConnectionError("forwarding failed; checkpoint kept at last delivered batch")
+    if dry_run:
+        return stats
+    # Unparsed trailing lines still advance the checkpoint
+    state.commit(source, position, [], identity)
+    return stats
+
+
+def pool_sender(qradar_logger, flush_timeout: float = FLUSH_TIMEOUT):
+    """Sender delivering batches through the logger's pool without stages; True only once flushed"""
+    pool = qradar_logger.pool
+    if not pool.destinations:
+        raise ConnectionError("no QRadar destinations configured")
+
+    def send(events):
+        dropped = sum(getattr(d, "dropped", 0) for d in pool.destinations)
+        try:
+            qradar_logger._deliver(events)
+        except OSError as e:
+            print(f"✗ {e}")
+            return False
+        # HTTP destinations only buffer; wait until the batch has actually been posted
+        for dest in pool.destinations:
+            if hasattr(dest, "flush") and not dest.flush(flush_timeout):
+                return False
+        return sum(getattr(d, "dropped", 0) for d in pool.destinations) == dropped
+
+    return send
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill QRadar from logs or activity_logs")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--qradar-log", metavar="PATH", help="qradar_events.log (or rotated .gz)")
+    source.add_argument("--app-log", metavar="PATH", help="secure_app.log")
+    source.add_argument("--db", action="store_true", help="the activity_logs table")
+    parser.add_argument("--only-failed", action="store_true", help="qradar log: only events that failed to send")
+    parser.add_argument("--since", help="db: only rows at or after this ISO-8601 time")
+    parser.add_argument("--rate", type=float, default=0, help="events per second (default: unlimited)")
+    parser.add_argument("--speed", type=float, default=0, help="replay at N times the original pacing")
+    parser.add_argument("--limit", type=int, default=0, help="stop after N events")
+    parser.add_argument("--state", default="replay_state.db", help="checkpoint/dedup state file")
+    parser.add_argument("--reset", action="store_true", help="forget the checkpoint for this source")
+    parser.add_argument("--dry-run", action="store_true", help="parse and dedupe without sending")
+    args = parser.parse_args()
+
+    state = ReplayState(args.state)
+    if args.qradar_log:
+        key = f"qradar-log:{os.path.abspath(args.qradar_log)}"
+    elif args.app_log:
+        key = f"app-log:{os.path.abspath(args.app_log)}"
+    else:
+        key = "db:activity_logs"
+    if args.reset:
+        state.commit(key, 0, [])
+    offset = state.position(key)
+
+    # (path or None for the db, start position) in reading order
+    files = [(None, offset)]
+    path = args.qradar_log or args.app_log
+    if path:
+        files = [(path, offset)]
+        stored = state.identity(key)
+        if offset and stored and stored != file_identity(path):
+            rotated = rotated_since(path, stored)
+            if rotated:
+                print(f"⚠ {path} was rotated since the last run; continuing in {rotated[0]} at position {offset}")
+                files = [(rotated[0], offset)] + [(b, 0) for b in rotated[1:]] + [(path, 0)]
+            else:
+                print(f"⚠ {path} is not the file checkpointed at position {offset} and no rotated backup "
+                      f"matches it; restarting from 0 (already delivered events are still skipped)")
+                files = [(path, 0)]
+
+    from .qradar_logger import qradar_logger
+
+    print(f"Replaying {key} from position {offset}")
+    start = time.perf_counter()
+    stats = {"read": 0, "sent": 0, "duplicates": 0, "unparsed": 0}
+    try:
+        sender = None if args.dry_run else pool_sender(qradar_logger)
+        pacer = Pacer(args.rate, args.speed)
+        for file_path, position in files:
+            if file_path is None:
+                events = db_events(position, datetime.fromisoformat(args.since) if args.since else None)
+            elif args.qradar_log:
+                events = qradar_log_events(file_path, position, args.only_failed)
+            else:
+                events = app_log_events(file_path, position)
+            remaining = args.limit - stats["read"] if args.limit else 0
+            counts = replay(events, key, state, sender, pacer, limit=remaining, dry_run=args.dry_run,
+                            start=position, identity=file_identity(file_path) if file_path else None)
+            for name, count in counts.items():
+                stats[name] += count
+            if args.limit and stats["read"] >= args.limit:
+                break
+    except ConnectionError as e:
+        print(f"✗ {e}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print("\nInterrupted; rerun the same command to resume from the last checkpoint")
+        sys.exit(130)
+    finally:
+        state.close()
+    elapsed = time.perf_counter() - start
+    sent = "would send" if args.dry_run else "sent"
+    print(f"✓ read {stats['read']}, {sent} {stats['sent']}, skipped {stats['duplicates']} already delivered, "
+          f"{stats['unparsed']} unparsed lines in {elapsed:.2f}s ({stats['read'] / elapsed if elapsed else 0:.0f} events/s)")
+
+
+if __name__ == "__main__":
+    main()
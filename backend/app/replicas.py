@@ -0,0 +1,296 @@
+"""
+Read replicas - routes read-only admin and reporting queries away from the primary database.
+Replicas are configured as a comma-separated list of URLs:
+    DATABASE_REPLICA_URLS=sqlite:///./replica1.db,sqlite:///./replica2.db
+Writes, and reads that must see them, stay on the primary (SessionLocal). read_session() hands
+out sessions on healthy replicas round-robin. Every REPLICA_CHECK_INTERVAL seconds each replica
+is probed with SELECT 1 and its highest activity log id is compared with the positions the
+primary reached at earlier checks: lag is how long ago the primary first had a row the replica
+is still missing (ids only grow, unlike log timestamps, which clients can set). A replica that
+errors, lags by more than REPLICA_MAX_LAG seconds or is behind every remembered position is
+taken out of rotation until a later check passes. With no healthy replica, reads fall back to
+the primary.
+
+Read-your-own-writes: when a primary session commits changes to a user or to that user's
+activity logs, reads on behalf of that user stay on the primary for REPLICA_STICKY_SECONDS.
+
+For local testing, SQLite replicas can be refreshed from the primary with:
+    python -m app.replicas --sync
+"""
+import argparse
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import create_engine, event, func, select, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+from dotenv import load_dotenv
+
+from .db import engine, SessionLocal
+from .models import User, ActivityLog
+
+load_dotenv()
+
+DATABASE_REPLICA_URLS = [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", "10"))
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", "30"))  # seconds; 0 disables the lag check
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "10"))
+STICKY_MAX_KEYS = 100000
+
+
+class _ReplicaSession(Session):
+    """Session on a replica that reruns a statement on the primary when the replica fails it"""
+
+    def execute(self, *args, **kwargs):
+        try:
+            return super().execute(*args, **kwargs)
+        except OperationalError as e:
+            primary = self.info.get("primary")
+            if primary is None or self.bind is primary or "interrupted" in str(e.orig):
+                raise
+            self.rollback()
+            self.bind = primary
+            self.info["on_fallback"]()
+            return super().execute(*args, **kwargs)
+
+
+class Replica:
+    """One read-only database with its own engine and health state"""
+
+    def __init__(self, url: str, primary_engine=None, on_fallback=None):
+        self.url = make_url(url)
+        self.engine = create_engine(
+            self.url,
+            pool_pre_ping=True,
+            connect_args={"check_same_thread": False} if self.url.drivername.startswith("sqlite") else {}
+        )
+        self.sessions = sessionmaker(
+            autocommit=False, autoflush=False, bind=self.engine, class_=_ReplicaSession,
+            info={"primary": primary_engine, "on_fallback": on_fallback}
+        )
+        self.healthy = True
+        self.lag = None
+        self.last_error = None
+        self.checked_at = None
+        self.reads = 0
+        self.failures = 0
+        event.listen(self.engine, "handle_error", self._on_error)
+
+    @property
+    def name(self) -> str:
+        return self.url.render_as_string(hide_password=True)
+
+    def _on_error(self, context):
+        # A lost connection or a broken database takes the replica out of rotation until the
+        # next check passes; queries interrupted by a search latency budget do not
+        error = context.sqlalchemy_exception
+        if context.is_disconnect or (isinstance(error, OperationalError) and "interrupted" not in str(error.orig)):
+            self.mark_down(context.original_exception)
+
+    def mark_down(self, error):
+        self.healthy = False
+        self.failures += 1
+        self.last_error = str(error)
+
+    def stats(self) -> dict:
+        return {
+            "replica": self.name,
+            "healthy": self.healthy,
+            "lag_seconds": self.lag,
+            "reads": self.reads,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "checked_at": self.checked_at,
+        }
+
+
+def _position(conn) -> int:
+    return conn.execute(select(func.max(ActivityLog.id))).scalar() or 0
+
+
+class ReplicaRouter:
+    """Hands out read sessions on healthy replicas, falling back to the primary"""
+
+    def __init__(self, primary_sessions, primary_engine, urls=DATABASE_REPLICA_URLS,
+                 check_interval: float = REPLICA_CHECK_INTERVAL, max_lag: float = REPLICA_MAX_LAG,
+                 sticky_seconds: float = REPLICA_STICKY_SECONDS):
+        self.primary_sessions = primary_sessions
+        self.primary_engine = primary_engine
+        self.replicas = [Replica(url, primary_engine, self._count_fallback) for url in urls]
+        self.check_interval = check_interval
+        self.max_lag = max_lag
+        self.sticky_seconds = sticky_seconds
+        self._rr = itertools.count()
+        self._positions = deque()  # (monotonic time, primary position) whenever the position moved
+        self._sticky = {}  # key -> monotonic deadline
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.primary_reads = 0
+        self.fallbacks = 0
+        self.sticky_reads = 0
+        event.listen(primary_sessions, "after_flush", self._collect_writes)
+        event.listen(primary_sessions, "after_commit", self._commit_writes)
+        event.listen(primary_sessions, "after_rollback", lambda session: session.info.pop("written_keys", None))
+        if self.replicas:
+            self.check()
+            threading.Thread(target=self._check_loop, name="replica-health", daemon=True).start()
+
+    @staticmethod
+    def _collect_writes(session, flush_context):
+        keys = session.info.setdefault("written_keys", set())
+        for obj in itertools.chain(session.new, session.dirty, session.deleted):
+            if isinstance(obj, User) and obj.id is not None:
+                keys.add(obj.id)
+            elif isinstance(obj, ActivityLog) and obj.user_id is not None:
+                keys.add(obj.user_id)
+
+    def _commit_writes(self, session):
+        keys = session.info.pop("written_keys", None)
+        if keys:
+            self.note_writes(keys)
+
+    def _count_fallback(self):
+        self.fallbacks += 1
+
+    def note_writes(self, keys):
+        """Pin reads for these keys to the primary for the sticky window"""
+        deadline = time.monotonic() + self.sticky_seconds
+        with self._lock:
+            if len(self._sticky) >= STICKY_MAX_KEYS:
+                now = time.monotonic()
+                self._sticky = {k: d for k, d in self._sticky.items() if d > now}
+            for key in keys:
+                self._sticky[key] = deadline
+
+    def _is_sticky(self, key) -> bool:
+        deadline = self._sticky.get(key)
+        return deadline is not None and deadline > time.monotonic()
+
+    def session(self, key=None):
+        """Session for read-only queries on behalf of key (a user id), or None for anonymous reads"""
+        if key is not None and self._is_sticky(key):
+            self.sticky_reads += 1
+            return self.primary_sessions()
+        replica = self._pick()
+        if replica is None:
+            if self.replicas:
+                self.fallbacks += 1
+            self.primary_reads += 1
+            return self.primary_sessions()
+        replica.reads += 1
+        return replica.sessions()
+
+    def _pick(self):
+        n = len(self.replicas)
+        if not n:
+            return None
+        first = next(self._rr)
+        for i in range(n):
+            replica = self.replicas[(first + i) % n]
+            if replica.healthy:
+                return replica
+        return None
+
+    def _record_position(self, position: int, now: float):
+        if not self._positions or self._positions[-1][1] != position:
+            self._positions.append((now, position))
+        # Keep one sample older than twice the allowed lag; anything behind it is far too stale
+        while len(self._positions) > 1 and self._positions[1][0] < now - 2 * self.max_lag:
+            self._positions.popleft()
+
+    def _lag(self, position: int, now: float):
+        """Seconds since the primary first held a row past position; None if behind every sample"""
+        if position < self._positions[0][1]:
+            return None
+        for at, primary_position in self._positions:
+            if primary_position > position:
+                return round(now - at, 3)
+        return 0.0
+
+    def check(self):
+        """Probe every replica once and update its health"""
+        checking_lag = False
+        if self.max_lag > 0:
+            try:
+                with self.primary_engine.connect() as conn:
+                    self._record_position(_position(conn), time.monotonic())
+                checking_lag = True
+            except Exception:
+                pass
+        for replica in self.replicas:
+            try:
+                with replica.engine.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+                    replica.lag = None
+                    if checking_lag:
+                        replica.lag = self._lag(_position(conn), time.monotonic())
+                if checking_lag and (replica.lag is None or replica.lag > self.max_lag):
+                    raise RuntimeError(f"replica lags the primary by more than {self.max_lag:g}s")
+                replica.healthy = True
+                replica.last_error = None
+            except Exception as e:
+                replica.mark_down(e)
+            replica.checked_at = time.time()
+
+    def _check_loop(self):
+        while not self._stop.wait(self.check_interval):
+            self.check()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> dict:
+        return {
+            "replicas": [r.stats() for r in self.replicas],
+            "healthy_replicas": sum(1 for r in self.replicas if r.healthy),
+            "primary_reads": self.primary_reads,
+            "fallbacks": self.fallbacks,
+            "sticky_reads": self.sticky_reads,
+            "sticky_keys": len(self._sticky),
+        }
+
+
+def sync_sqlite_replicas(primary_engine, urls):
+    """Copy the primary SQLite database onto each replica file with the online backup API"""
+    source_path = make_url(str(primary_engine.url)).database
+    copied = []
+    for url in urls:
+        target = make_url(url)
+        if not target.drivername.startswith("sqlite") or not target.database:
+            continue
+        with sqlite3.connect(source_path) as src, sqlite3.connect(target.database) as dst:
+            src.backup(dst)
+        copied.append(target.database)
+    return copied
+
+
+# Global instance
+replica_router = ReplicaRouter(SessionLocal, engine)
+read_session = replica_router.session
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or refresh read replicas")
+    parser.add_argument("--sync", action="store_true", help="copy the primary SQLite database onto SQLite replicas")
+    parser.add_argument("--check", action="store_true", help="probe replica health and lag")
+    args = parser.parse_args()
+
+    if not DATABASE_REPLICA_URLS:
+        print("No replicas configured (set DATABASE_REPLICA_URLS)")
+    elif args.sync and not engine.url.drivername.startswith("sqlite"):
+        print("--sync only copies a SQLite primary; use your database's replication instead")
+    elif args.sync:
+        for path in sync_sqlite_replicas(engine, DATABASE_REPLICA_URLS):
+            print(f"✓ Copied primary to {path}")
+    elif args.check:
+        replica_router.check()
+        for r in replica_router.replicas:
+            state = "healthy" if r.healthy else f"down ({r.last_error})"
+            print(f"  {r.name}: {state}, lag {r.lag}s")
+    else:
+        parser.print_help()
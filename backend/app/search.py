@@ -0,0 +1,167 @@
+"""
+Full-text search over activity log details and user agents.
+On SQLite an external-content FTS5 table (trigram tokenizer, so any substring of three or
+more characters matches) mirrors activity_logs and is kept in sync by triggers; other
+databases and very short queries fall back to LIKE scans.
+
+Rebuild the index for existing rows with:
+    python -m app.search --reindex
+"""
+import argparse
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import text, or_, select, Integer, Float
+from sqlalchemy.exc import OperationalError
+from dotenv import load_dotenv
+
+from .models import ActivityLog, User
+
+load_dotenv()
+
+SEARCH_BUDGET_MS = int(os.getenv("SEARCH_BUDGET_MS", "500"))
+FTS_TABLE = "activity_logs_fts"
+MIN_FTS_QUERY = 3  # trigram tokenizer cannot match shorter strings
+_fts_disabled = False  # set when this SQLite build lacks FTS5/trigram
+
+_FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        details, user_agent, content='activity_logs', content_rowid='id', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON activity_logs BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, details, user_agent) VALUES (new.id, new.details, new.user_agent);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON activity_logs BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, details, user_agent)
+        VALUES ('delete', old.id, old.details, old.user_agent);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON activity_logs BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, details, user_agent)
+        VALUES ('delete', old.id, old.details, old.user_agent);
+        INSERT INTO {FTS_TABLE}(rowid, details, user_agent) VALUES (new.id, new.details, new.user_agent);
+    END""",
+]
+
+
+class SearchTimeout(Exception):
+    """Raised when a search exceeds its latency budget"""
+
+
+def fts_available(engine) -> bool:
+    return engine.dialect.name == "sqlite" and not _fts_disabled
+
+
+def ensure_search_index(engine):
+    """Create the FTS table and sync triggers; index existing rows the first time"""
+    global _fts_disabled
+    if not fts_available(engine):
+        return
+    try:
+        with engine.begin() as conn:
+            existed = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": FTS_TABLE}
+            ).first() is not None
+            for ddl in _FTS_DDL:
+                conn.execute(text(ddl))
+            if not existed:
+                conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    except OperationalError:
+        # SQLite older than 3.34 has no trigram tokenizer; search falls back to LIKE
+        _fts_disabled = True
+
+
+def reindex(engine) -> int:
+    """Rebuild the FTS index from activity_logs; returns the number of indexed rows"""
+    ensure_search_index(engine)
+    with engine.begin() as conn:
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"))
+        return conn.execute(text("SELECT COUNT(*) FROM activity_logs")).scalar()
+
+
+def _fts_phrase(query: str) -> str:
+    """Quote user input as a single FTS5 phrase so operators are not interpreted"""
+    return '"' + query.replace('"', '""') + '"'
+
+
+@contextmanager
+def latency_budget(db, budget_ms: int):
+    """Abort the SQLite statement running on db's connection once budget_ms has elapsed"""
+    raw = db.connection().connection.driver_connection
+    if not hasattr(raw, "set_progress_handler"):
+        yield
+        return
+    deadline = time.perf_counter() + budget_ms / 1000.0
+    raw.set_progress_handler(lambda: int(time.perf_counter() > deadline), 1000)
+    try:
+        yield
+    except Exception as e:
+        if time.perf_counter() > deadline and "interrupted" in str(e):
+            db.rollback()
+            raise SearchTimeout(f"search exceeded {budget_ms} ms budget")
+        raise
+    finally:
+        raw.set_progress_handler(None, 0)
+
+
+def log_query(db, q: Optional[str] = None, action: Optional[str] = None,
+              since: Optional[datetime] = None, until: Optional[datetime] = None,
+              username: Optional[str] = None, ip_address: Optional[str] = None):
+    """Build the activity log query for the filters; full-text matches are ordered by rank"""
+    query = db.query(ActivityLog)
+    if action:
+        query = query.filter(ActivityLog.action == action)
+    if username:
+        user_id = select(User.id).where(User.username == username).scalar_subquery()
+        query = query.filter(ActivityLog.user_id == user_id)
+    if ip_address:
+        query = query.filter(ActivityLog.ip_address == ip_address)
+    if since:
+        query = query.filter(ActivityLog.timestamp >= since)
+    if until:
+        query = query.filter(ActivityLog.timestamp < until)
+
+    if q and fts_available(db.get_bind()) and len(q) >= MIN_FTS_QUERY:
+        matches = text(
+            f"SELECT rowid AS id, bm25({FTS_TABLE}) AS rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match"
+        ).bindparams(match=_fts_phrase(q)).columns(id=Integer, rank=Float).subquery("fts")
+        return query.join(matches, matches.c.id == ActivityLog.id).order_by(
+            matches.c.rank, ActivityLog.timestamp.desc()
+        )
+    if q:
+        query = query.filter(or_(
+            ActivityLog.details.contains(q, autoescape=True),
+            ActivityLog.user_agent.contains(q, autoescape=True)
+        ))
+    return query.order_by(ActivityLog.timestamp.desc())
+
+
+def filter_logs(db, q: Optional[str] = None, action: Optional[str] = None,
+                since: Optional[datetime] = None, until: Optional[datetime] = None,
+                username: Optional[str] = None, ip_address: Optional[str] = None,
+                limit: int = 500, budget_ms: int = SEARCH_BUDGET_MS):
+    """Return activity logs matching the filters within the latency budget"""
+    query = log_query(db, q, action, since, until, username, ip_address)
+    with latency_budget(db, budget_ms):
+        return query.limit(limit).all()
+
+
+if __name__ == "__main__":
+    from .db import engine
+
+    parser = argparse.ArgumentParser(description="Manage the activity log full-text index")
+    parser.add_argument("--reindex", action="store_true", help="rebuild the index from activity_logs")
+    args = parser.parse_args()
+
+    if not fts_available(engine):
+        print("Full-text index requires SQLite; LIKE search is used for this database")
+    elif args.reindex:
+        start = time.perf_counter()
+        count = reindex(engine)
+        print(f"✓ Reindexed {count} activity logs in {time.perf_counter() - start:.2f}s")
+    else:
+        parser.print_help()
@@ -0,0 +1,208 @@
+"""
+Outbound EPS shaping - keeps forwarding within the licensed QRadar events-per-second budget and
+decides which events wait when it is exceeded.
+
+Every event needs a token from the global bucket (QRADAR_EPS_BUDGET per second), so the budget is
+never exceeded. Each priority class also has a guaranteed share of the budget:
+    critical      SUSPICIOUS_ACTIVITY                 40%
+    admin         ADMIN_ACCESS                        20%
+    auth_failure  LOGIN_ATTEMPT with status=failure   25%
+    auth_success  LOGIN_ATTEMPT with status=success   10%
+    other         everything else                      5%
+A class that has used its share may borrow idle global tokens, but only beyond what the
+higher-priority classes are still entitled to. Events that cannot go out now are deferred
+in per-class queues and drained in priority order; when a queue is full its oldest events
+are spilled to SHAPER_SPILL_FILE (JSON lines, replayable) or dropped if no file is set.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+QRADAR_EPS_BUDGET = float(os.getenv("QRADAR_EPS_BUDGET", "0"))  # 0 disables shaping
+QRADAR_EPS_BURST = float(os.getenv("QRADAR_EPS_BURST", "1"))  # seconds of budget allowed in a burst
+SHAPER_QUEUE_SIZE = int(os.getenv("SHAPER_QUEUE_SIZE", "100000"))  # deferred events per class
+SHAPER_SPILL_FILE = os.getenv("SHAPER_SPILL_FILE")
+SHAPER_TICK = 0.05  # seconds between drains of deferred events
+
+# (class name, share of budget), highest priority first
+PRIORITY_CLASSES = [
+    ("critical", 0.40),
+    ("admin", 0.20),
+    ("auth_failure", 0.25),
+    ("auth_success", 0.10),
+    ("other", 0.05),
+]
+
+
+def classify(event_type, details) -> str:
+    """Map an event onto its priority class"""
+    if event_type == "SUSPICIOUS_ACTIVITY":
+        return "critical"
+    if event_type == "ADMIN_ACCESS":
+        return "admin"
+    if event_type == "LOGIN_ATTEMPT":
+        failed = isinstance(details, dict) and details.get("status") != "success"
+        return "auth_failure" if failed else "auth_success"
+    return "other"
+
+
+class TokenBucket:
+    """Token bucket refilled lazily from the monotonic clock; callers hold the shaper lock"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.capacity = max(burst, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class _PriorityClass:
+    def __init__(self, name, bucket, queue_size):
+        self.name = name
+        self.bucket = bucket
+        self.queue = deque()
+        self.queue_size = queue_size
+        self.passed = 0
+        self.borrowed = 0
+        self.deferred = 0
+        self.spilled = 0
+
+
+class EventShaper:
+    """Pipeline stage enforcing a global EPS budget with per-class token buckets"""
+
+    name = "shaping"
+
+    def __init__(self, budget: float = QRADAR_EPS_BUDGET, burst_seconds: float = QRADAR_EPS_BURST,
+                 classes=PRIORITY_CLASSES, queue_size: int = SHAPER_QUEUE_SIZE,
+                 spill_file: str = SHAPER_SPILL_FILE, tick: float = SHAPER_TICK):
+        self.budget = budget
+        self.tick = tick
+        self.spill_file = spill_file
+        self.global_bucket = TokenBucket(budget, budget * burst_seconds)
+        self.classes = [
+            _PriorityClass(name, TokenBucket(budget * share, budget * share * burst_seconds), queue_size)
+            for name, share in classes
+        ]
+        self._by_name = {c.name: c for c in self.classes}
+        self._lock = threading.Lock()
+        self._emit = None
+        self._stop = threading.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget > 0
+
+    def bind(self, emit):
+        """Attach the downstream callable that receives drained deferred events"""
+        self._emit = emit
+        if self.enabled:
+            threading.Thread(target=self._drain_loop, name="event-shaper", daemon=True).start()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.global_bucket.refill(now)
+        for cls in self.classes:
+            cls.bucket.refill(now)
+
+    def _try_take(self, cls) -> bool:
+        """Consume a token for cls if the budget allows; caller holds the lock"""
+        if self.global_bucket.tokens < 1:
+            return False
+        if cls.bucket.tokens >= 1:
+            cls.bucket.tokens -= 1
+            self.global_bucket.tokens -= 1
+            cls.passed += 1
+            return True
+        # Borrow idle budget, leaving what higher-priority classes may still claim
+        reserved = 0.0
+        for higher in self.classes:
+            if higher is cls:
+                break
+            reserved += higher.bucket.tokens
+        if self.global_bucket.tokens - reserved >= 1:
+            self.global_bucket.tokens -= 1
+            cls.passed += 1
+            cls.borrowed += 1
+            return True
+        return False
+
+    def _defer(self, cls, event):
+        """Queue an event; returns the event spilled to make room, if any"""
+        cls.deferred += 1
+        cls.queue.append(event)
+        if len(cls.queue) > cls.queue_size:
+            cls.spilled += 1
+            return cls.queue.popleft()
+        return None
+
+    def process(self, event_type, details):
+        if not self.enabled:
+            return [(event_type, details)]
+        cls = self._by_name[classify(event_type, details)]
+        with self._lock:
+            self._refill()
+            # Keep per-class order: nothing overtakes events already waiting
+            if not cls.queue and self._try_take(cls):
+                return [(event_type, details)]
+            spilled = self._defer(cls, (event_type, details))
+        if spilled:
+            self._spill([spilled])
+        return []
+
+    def drain(self):
+        """Release deferred events the budget now allows, highest priority first"""
+        released = []
+        with self._lock:
+            self._refill()
+            for cls in self.classes:
+                while cls.queue and self._try_take(cls):
+                    released.append(cls.queue.popleft())
+        return released
+
+    def _drain_loop(self):
+        while not self._stop.wait(self.tick):
+            released = self.drain()
+            if released and self._emit:
+                self._emit(released)
+
+    def _spill(self, events):
+        if not self.spill_file:
+            return
+        try:
+            with open(self.spill_file, "a", encoding="utf-8") as f:
+                for event_type, details in events:
+                    f.write(json.dumps({"event_type": event_type, "details": details}) + "\n")
+        except OSError:
+            pass
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> dict:
+        return {
+            "eps_budget": self.budget,
+            "enabled": self.enabled,
+            "shaped": sum(c.deferred for c in self.classes),
+            "deferred_now": sum(len(c.queue) for c in self.classes),
+            "spilled": sum(c.spilled for c in self.classes),
+            "classes": {
+                c.name: {
+                    "passed": c.passed,
+                    "borrowed": c.borrowed,
+                    "deferred": c.deferred,
+                    "queued": len(c.queue),
+                    "spilled": c.spilled,
+                } for c in self.classes
+            },
+        }
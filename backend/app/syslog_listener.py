@@ -0,0 +1,509 @@
+"""
+Syslog listener - receives syslog over UDP and TCP and feeds it into the event pipeline.
+
+Runs as its own process on asyncio, so a flood of syslog never competes with Flask workers:
+    python -m app.syslog_listener                          # udp+tcp on SYSLOG_LISTEN_PORT
+    python -m app.syslog_listener --store --relay          # persist to activity_logs and forward
+    python -m app.syslog_listener --protocols udp --port 5514 --report-seconds 5
+
+Messages may be RFC 5424 ("<PRI>1 TIMESTAMP HOST APP PROCID MSGID [SD] MSG") or RFC 3164
+("<PRI>Mmm dd hh:mm:ss HOST TAG[PID]: MSG"). TCP accepts newline framing and octet counting
+(RFC 6587). UDP readiness drains up to SYSLOG_READ_BATCH datagrams per wakeup. Each message is
+normalized to the /events/bulk event model, with the socket peer as its source (the header
+hostname is sender-controlled, so it is only kept in details). Messages already written by
+QRadarLogger (type="X" details="{...}") keep their event type and fields when the peer is in
+SYSLOG_TRUSTED_HOSTS, since syslog is unauthenticated. Anything else becomes a SYSLOG_MESSAGE
+with the header fields in details.
+
+Parsed events are handed to one worker thread in batches. The worker can store them with
+ingest.store_events and relay them with qradar_logger.send_batch, so the socket is read while
+the database is written. Do not relay to a collector that sends back to this listener.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+from .coalesce import RateMeter
+from .ingest import ALLOWED_FIELDS, EventValidationError, validate_event
+
+load_dotenv()
+
+SYSLOG_LISTEN_HOST = os.getenv("SYSLOG_LISTEN_HOST", "0.0.0.0")
+SYSLOG_LISTEN_PORT = int(os.getenv("SYSLOG_LISTEN_PORT", "5514"))
+SYSLOG_LISTEN_PROTOCOLS = os.getenv("SYSLOG_LISTEN_PROTOCOLS", "udp,tcp")
+SYSLOG_STORE = os.getenv("SYSLOG_STORE", "false").lower() == "true"  # insert into activity_logs
+SYSLOG_RELAY = os.getenv("SYSLOG_RELAY", "false").lower() == "true"  # forward through qradar_logger
+SYSLOG_READ_BATCH = int(os.getenv("SYSLOG_READ_BATCH", "256"))  # datagrams read per wakeup
+SYSLOG_BATCH_SIZE = int(os.getenv("SYSLOG_BATCH_SIZE", "2000"))  # events per store/relay batch
+SYSLOG_FLUSH_SECONDS = float(os.getenv("SYSLOG_FLUSH_SECONDS", "0.5"))
+SYSLOG_MAX_PENDING = int(os.getenv("SYSLOG_MAX_PENDING", "100000"))  # parsed events awaiting the worker
+SYSLOG_TRUSTED_HOSTS = os.getenv("SYSLOG_TRUSTED_HOSTS", "")  # peer addresses whose app events keep their type
+SYSLOG_MAX_MESSAGE = 65536
+UDP_RECEIVE_BUFFER = 8 * 1024 * 1024
+
+RFC5424 = re.compile(
+    rb"<(\d{1,3})>1 (\S+) (\S+) (\S+) (\S+) (\S+) (-|\[(?:[^\]\\]|\\.)*\](?:\[(?:[^\]\\]|\\.)*\])*)(?: (.*))?",
+    re.DOTALL,
+)
+RFC3164 = re.compile(rb"<(\d{1,3})>([A-Z][a-z]{2} [ \d]\d \d\d:\d\d:\d\d) (\S+) ([^:\[\s]+)(?:\[([^\]]*)\])?: ?(.*)",
+                     re.DOTALL)
+PRI_ONLY = re.compile(rb"<(\d{1,3})>(.*)", re.DOTALL)
+SD_ELEMENT = re.compile(r'\[([^\s\]=]+)((?:\s+[^\s=\]]+="(?:[^"\\]|\\.)*")*)\]')
+SD_PARAM = re.compile(r'([^\s=\]]+)="((?:[^"\\]|\\.)*)"')
+APP_EVENT = re.compile(r'^type="([A-Z][A-Z0-9_]{0,49})" details="(.*)"$', re.DOTALL)
+SEVERITIES = ("emergency", "alert", "critical", "error", "warning", "notice", "info", "debug")
+
+
+class SyslogParseError(ValueError):
+    """Raised when a message is not RFC 3164 or RFC 5424 syslog"""
+
+
+# ==================== PARSING ====================
+
+def _nil(value: bytes):
+    return None if value == b"-" else value.decode("utf-8", "replace")
+
+
+def _structured_data(raw: str) -> dict:
+    return {
+        sd_id: {k: v.replace('\\"', '"').replace("\\]", "]").replace("\\\\", "\\")
+                for k, v in SD_PARAM.findall(params)}
+        for sd_id, params in SD_ELEMENT.findall(raw)
+    }
+
+
+def _utc(timestamp: str) -> datetime:
+    ts = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    return ts.astimezone(timezone.utc).replace(tzinfo=None) if ts.tzinfo else ts
+
+
+_rfc3164_times = {}
+
+
+def _rfc3164_time(ts: bytes) -> datetime:
+    """RFC 3164 timestamps have no year: take the current one, or the previous one when that
+    would put the message more than a day in the future (December logs read in January).
+    Senders repeat the same second many times, so parsed values are cached"""
+    parsed = _rfc3164_times.get(ts)
+    if parsed is None:
+        now = datetime.utcnow()
+        try:
+            parsed = datetime.strptime(f"{now.year} {ts.decode('ascii')}", "%Y %b %d %H:%M:%S")
+        except ValueError:
+            raise SyslogParseError("invalid RFC 3164 timestamp")
+        if (parsed - now).days >= 1:
+            parsed = parsed.replace(year=now.year - 1)
+        if len(_rfc3164_times) >= 4096:
+            _rfc3164_times.clear()
+        _rfc3164_times[ts] = parsed
+    return parsed
+
+
+def parse_syslog(raw: bytes) -> dict:
+    """Header fields and message of one syslog message"""
+    raw = raw.rstrip(b"\r\n\x00")
+    match = RFC5424.match(raw)
+    if match:
+        pri, ts, host, app, procid, msgid, sd, msg = match.groups()
+        try:
+            timestamp = None if ts == b"-" else _utc(ts.decode("ascii"))
+        except (UnicodeDecodeError, ValueError):
+            raise SyslogParseError("invalid RFC 5424 timestamp")
+        message = (msg or b"").removeprefix(b"\xef\xbb\xbf").decode("utf-8", "replace")
+        fields = {"format": "rfc5424", "hostname": _nil(host), "app_name": _nil(app),
+                  "procid": _nil(procid), "msgid": _nil(msgid), "timestamp": timestamp,
+                  "structured_data": _structured_data(sd.decode("utf-8", "replace")) if sd != b"-" else {},
+                  "message": message}
+    else:
+        match = RFC3164.match(raw)
+        if match:
+            pri, ts, host, tag, procid, msg = match.groups()
+            fields = {"format": "rfc3164", "hostname": host.decode("utf-8", "replace"),
+                      "app_name": tag.decode("utf-8", "replace"),
+                      "procid": procid.decode("utf-8", "replace") if procid else None,
+                      "msgid": None, "timestamp": _rfc3164_time(ts), "structured_data": {},
+                      "message": msg.decode("utf-8", "replace")}
+        else:
+            # RFC 3164 4.3.3: anything after a valid PRI is a message without a header
+            match = PRI_ONLY.match(raw)
+            if not match:
+                raise SyslogParseError("missing <PRI>")
+            pri, msg = match.groups()
+            fields = {"format": "rfc3164", "hostname": None, "app_name": None, "procid": None,
+                      "msgid": None, "timestamp": None, "structured_data": {},
+                      "message": msg.decode("utf-8", "replace")}
+    pri = int(pri)
+    if pri > 191:
+        raise SyslogParseError("PRI out of range")
+    fields["facility"], fields["severity"] = divmod(pri, 8)
+    return fields
+
+
+def _hosts(hosts) -> frozenset:
+    if isinstance(hosts, str):
+        hosts = hosts.split(",")
+    return frozenset(h.strip() for h in hosts if h.strip())
+
+
+def normalize(fields: dict, peer: str, trusted=frozenset()) -> dict:
+    """Map a parsed message to the /events/bulk event model (see ingest.validate_event).
+    App events are only honoured from trusted peers; anyone can claim a hostname or event type"""
+    source = peer
+    timestamp = fields["timestamp"] or datetime.utcnow()
+    app_event = APP_EVENT.match(fields["message"]) if peer in trusted else None
+    if app_event:
+        try:
+            payload = json.loads(app_event.group(2))
+        except json.JSONDecodeError:
+            payload = None
+        if isinstance(payload, dict):
+            # Payload fields outside the ingest schema (resource, activity_type, ...) move into details
+            details = payload.get("details") or {}
+            if not isinstance(details, dict):
+                raise EventValidationError("details must be a JSON object")
+            details = dict(details)
+            details.update({k: v for k, v in payload.items() if k not in ALLOWED_FIELDS})
+            details["peer"] = peer
+            event = validate_event({
+                "event_type": app_event.group(1),
+                "username": payload.get("username"),
+                "ip_address": payload.get("ip_address"),
+                "status": payload.get("status", "success"),
+                "source": source,
+                "details": details,
+            })
+            event["timestamp"] = timestamp
+            return event
+    return {
+        "event_type": "SYSLOG_MESSAGE",
+        "username": None,
+        "ip_address": peer,
+        "status": "error" if fields["severity"] <= 3 else "success",
+        "timestamp": timestamp,
+        "user_agent": None,
+        "source": source,
+        "details": {
+            "peer": peer,
+            "hostname": fields["hostname"],
+            "facility": fields["facility"],
+            "severity": SEVERITIES[fields["severity"]],
+            "app_name": fields["app_name"],
+            "procid": fields["procid"],
+            "msgid": fields["msgid"],
+            "structured_data": fields["structured_data"],
+            "message": fields["message"],
+            "format": fields["format"],
+        },
+    }
+
+
+# ==================== FRAMING ====================
+
+def split_frames(buffer: bytes):
+    """Complete TCP syslog frames (octet-counted or newline-terminated) and the remainder"""
+    frames = []
+    position = 0
+    size = len(buffer)
+    while position < size:
+        if 48 <= buffer[position] <= 57:  # a digit: octet counting "LEN SP MSG"
+            space = buffer.find(b" ", position, position + 8)
+            if space < 0:
+                if size - position >= 8:
+                    raise SyslogParseError("invalid octet count")
+                break
+            try:
+                length = int(buffer[position:space])
+            except ValueError:
+                raise SyslogParseError("invalid octet count")
+            if length > SYSLOG_MAX_MESSAGE:
+                raise SyslogParseError("invalid octet count")
+            end = space + 1 + length
+            if end > size:
+                break
+            frames.append(buffer[space + 1:end])
+            position = end
+        else:
+            end = buffer.find(b"\n", position)
+            if end < 0:
+                if size - position > SYSLOG_MAX_MESSAGE:
+                    raise SyslogParseError("unterminated message exceeds the maximum size")
+                break
+            if end > position:
+                frames.append(buffer[position:end])
+            position = end + 1
+    return frames, buffer[position:]
+
+
+def udp_kernel_drops(sock):
+    """Datagrams the kernel discarded for this socket because its receive buffer was full
+    (the drops column of /proc/net/udp); None where that is not available"""
+    inode = str(os.fstat(sock.fileno()).st_ino)
+    for path in ("/proc/net/udp", "/proc/net/udp6"):
+        try:
+            with open(path) as f:
+                rows = f.readlines()[1:]
+        except OSError:
+            continue
+        for row in rows:
+            fields = row.split()
+            if len(fields) >= 13 and fields[9] == inode:
+                return int(fields[12])
+    return None
+
+
+# ==================== LISTENER ====================
+
+class SyslogListener:
+    """asyncio UDP/TCP syslog receiver; parsed events go to deliver(batch) on a worker thread"""
+
+    def __init__(self, host: str = SYSLOG_LISTEN_HOST, port: int = SYSLOG_LISTEN_PORT,
+                 protocols=SYSLOG_LISTEN_PROTOCOLS, deliver=None, batch_size: int = SYSLOG_BATCH_SIZE,
+                 flush_seconds: float = SYSLOG_FLUSH_SECONDS, max_pending: int = SYSLOG_MAX_PENDING,
+                 read_batch: int = SYSLOG_READ_BATCH, trusted_hosts=SYSLOG_TRUSTED_HOSTS):
+        self.host = host
+        self.port = port
+        self.protocols = [p.strip().lower() for p in protocols.split(",")] if isinstance(protocols, str) \
+            else list(protocols)
+        unknown = set(self.protocols) - {"udp", "tcp"}
+        if unknown:
+            raise ValueError(f"Unknown syslog listener protocol(s): {', '.join(sorted(unknown))}")
+        self.deliver = deliver
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self.read_batch = read_batch
+        self.trusted_hosts = _hosts(trusted_hosts)
+        self._pending = []
+        self._full = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="syslog-deliver")
+        self._udp = None
+        self._tcp = None
+        self._flusher = None
+        self.ports = {}
+        # Metrics
+        self.received = 0
+        self.parsed = 0
+        self.parse_errors = {}
+        self.dropped = 0
+        self.delivered = 0
+        self.delivery_errors = 0
+        self.connections = 0
+        self.wakeups = 0
+        self.kernel_drops = None
+        self.rate = RateMeter()
+        self.started = None
+
+    # ---------- receiving ----------
+
+    def _handle(self, messages, peer: str):
+        self.received += len(messages)
+        self.rate.add(len(messages))
+        events = []
+        for raw in messages:
+            try:
+                events.append(normalize(parse_syslog(raw), peer, self.trusted_hosts))
+            except (SyslogParseError, EventValidationError) as e:
+                reason = str(e)
+                self.parse_errors[reason] = self.parse_errors.get(reason, 0) + 1
+        self.parsed += len(events)
+        if not events or self.deliver is None:
+            return
+        room = self.max_pending - len(self._pending)
+        if room < len(events):
+            self.dropped += len(events) - max(room, 0)
+            events = events[:max(room, 0)]
+        self._pending.extend(events)
+        if len(self._pending) >= self.batch_size:
+            self._full.set()
+
+    def _read_datagrams(self):
+        """Readiness callback: drain up to read_batch datagrams, then parse them together"""
+        self.wakeups += 1
+        recvfrom = self._udp.recvfrom
+        by_peer = {}
+        for _ in range(self.read_batch):
+            try:
+                data, address = recvfrom(SYSLOG_MAX_MESSAGE)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                break
+            by_peer.setdefault(address[0], []).append(data)
+        for peer, messages in by_peer.items():
+            self._handle(messages, peer)
+
+    async def _read_stream(self, reader, writer):
+        peer = (writer.get_extra_info("peername") or ("unknown",))[0]
+        self.connections += 1
+        pending = b""
+        try:
+            while True:
+                data = await reader.read(262144)
+                if not data:
+                    break
+                frames, pending = split_frames(pending + data)
+                if frames:
+                    self._handle(frames, peer)
+        except SyslogParseError as e:
+            self.parse_errors[str(e)] = self.parse_errors.get(str(e), 0) + 1  # framing lost: drop the peer
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    # ---------- delivery ----------
+
+    def _deliver(self, batch):
+        try:
+            self.deliver(batch)
+            self.delivered += len(batch)
+        except Exception as e:
+            self.delivery_errors += 1
+            print(f"✗ Delivering {len(batch)} syslog events failed: {e}", flush=True)
+
+    async def _flush_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            if self._pending:
+                batch, self._pending = self._pending, []
+                for i in range(0, len(batch), self.batch_size):
+                    await loop.run_in_executor(self._executor, self._deliver, batch[i:i + self.batch_size])
+
+    # ---------- lifecycle ----------
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self._full = asyncio.Event()
+        self.started = time.monotonic()
+        if "udp" in self.protocols:
+            sock = socket.socket(socket.AF_INET6 if ":" in self.host else socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UDP_RECEIVE_BUFFER)
+            sock.bind((self.host, self.port))
+            sock.setblocking(False)
+            loop.add_reader(sock, self._read_datagrams)
+            self._udp = sock
+            self.ports["udp"] = sock.getsockname()[1]
+        if "tcp" in self.protocols:
+            self._tcp = await asyncio.start_server(self._read_stream, self.host, self.port,
+                                                   limit=SYSLOG_MAX_MESSAGE * 4)
+            self.ports["tcp"] = self._tcp.sockets[0].getsockname()[1]
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        loop = asyncio.get_running_loop()
+        if self._udp is not None:
+            loop.remove_reader(self._udp)
+            self.kernel_drops = udp_kernel_drops(self._udp)
+            self._udp.close()
+            self._udp = None
+        if self._tcp is not None:
+            self._tcp.close()
+            await self._tcp.wait_closed()
+        if self._flusher is not None:
+            self._flusher.cancel()
+        if self._pending:
+            batch, self._pending = self._pending, []
+            await loop.run_in_executor(self._executor, self._deliver, batch)
+        self._executor.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self.started if self.started else 0
+        return {
+            "ports": self.ports,
+            "received": self.received,
+            "parsed": self.parsed,
+            "parse_errors": sum(self.parse_errors.values()),
+            "parse_error_reasons": dict(self.parse_errors),
+            "dropped": self.dropped,
+            "udp_kernel_drops": udp_kernel_drops(self._udp) if self._udp is not None else self.kernel_drops,
+            "pending": len(self._pending),
+            "delivered": self.delivered,
+            "delivery_errors": self.delivery_errors,
+            "tcp_connections": self.connections,
+            "avg_datagrams_per_wakeup": round(self.received / self.wakeups, 1) if self.wakeups else None,
+            "eps_60s": round(self.rate.rate()),
+            "eps_since_start": round(self.received / elapsed) if elapsed else None,
+        }
+
+
+def build_deliver(store: bool = SYSLOG_STORE, relay: bool = SYSLOG_RELAY):
+    """Worker-thread callback storing and/or relaying a batch; None when both are off"""
+    if not (store or relay):
+        return None
+    from .ingest import store_events, to_qradar_event
+    if store:
+        from .db import SessionLocal
+    if relay:
+        from .qradar_logger import qradar_logger
+
+    def deliver(events):
+        if store:
+            db = SessionLocal()
+            try:
+                store_events(db, events)
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+        if relay and not qradar_logger.send_batch([(e["event_type"], to_qradar_event(e)) for e in events]):
+            raise ConnectionError("relaying to QRadar failed (journaled in qradar_events.log)")
+
+    return deliver
+
+
+async def serve(listener: SyslogListener, report_seconds: float):
+    await listener.start()
+    print(f"✓ Syslog listener on {listener.host} " +
+          ", ".join(f"{p}/{port}" for p, port in listener.ports.items()), flush=True)
+    try:
+        last_received, last_at = 0, time.monotonic()
+        while True:
+            await asyncio.sleep(report_seconds)
+            now = time.monotonic()
+            s = listener.stats()
+            interval_eps = (s["received"] - last_received) / (now - last_at)
+            last_received, last_at = s["received"], now
+            print(f"  eps {interval_eps:>9.0f} (60s {s['eps_60s']:>7})  received {s['received']:>10}  "
+                  f"parse errors {s['parse_errors']:>6}  dropped {s['dropped']:>6}  "
+                  f"kernel drops {s['udp_kernel_drops']}  "
+                  f"delivered {s['delivered']:>10}  pending {s['pending']}", flush=True)
+    finally:
+        await listener.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Receive RFC 3164/5424 syslog over UDP and TCP")
+    parser.add_argument("--host", default=SYSLOG_LISTEN_HOST)
+    parser.add_argument("--port", type=int, default=SYSLOG_LISTEN_PORT)
+    parser.add_argument("--protocols", default=SYSLOG_LISTEN_PROTOCOLS, help="udp, tcp or udp,tcp")
+    parser.add_argument("--store", action="store_true", default=SYSLOG_STORE, help="insert into activity_logs")
+    parser.add_argument("--relay", action="store_true", default=SYSLOG_RELAY, help="forward through qradar_logger")
+    parser.add_argument("--trusted-hosts", default=SYSLOG_TRUSTED_HOSTS,
+                        help="comma-separated peer addresses whose app events keep their event type")
+    parser.add_argument("--report-seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    syslog_listener = SyslogListener(args.host, args.port, args.protocols, build_deliver(args.store, args.relay),
+                                     trusted_hosts=args.trusted_hosts)
+    try:
+        asyncio.run(serve(syslog_listener, args.report_seconds))
+    except KeyboardInterrupt:
+        stats = syslog_listener.stats()
+        print(f"✓ Stopped: {stats['received']} received, {stats['parse_errors']} parse errors, "
+              f"{stats['delivered']} delivered")
+        for reason, count in stats["parse_error_reasons"].items():
+            print(f"  {count:>8}  {reason}")
@@ -0,0 +1,307 @@
+"""
+Syslog sink - a local collector stand-in that measures what a forwarder delivers.
+
+Listens on TCP (newline framing), UDP (one message per datagram) or TLS (RFC 5425 octet
+counting) and counts every message. Messages carrying a load generator marker in their
+details ("stream": N, "seq": N, "sent_at": epoch) are also checked for:
+    loss         sequence numbers never seen (reported by the generator, which knows what it sent)
+    duplicates   a sequence number seen twice
+    out_of_order a sequence number lower than the highest already seen on its stream
+    latency      receive time minus sent_at, as percentiles in milliseconds
+Coalesced summaries repeat their first event's details, so they are counted apart and left out
+of those checks. Other messages (correlation alerts, real traffic) are counted as unmarked.
+
+Run standalone and point a forwarder at it (QRADAR_HOST=127.0.0.1 QRADAR_PORT=5514):
+    python -m app.syslog_sink --protocol udp --port 5514
+    python -m app.syslog_sink --protocol tls --port 6514 --cert server.pem --key server.key
+app.loadgen starts one in a child process so the sink never competes with the generator for the GIL.
+"""
+import argparse
+import multiprocessing
+import re
+import socket
+import ssl
+import threading
+import time
+from array import array
+
+MARKER = re.compile(rb'"stream": (\d+), "seq": (\d+), "sent_at": ([0-9.]+)')
+SUMMARY = b'"coalesced": true'
+LATENCY_SAMPLES = 2000000  # latencies kept for percentiles; later messages are counted only
+UDP_RECEIVE_BUFFER = 8 * 1024 * 1024
+
+
+class _Stream:
+    __slots__ = ("seen", "highest")
+
+    def __init__(self):
+        self.seen = bytearray(4096)
+        self.highest = -1
+
+
+class SyslogSink:
+    """Counting syslog listener for one protocol: "tcp", "udp" or "tls" (needs a server context)"""
+
+    def __init__(self, protocol: str = "tcp", host: str = "127.0.0.1", port: int = 0, context=None):
+        self.protocol = protocol.lower()
+        if self.protocol not in ("tcp", "udp", "tls"):
+            raise ValueError(f"Unknown sink protocol: {protocol}")
+        if self.protocol == "tls" and context is None:
+            raise ValueError("a TLS sink needs a server SSL context")
+        self.context = context
+        self.lock = threading.Lock()
+        if self.protocol == "udp":
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UDP_RECEIVE_BUFFER)
+            self.sock.bind((host, port))
+        else:
+            self.sock = socket.create_server((host, port), backlog=64)
+        self.port = self.sock.getsockname()[1]
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.received = 0
+            self.received_bytes = 0
+            self.unmarked = 0
+            self.summaries = 0
+            self.duplicates = 0
+            self.out_of_order = 0
+            self.connections = 0
+            self.first_at = None
+            self.last_at = None
+            self.per_second = {}
+            self.latencies = array("d")
+            self.streams = {}
+
+    def start(self):
+        target = self._read_datagrams if self.protocol == "udp" else self._accept
+        threading.Thread(target=target, name=f"syslog-sink-{self.protocol}", daemon=True).start()
+        return self
+
+    # ==================== RECEIVING ====================
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._read_stream, args=(conn,), daemon=True).start()
+
+    def _read_stream(self, conn):
+        octet_counted = self.protocol == "tls"
+        pending = b""
+        try:
+            if octet_counted:
+                conn = self.context.wrap_socket(conn, server_side=True)
+            with self.lock:
+                self.connections += 1
+            while True:
+                data = conn.recv(262144)
+                if not data:
+                    break
+                pending += data
+                messages, pending = _split_octets(pending) if octet_counted else _split_lines(pending)
+                if messages:
+                    self._record(messages, len(data))
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+    def _read_datagrams(self):
+        recv = self.sock.recv
+        while True:
+            try:
+                datagram = recv(65535)
+            except OSError:
+                return
+            self._record((datagram,), len(datagram))
+
+    def _record(self, messages, size):
+        now = time.time()
+        second = int(now)
+        with self.lock:
+            self.received += len(messages)
+            self.received_bytes += size
+            self.per_second[second] = self.per_second.get(second, 0) + len(messages)
+            if self.first_at is None:
+                self.first_at = now
+            self.last_at = now
+            latencies = self.latencies
+            for message in messages:
+                marker = MARKER.search(message)
+                if marker is None:
+                    self.unmarked += 1
+                    continue
+                if SUMMARY in message:
+                    self.summaries += 1
+                    continue
+                stream_id, seq, sent_at = int(marker.group(1)), int(marker.group(2)), float(marker.group(3))
+                stream = self.streams.get(stream_id)
+                if stream is None:
+                    stream = self.streams[stream_id] = _Stream()
+                seen = stream.seen
+                if seq >= len(seen):
+                    seen.extend(bytes(max(seq + 1 - len(seen), len(seen))))
+                if seen[seq]:
+                    self.duplicates += 1
+                else:
+                    seen[seq] = 1
+                if seq < stream.highest:
+                    self.out_of_order += 1
+                else:
+                    stream.highest = seq
+                if len(latencies) < LATENCY_SAMPLES:
+                    latencies.append((now - sent_at) * 1000)
+
+    # ==================== REPORTING ====================
+
+    def stats(self) -> dict:
+        with self.lock:
+            latencies = sorted(self.latencies)
+            # Whole seconds only: the first and last are partial, and late stragglers (deferred
+            # summaries) would otherwise stretch the average
+            full_seconds = sorted(list(self.per_second.values())[1:-1])
+            elapsed = (self.last_at - self.first_at) if self.received > 1 else 0.0
+            return {
+                "protocol": self.protocol,
+                "port": self.port,
+                "received": self.received,
+                "received_mb": round(self.received_bytes / 1e6, 2),
+                "unique_marked": sum(s.seen.count(1) for s in self.streams.values()),
+                "per_stream_unique": {k: s.seen.count(1) for k, s in self.streams.items()},
+                "unmarked": self.unmarked,
+                "summaries": self.summaries,
+                "duplicates": self.duplicates,
+                "out_of_order": self.out_of_order,
+                "connections": self.connections,
+                "eps": round(self.received / elapsed) if elapsed else None,
+                "sustained_eps": full_seconds[len(full_seconds) // 2] if full_seconds else None,
+                "peak_eps": max(self.per_second.values(), default=0),
+                "latency_ms": _percentiles(latencies),
+            }
+
+    def close(self):
+        self.sock.close()
+
+
+def _split_lines(buffer: bytes):
+    """Complete newline-framed messages and the unterminated remainder"""
+    end = buffer.rfind(b"\n")
+    if end < 0:
+        return [], buffer
+    return buffer[:end].split(b"\n"), buffer[end + 1:]
+
+
+def _split_octets(buffer: bytes):
+    """Complete RFC 5425 "<length> <message>" frames and the partial remainder"""
+    messages = []
+    position = 0
+    while True:
+        space = buffer.find(b" ", position, position + 12)
+        if space < 0:
+            break
+        end = space + 1 + int(buffer[position:space])
+        if end > len(buffer):
+            break
+        messages.append(buffer[space + 1:end])
+        position = end
+    return messages, buffer[position:]
+
+
+def _percentiles(values) -> dict:
+    if not values:
+        return {}
+    last = len(values) - 1
+    return {
+        "p50": round(values[last // 2], 3),
+        "p95": round(values[int(last * 0.95)], 3),
+        "p99": round(values[int(last * 0.99)], 3),
+        "max": round(values[last], 3),
+    }
+
+
+# ==================== CHILD PROCESS ====================
+
+def _serve(protocol, host, port, cert_file, key_file, conn):
+    context = None
+    if protocol == "tls":
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(cert_file, key_file)
+    sink = SyslogSink(protocol, host, port, context).start()
+    conn.send(sink.port)
+    while True:
+        command = conn.recv()
+        if command == "stats":
+            conn.send(sink.stats())
+        elif command == "reset":
+            sink.reset()
+            conn.send(True)
+        else:
+            sink.close()
+            conn.send(True)
+            return
+
+
+class SinkProcess:
+    """A SyslogSink running in its own (spawned) process, queried over a pipe"""
+
+    def __init__(self, protocol: str = "tcp", host: str = "127.0.0.1", port: int = 0,
+                 cert_file: str = None, key_file: str = None):
+        context = multiprocessing.get_context("spawn")
+        self._conn, child = context.Pipe()
+        self.process = context.Process(target=_serve, args=(protocol, host, port, cert_file, key_file, child),
+                                       name=f"syslog-sink-{protocol}", daemon=True)
+        self.process.start()
+        if not self._conn.poll(30):
+            self.process.terminate()
+            raise RuntimeError("syslog sink did not start")
+        self.port = self._conn.recv()
+
+    def _call(self, command):
+        self._conn.send(command)
+        return self._conn.recv()
+
+    def stats(self) -> dict:
+        return self._call("stats")
+
+    def reset(self):
+        self._call("reset")
+
+    def stop(self):
+        try:
+            self._call("stop")
+        except (EOFError, OSError):
+            pass
+        self.process.join(5)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local syslog sink measuring received EPS, ordering and latency")
+    parser.add_argument("--protocol", choices=("tcp", "udp", "tls"), default="tcp")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5514)
+    parser.add_argument("--cert", help="server certificate (PEM) for --protocol tls")
+    parser.add_argument("--key", help="server private key (PEM) for --protocol tls")
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds between reports")
+    args = parser.parse_args()
+
+    tls = None
+    if args.protocol == "tls":
+        if not (args.cert and args.key):
+            parser.error("--protocol tls needs --cert and --key")
+        tls = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        tls.load_cert_chain(args.cert, args.key)
+    listener = SyslogSink(args.protocol, args.host, args.port, tls).start()
+    print(f"✓ Listening on {args.host}:{listener.port}/{args.protocol} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(args.interval)
+            s = listener.stats()
+            print(f"  received {s['received']:>10}  eps {s['sustained_eps'] or 0:>8}  peak {s['peak_eps']:>8}  "
+                  f"summaries {s['summaries']}  dup {s['duplicates']}  out-of-order {s['out_of_order']}  "
+                  f"unmarked {s['unmarked']}  latency {s['latency_ms']}")
+    except KeyboardInterrupt:
+        listener.close()
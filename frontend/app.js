@@ -114,20 +114,39 @@ if (document.body.classList.contains('dashboard') || document.getElementById('pr
     }
   }
 
+  function logRow(l){
+    const tr = document.createElement('tr');
+    tr.innerHTML = `<td>${new Date(l.timestamp).toLocaleString()}</td><td>${l.username||''}</td><td>${l.action}</td><td>${l.ip_address||''}</td><td>${l.status}</td><td>${JSON.stringify(l.details||{})}</td>`;
+    return tr;
+  }
+
+  let logStream = null;
+
   async function loadLogs(){
+    // Load the table once; afterwards new rows arrive over the live stream
+    if (logStream) return;
     const res = await fetch(API + '/admin/logs', { headers: authHeader() });
     if (res.ok){
       const logs = await res.json();
       const tbody = document.querySelector('#logsTable tbody');
       tbody.innerHTML = '';
-      logs.forEach(l=>{
-        const tr = document.createElement('tr');
-        tr.innerHTML = `<td>${new Date(l.timestamp).toLocaleString()}</td><td>${l.username||''}</td><td>${l.action}</td><td>${l.ip_address||''}</td><td>${l.status}</td><td>${JSON.stringify(l.details||{})}</td>`;
-        tbody.appendChild(tr);
-      });
+      logs.forEach(l=> tbody.appendChild(logRow(l)));
+      // Resume the stream right after the newest loaded row, so nothing logged in between is missed
+      streamLogs(logs.reduce((max, l)=> Math.max(max, l.id), 0));
     }
   }
 
+  function streamLogs(lastId){
+    // EventSource cannot send headers; it reconnects with Last-Event-ID on its own
+    const token = encodeURIComponent(localStorage.getItem('access_token') || '');
+    logStream = new EventSource(API + '/admin/logs/stream?access_token=' + token + '&last_event_id=' + lastId);
+    logStream.addEventListener('log', (e)=>{
+      const tbody = document.querySelector('#logsTable tbody');
+      tbody.insertBefore(logRow(JSON.parse(e.data)), tbody.firstChild);
+      while (tbody.rows.length > 500) tbody.deleteRow(-1);
+    });
+  }
+
   // Navigation
   document.querySelectorAll('[data-view]').forEach(a=>{
     a.addEventListener('click', (e)=>{
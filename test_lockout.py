@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+"""Failed-login lockout testing against a throwaway SQLite database"""
+import sys
+import os
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db import Base
+from app.lockout import LockoutTracker
+
+print("="*70)
+print("TESTING FAILED-LOGIN LOCKOUT")
+print("="*70)
+
+db_file = os.path.join(tempfile.mkdtemp(), 'lockout.db')
+engine = create_engine(f"sqlite:///{db_file}", connect_args={"check_same_thread": False, "timeout": 30})
+Base.metadata.create_all(bind=engine)
+Session = sessionmaker(bind=engine)
+T0 = 1_700_000_000.0
+
+
+def test_lock():
+    """Test that max_attempts quick failures lock the account exactly once"""
+    print("\n1. Testing lock after max_attempts quick failures")
+    tracker = LockoutTracker(max_attempts=5, window=900, duration=600)
+    db = Session()
+    results = [tracker.record_failure(db, "alice", now=T0 + i) for i in range(7)]
+    print(f"   Attempts: {[r['attempts'] for r in results]}")
+    print(f"   Newly locked: {[r['newly_locked'] for r in results]}")
+    assert [r['newly_locked'] for r in results] == [False] * 4 + [True, False, False]
+    assert results[3]['locked_until'] is None
+    assert results[4]['locked_until'] is not None
+    # Failures during the lock neither extend it nor announce it again
+    assert results[6]['locked_until'] == results[4]['locked_until']
+    assert tracker.locked_until(db, "alice", now=T0 + 10) == results[4]['locked_until']
+    assert tracker.locked_until(db, "alice", now=T0 + 4 + 600) is None, "the lock should expire"
+    assert tracker.locks == 1
+    tracker.reset(db, "alice")
+    db.commit()
+    assert tracker.locked_until(db, "alice", now=T0 + 10) is None, "reset should clear the lock"
+    db.close()
+    print("   ✓ PASS")
+
+
+def test_decay():
+    """Test that the count drains over the window"""
+    print("\n2. Testing leaky-bucket decay")
+    tracker = LockoutTracker(max_attempts=5, window=100, duration=600)  # drains 0.05 attempts/s
+    db = Session()
+    for i in range(2):
+        tracker.record_failure(db, "bob", now=T0 + i)
+    assert tracker.record_failure(db, "bob", now=T0 + 2)['attempts'] == 2.9  # 1, 1.95, 2.9
+    result = tracker.record_failure(db, "bob", now=T0 + 22)  # 20s drain 1 attempt: 2.9 - 1 + 1
+    print(f"   Attempts after 20s idle: {result['attempts']}")
+    assert result['attempts'] == 2.9
+    result = tracker.record_failure(db, "bob", now=T0 + 1022)
+    print(f"   Attempts after a long pause: {result['attempts']}")
+    assert result['attempts'] == 1.0, "a fully drained count should restart at 1"
+    # One failure every 25s never builds up: each one drains 1.25 attempts first
+    results = [tracker.record_failure(db, "carol", now=T0 + 25 * i) for i in range(50)]
+    assert max(r['attempts'] for r in results) == 1.0
+    assert not any(r['newly_locked'] for r in results), "slow failures should never lock"
+    db.close()
+    print("   ✓ PASS")
+
+
+def test_concurrent_failures():
+    """Test that concurrent failures are all counted and lock exactly once"""
+    print("\n3. Testing concurrent failures against one account")
+    tracker = LockoutTracker(max_attempts=20, window=10 ** 9, duration=600)  # negligible decay
+    threads, failures = 8, 25
+    results = []
+    lock = threading.Lock()
+
+    def hammer():
+        session = Session()
+        try:
+            for _ in range(failures):
+                result = tracker.record_failure(session, "dave")
+                with lock:
+                    results.append(result)
+        finally:
+            session.close()
+
+    workers = [threading.Thread(target=hammer) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    highest = max(r['attempts'] for r in results)
+    newly_locked = sum(r['newly_locked'] for r in results)
+    print(f"   {len(results)} failures, highest count {highest}, newly locked {newly_locked} time(s)")
+    assert len(results) == threads * failures
+    assert round(highest) == threads * failures, "concurrent increments were lost"
+    assert newly_locked == 1, "exactly one failure should announce the lock"
+    print("   ✓ PASS")
+
+
+try:
+    test_lock()
+    test_decay()
+    test_concurrent_failures()
+
+    print("\n" + "="*70)
+    print("✅ ALL TESTS PASSED!")
+    print("="*70)
+
+except AssertionError as e:
+    print(f"\n❌ Test failed: {e}")
+    sys.exit(1)
+except Exception as e:
+    print(f"\n❌ Error: {e}")
+    import traceback
+    traceback.print_exc()
+    sys.exit(1)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+"""Bulk provisioning testing against a throwaway SQLite database"""
+import sys
+import os
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db import Base
+from app.models import User
+from app.provision import ProvisionError, Provisioner, validate_row
+
+print("="*70)
+print("TESTING BULK PROVISIONING")
+print("="*70)
+
+db_file = os.path.join(tempfile.mkdtemp(), 'provision.db')
+engine = create_engine(f"sqlite:///{db_file}")
+Base.metadata.create_all(bind=engine)
+Session = sessionmaker(bind=engine)
+
+
+def provision(db, rows, **options):
+    provisioner = Provisioner(db, workers=1, rounds=4, **options)
+    provisioner.write(provisioner.plan(enumerate(rows, start=2)))
+    db.expire_all()
+    return provisioner.counts
+
+
+def account(db, username):
+    user = db.query(User).filter_by(username=username).one()
+    return {"email": user.email, "full_name": user.full_name, "role": user.role,
+            "is_active": user.is_active, "hashed_password": user.hashed_password}
+
+
+def test_create_defaults():
+    """Test that new accounts get the default role and are active"""
+    print("\n1. Testing defaults for new accounts")
+    db = Session()
+    counts = provision(db, [
+        {"username": "ann", "email": "ann@example.com", "password": "Pass123!", "full_name": "Ann",
+         "role": "admin", "is_active": "false"},
+        {"username": "ben", "email": "ben@example.com", "password": "Pass123!", "role": "", "is_active": ""},
+    ])
+    print(f"   Counts: {counts}")
+    assert counts["created"] == 2
+    ann, ben = account(db, "ann"), account(db, "ben")
+    assert (ann["role"], ann["is_active"], ann["full_name"]) == ("admin", False, "Ann")
+    assert (ben["role"], ben["is_active"], ben["full_name"]) == ("user", True, None)
+    db.close()
+    print("   ✓ PASS")
+
+
+def test_update_keeps_missing_columns():
+    """Test that updates only change the columns a row gives"""
+    print("\n2. Testing updates leave missing and blank columns alone")
+    db = Session()
+    before = account(db, "ann")
+    counts = provision(db, [
+        # CSV-style row: every column present, only the email filled in
+        {"username": "ann", "email": "ann@new.example.com", "password": "", "full_name": "",
+         "role": "", "is_active": ""},
+        # NDJSON-style row: only the changed column given
+        {"username": "ben", "email": "ben@example.com", "role": "admin"},
+    ])
+    print(f"   Counts: {counts}")
+    assert counts["updated"] == 2
+    ann, ben = account(db, "ann"), account(db, "ben")
+    print(f"   ann: role={ann['role']} is_active={ann['is_active']} full_name={ann['full_name']}")
+    assert ann["email"] == "ann@new.example.com"
+    assert (ann["role"], ann["is_active"], ann["full_name"]) == ("admin", False, "Ann"), \
+        "an update without role/is_active/full_name must not demote, re-enable or rename"
+    assert ann["hashed_password"] == before["hashed_password"], "a blank password must keep the old hash"
+    assert (ben["role"], ben["is_active"]) == ("admin", True)
+    db.close()
+    print("   ✓ PASS")
+
+
+def test_update_given_columns():
+    """Test that given columns, including false and a new password, are written"""
+    print("\n3. Testing updates write the columns a row gives")
+    db = Session()
+    before = account(db, "ben")
+    counts = provision(db, [
+        {"username": "ann", "email": "ann@new.example.com", "is_active": True, "full_name": "Ann Lee"},
+        {"username": "ben", "email": "ben@example.com", "is_active": "no", "password": "NewPass123!"},
+    ])
+    assert counts["updated"] == 2
+    ann, ben = account(db, "ann"), account(db, "ben")
+    assert (ann["role"], ann["is_active"], ann["full_name"]) == ("admin", True, "Ann Lee")
+    assert (ben["role"], ben["is_active"]) == ("admin", False)
+    assert ben["hashed_password"] != before["hashed_password"], "the new password should be hashed in"
+    db.close()
+    print("   ✓ PASS")
+
+
+def test_validation():
+    """Test row validation errors"""
+    print("\n4. Testing row validation")
+    for row, message in (
+        ({"username": "x", "email": "x@example.com", "role": "root"}, "role must be one of"),
+        ({"username": "x", "email": "x@example.com", "is_active": "maybe"}, "is_active must be true or false"),
+        ({"username": "x", "email": "not-an-email"}, "email is not a valid address"),
+        ({"username": "x", "email": "x@example.com", "shell": "/bin/sh"}, "unknown field(s): shell"),
+    ):
+        try:
+            validate_row(row)
+        except ProvisionError as e:
+            assert message in str(e), f"{row}: {e}"
+        else:
+            raise AssertionError(f"{row} should be rejected")
+    db = Session()
+    counts = provision(db, [{"username": "cat", "email": "cat@example.com"}])
+    assert counts["invalid"] == 1, "a new account without a password is invalid"
+    db.close()
+    print("   ✓ PASS")
+
+
+try:
+    test_create_defaults()
+    test_update_keeps_missing_columns()
+    test_update_given_columns()
+    test_validation()
+
+    print("\n" + "="*70)
+    print("✅ ALL TESTS PASSED!")
+    print("="*70)
+
+except AssertionError as e:
+    print(f"\n❌ Test failed: {e}")
+    sys.exit(1)
+except Exception as e:
+    print(f"\n❌ Error: {e}")
+    import traceback
+    traceback.print_exc()
+    sys.exit(1)
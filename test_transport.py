@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+"""QRadar destination pool testing against local collectors (no QRadar needed)"""
+import sys
+import os
+import gzip
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from app.qradar_transport import DestinationPool, HTTPDestination, NoHealthyDestination, SyslogDestination
+
+print("="*70)
+print("TESTING QRADAR DESTINATION POOL")
+print("="*70)
+
+
+class Collector:
+    """Newline-framed TCP collector that can drop its connections, like a restarting QRadar"""
+
+    def __init__(self):
+        self.lines = []
+        self.conns = []
+        self.server = socket.create_server(('127.0.0.1', 0))
+        self.port = self.server.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            self.conns.append(conn)
+            threading.Thread(target=self._read, args=(conn,), daemon=True).start()
+
+    def _read(self, conn):
+        pending = b""
+        while True:
+            try:
+                data = conn.recv(65536)
+            except OSError:
+                return
+            if not data:
+                return
+            pending += data
+            *lines, pending = pending.split(b"\n")
+            self.lines.extend(lines)
+
+    def wait_for(self, count, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while len(self.lines) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return len(self.lines)
+
+    def drop_connections(self):
+        for conn in self.conns:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            conn.close()
+        self.conns = []
+
+    def stop(self):
+        self.server.close()
+        self.drop_connections()
+
+
+class Receiver:
+    """HTTP Receiver stand-in; answers each POST with the next status in statuses (then 200)"""
+
+    def __init__(self, statuses=()):
+        self.batches = []
+        self.statuses = list(statuses)
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                status = receiver.statuses.pop(0) if receiver.statuses else 200
+                if status == 200:
+                    if self.headers.get('Content-Encoding') == 'gzip':
+                        body = gzip.decompress(body)
+                    receiver.batches.append(body.decode('utf-8').splitlines())
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/events"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def received(self):
+        return sum(len(b) for b in self.batches)
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def closed_port():
+    """A local port with nothing listening on it"""
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def test_failover():
+    """Test failover from a dead primary"""
+    print("\n1. Testing failover from an unreachable primary")
+    collector = Collector()
+    dead = SyslogDestination('127.0.0.1', closed_port(), 'TCP')
+    live = SyslogDestination('127.0.0.1', collector.port, 'TCP')
+    pool = DestinationPool([dead, live], routing='round_robin', cooldown=30)
+    used = [pool.send([f"event {i}"]) for i in range(4)]
+    print(f"   Destinations used: {[d.name for d in used]}")
+    assert all(d is live for d in used), "every batch should reach the live collector"
+    assert collector.wait_for(4) == 4
+    assert dead.send_errors == 1, f"dead primary tried {dead.send_errors} times, expected once before cooldown"
+    assert not dead.is_available(time.monotonic())
+    # Round robin makes the dead one primary for every other batch; each of those fails over
+    assert dead.failovers == 2, f"expected 2 failovers from the dead primary, got {dead.failovers}"
+    pool.close()
+    collector.stop()
+    print("   ✓ PASS")
+
+
+def test_no_healthy_destination():
+    """Test that a pool with every destination down raises"""
+    print("\n2. Testing NoHealthyDestination when every collector is down")
+    pool = DestinationPool([SyslogDestination('127.0.0.1', closed_port(), 'TCP'),
+                            SyslogDestination('127.0.0.1', closed_port(), 'TCP')], cooldown=30)
+    try:
+        pool.send(["event"])
+    except NoHealthyDestination as e:
+        print(f"   Raised: {e}")
+    else:
+        raise AssertionError("send should raise NoHealthyDestination")
+    assert isinstance(NoHealthyDestination("x"), ConnectionError)
+    # Both are cooling down now, so nothing is even attempted
+    errors = sum(d.send_errors for d in pool.destinations)
+    try:
+        pool.send(["event"])
+    except NoHealthyDestination:
+        pass
+    assert sum(d.send_errors for d in pool.destinations) == errors, "destinations in cooldown were retried"
+    print("   ✓ PASS")
+
+
+def test_reconnect():
+    """Test reconnecting to a collector that dropped the connection"""
+    print("\n3. Testing reconnect after the collector drops the connection")
+    primary = Collector()
+    backup = Collector()
+    first = SyslogDestination('127.0.0.1', primary.port, 'TCP')
+    second = SyslogDestination('127.0.0.1', backup.port, 'TCP')
+    pool = DestinationPool([first, second], routing='hash', cooldown=0.2)
+    key = next(k for k in (f"user{i}" for i in range(1000)) if pool._candidates(k)[0] is first)
+    pool.send(["before restart"], key)
+    assert primary.wait_for(1) == 1
+    primary.drop_connections()
+    # The first write after the peer closed may still be accepted by the kernel; keep sending
+    # until the broken connection surfaces and the batch fails over
+    sent = 0
+    while first.send_errors == 0 and sent < 50:
+        pool.send([f"during outage {sent}"], key)
+        sent += 1
+        time.sleep(0.02)
+    print(f"   Failed over after {sent} batch(es), last error: {first.last_error}")
+    assert first.send_errors >= 1
+    assert first.failovers >= 1
+    assert backup.wait_for(1) >= 1, "the failed batch should have gone to the backup"
+    time.sleep(0.3)  # let the cooldown expire
+    assert pool.send(["after reconnect"], key) is first, "the primary should be used again after its cooldown"
+    assert primary.wait_for(2) == 2
+    assert primary.lines[-1].endswith(b"after reconnect")
+    print(f"   Connects to the primary: {first.connects}")
+    assert first.connects == 2
+    pool.close()
+    primary.stop()
+    backup.stop()
+    print("   ✓ PASS")
+
+
+def test_http_buffering():
+    """Test that HTTP sends are buffered until a flush or a full batch"""
+    print("\n4. Testing HTTP buffering and flush")
+    receiver = Receiver()
+    dest = HTTPDestination(receiver.url, batch_size=50, flush_seconds=30)
+    dest.send([f"event {i}" for i in range(10)])
+    time.sleep(0.2)
+    print(f"   Buffered before flush: {dest.stats()['buffered']}, posted: {len(receiver.batches)}")
+    assert receiver.batches == [], "a partial batch should wait for flush_seconds"
+    assert dest.flush(5), "flush timed out"
+    assert receiver.batches == [[f"event {i}" for i in range(10)]], receiver.batches
+    # A full batch goes out without waiting for a flush
+    dest.send([f"more {i}" for i in range(120)])
+    deadline = time.monotonic() + 5
+    while receiver.received < 110 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    print(f"   Batch sizes after 120 more: {[len(b) for b in receiver.batches]}")
+    assert [len(b) for b in receiver.batches] == [10, 50, 50]
+    assert dest.flush(5)
+    assert receiver.received == 130 and dest.sent_events == 130
+    stats = dest.stats()
+    assert stats['buffered'] == 0 and stats['batches'] == 4
+    assert stats['compression_ratio'] > 1, "batches should be gzip-compressed"
+    dest.close()
+    receiver.stop()
+    print("   ✓ PASS")
+
+
+def test_http_retry_and_overflow():
+    """Test retrying a 503 and rejecting sends once the buffer is full"""
+    print("\n5. Testing HTTP retry and buffer overflow")
+    receiver = Receiver(statuses=[503])
+    dest = HTTPDestination(receiver.url, batch_size=10, flush_seconds=30, max_buffer=20, backoff=0.01)
+    dest.send(["retried"])
+    assert dest.flush(5)
+    print(f"   Retries: {dest.retried}, delivered: {receiver.batches}")
+    assert dest.retried == 1 and receiver.batches == [["retried"]]
+    receiver.statuses = [503] * 100  # the receiver stays down while the buffer fills
+    dest.retries = 0
+    dest.send([f"event {i}" for i in range(9)])
+    try:
+        dest.send([f"event {i}" for i in range(12)])
+    except OSError as e:
+        print(f"   Rejected: {e}")
+    else:
+        raise AssertionError("a send past max_buffer should raise OSError")
+    dest.close()
+    receiver.stop()
+    print("   ✓ PASS")
+
+
+def test_http_reroute():
+    """Test that a batch the HTTP Receiver rejects is re-routed to another destination"""
+    print("\n6. Testing re-routing a failed HTTP batch through the pool")
+    receiver = Receiver(statuses=[500])
+    collector = Collector()
+    http = HTTPDestination(receiver.url, batch_size=100, flush_seconds=30, retries=0)
+    syslog = SyslogDestination('127.0.0.1', collector.port, 'TCP')
+    pool = DestinationPool([http, syslog], routing='hash', cooldown=30)
+    key = next(k for k in (f"user{i}" for i in range(1000)) if pool._candidates(k)[0] is http)
+    assert pool.send([f"event {i}" for i in range(5)], key) is http, "the HTTP Receiver only buffers"
+    assert http.flush(5)
+    print(f"   Collector received {collector.wait_for(5)}, dropped {http.dropped}, last error: {http.last_error}")
+    assert collector.wait_for(5) == 5, "the rejected batch should reach the syslog collector"
+    assert http.dropped == 0 and http.failovers == 1
+    assert not http.is_available(time.monotonic())
+    pool.close()
+    collector.stop()
+    receiver.stop()
+    print("   ✓ PASS")
+
+
+try:
+    test_failover()
+    test_no_healthy_destination()
+    test_reconnect()
+    test_http_buffering()
+    test_http_retry_and_overflow()
+    test_http_reroute()
+
+    print("\n" + "="*70)
+    print("✅ ALL TESTS PASSED!")
+    print("="*70)
+
+except AssertionError as e:
+    print(f"\n❌ Test failed: {e}")
+    sys.exit(1)
+except Exception as e:
+    print(f"\n❌ Error: {e}")
+    import traceback
+    traceback.print_exc()
+    sys.exit(1)